@@ -1,17 +1,30 @@
 from __future__ import annotations
 
-from io import BytesIO
-from typing import Dict, Any
-from pathlib import Path
+import asyncio
+import os
+import shutil
+from typing import Dict, Any, Optional
 
-import pandas as pd
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 
-from tasks import create_job_from_dataframe, read_job_status
-from tasks import _output_path  # type: ignore[attr-defined]
-from tasks import process_catalog_job
+from tasks import create_upload_job, read_job_status
+from tasks import materialize_output
+from tasks import prepare_job
+from tasks import cancel_job, pause_job, resume_job
+from tasks import read_job_rows
+from job_events import get_bus, sse
+
+
+# Yükleme diske bu boyutta parçalarla kopyalanır (dosyanın tamamı belleğe alınmaz)
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+def _save_upload(source, path) -> None:
+    with open(path, "wb") as target:
+        shutil.copyfileobj(source, target, UPLOAD_CHUNK_BYTES)
 
 
 app = FastAPI(title="Catalog Processing API", version="1.0.0")
@@ -41,10 +54,18 @@ async def jobs_list_disallowed():
 async def create_job(
     file: UploadFile = File(...),
     language: str = Form("tr"),
+    batch_size: int = Form(0),
+    shard_size: Optional[int] = Form(None),
+    priority: int = Form(5),
 ) -> Dict[str, Any]:
     """
     Create a new processing job from an uploaded Excel file.
+    The upload is streamed to the job directory and the job_id returned immediately;
+    parsing / validation run in the prepare_job Celery stage (status phase: uploaded → parsing → queued).
     language: output language for Gemini (tr, en, de, it). Default: tr
+    batch_size: products per Gemini request (0 → server default GEMINI_BATCH_SIZE)
+    shard_size: rows per shard dispatched to separate workers (omitted → JOB_SHARD_SIZE, 0 → no sharding)
+    priority: 1 (low) … 10 (high); weighted fair share of rows between concurrent jobs. Default: 5
     """
     if not file.filename.lower().endswith((".xlsx", ".xls")):
         raise HTTPException(status_code=400, detail="Only .xlsx / .xls files are supported")
@@ -53,18 +74,25 @@ async def create_job(
     if lang not in ("tr", "en", "de", "it"):
         lang = "tr"
 
-    try:
-        content = await file.read()
-        df = pd.read_excel(BytesIO(content))
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=f"Failed to read Excel: {exc}") from exc
-
-    job_id = create_job_from_dataframe(df, language=lang)
+    if batch_size < 0 or batch_size > 50:
+        raise HTTPException(status_code=400, detail="batch_size must be between 0 and 50")
+    if shard_size is not None and shard_size < 0:
+        raise HTTPException(status_code=400, detail="shard_size must be >= 0")
+    if priority < 1 or priority > 10:
+        raise HTTPException(status_code=400, detail="priority must be between 1 and 10")
+
+    # Job kaydı (SQLite), disk yazımı ve broker çağrısı event loop'u bloklamasın
+    job_id, upload_path = await run_in_threadpool(
+        create_upload_job,
+        language=lang, batch_size=batch_size or None, filename=file.filename, shard_size=shard_size,
+        priority=priority,
+    )
+    await run_in_threadpool(_save_upload, file.file, upload_path)
 
-    # Fire-and-forget Celery task
-    process_catalog_job.delay(job_id)
+    # Fire-and-forget Celery task (parse → process_catalog_job)
+    await run_in_threadpool(prepare_job.delay, job_id)
 
-    status = read_job_status(job_id)
+    status = await run_in_threadpool(read_job_status, job_id)
     return status
 
 
@@ -76,21 +104,134 @@ async def get_job_status(job_id: str) -> Dict[str, Any]:
     if not (job_id or "").strip():
         raise HTTPException(status_code=400, detail="job_id required")
     try:
-        status = read_job_status(job_id.strip())
+        status = await run_in_threadpool(read_job_status, job_id.strip())
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Job not found")
     return status
 
 
+def _control(action, job_id: str) -> Dict[str, Any]:
+    if not (job_id or "").strip():
+        raise HTTPException(status_code=400, detail="job_id required")
+    try:
+        return action(job_id.strip())
+    except (FileNotFoundError, KeyError):
+        raise HTTPException(status_code=404, detail="Job not found")
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+
+@app.post("/jobs/{job_id}/pause", response_model=Dict[str, Any])
+async def pause(job_id: str) -> Dict[str, Any]:
+    """
+    Pause a job: no new rows are started, in-flight rows finish and are checkpointed
+    (status phase becomes paused once drained; "control": "pause" until then).
+    """
+    return await run_in_threadpool(_control, pause_job, job_id)
+
+
+@app.post("/jobs/{job_id}/resume", response_model=Dict[str, Any])
+async def resume(job_id: str) -> Dict[str, Any]:
+    """Resume a paused job; it continues from the row checkpoint without redoing finished rows."""
+    return await run_in_threadpool(_control, resume_job, job_id)
+
+
+@app.post("/jobs/{job_id}/cancel", response_model=Dict[str, Any])
+async def cancel(job_id: str) -> Dict[str, Any]:
+    """Cancel a job. Rows finished so far stay downloadable; a cancelled job cannot be resumed."""
+    return await run_in_threadpool(_control, cancel_job, job_id)
+
+
+# Bu aşamalarda job ilerlemez: SSE akışı son durumu gönderip kapanır
+_FINAL_PHASES = {"complete", "failed", "cancelled"}
+EVENTS_KEEPALIVE_S = float(os.getenv("JOB_EVENTS_KEEPALIVE_S", "15"))
+
+
+async def _event_stream(job_id: str, request: Request):
+    bus = get_bus()
+    subscription = bus.subscribe(job_id) if bus is not None else None
+    try:
+        if subscription is not None:
+            await subscription.start()
+        status = await run_in_threadpool(read_job_status, job_id)
+        yield sse({"type": "status", **status})
+        if status.get("phase") in _FINAL_PHASES:
+            return
+        while not await request.is_disconnected():
+            if subscription is not None:
+                event = await subscription.get(EVENTS_KEEPALIVE_S)
+            else:
+                await asyncio.sleep(EVENTS_KEEPALIVE_S)
+                event = None
+            if event is None:
+                # Boşta: pub/sub kalıcı değil, kaçırılan olay olabilir → durumu store'dan gönder
+                status = await run_in_threadpool(read_job_status, job_id)
+                yield sse({"type": "status", **status})
+                if status.get("phase") in _FINAL_PHASES:
+                    return
+                continue
+            yield sse(event)
+            if event.get("type") == "phase" and event.get("phase") in _FINAL_PHASES:
+                status = await run_in_threadpool(read_job_status, job_id)
+                yield sse({"type": "status", **status})
+                return
+    finally:
+        if subscription is not None:
+            await subscription.close()
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    Server-Sent Events stream for a job: "status" (full snapshot on connect and when idle),
+    "progress" (counters after each batch), "rows" (per-row completions with errors) and
+    "phase" (queued / processing / paused / complete ...). Closes when the job is finished.
+    """
+    if not (job_id or "").strip():
+        raise HTTPException(status_code=400, detail="job_id required")
+    job_id = job_id.strip()
+    try:
+        await run_in_threadpool(read_job_status, job_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        _event_stream(job_id, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/jobs/{job_id}/rows", response_model=Dict[str, Any])
+async def get_job_rows(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    columns: Optional[str] = Query(None, description="Comma-separated column names"),
+    only_changed: bool = Query(False),
+) -> Dict[str, Any]:
+    """
+    Page of processed rows straight from the row checkpoint (JSON), for previews.
+    total: rows matching the filter; each row has its index, changed columns and values.
+    """
+    if not (job_id or "").strip():
+        raise HTTPException(status_code=400, detail="job_id required")
+    wanted = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    try:
+        return await run_in_threadpool(read_job_rows, job_id.strip(), offset, limit, wanted, only_changed)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+
 @app.get("/jobs/{job_id}/download")
 async def download_result(job_id: str):
     """
     Download the processed Excel file for the given job.
+    The file is materialized from the row checkpoint on demand (partial while the job runs).
     """
     if not (job_id or "").strip():
         raise HTTPException(status_code=400, detail="job_id required")
-    output_path: Path = _output_path(job_id.strip())  # type: ignore[assignment]
-    if not output_path.exists():
+    output_path = await run_in_threadpool(materialize_output, job_id.strip())
+    if output_path is None:
         raise HTTPException(status_code=404, detail="Result file not ready yet")
 
     return FileResponse(
@@ -0,0 +1,211 @@
+"""
+asyncio execution engine for process_catalog_job.
+
+Tüm satır batch'leri tek bir event loop üzerinde çalışır; eşzamanlılık thread sayısıyla
+değil uyarlamalı bir kapıyla (concurrency.AsyncGate, AIMD) sınırlanır; üst sınır
+GEMINI_ASYNC_CONCURRENCY (varsayılan 100).
+Rate limit beklemeleri asyncio.sleep ile yapılır, OS thread'i park edilmez. Bloklayan
+internet aramaları (EAN / boyut) asyncio.to_thread ile çalıştırılır; batch geri çağrıları
+(checkpoint / job-state SQLite yazımı, olay yayını, metrics dosyası) tek bir yazıcı thread'de sırayla
+çalışır, event loop uçuştaki istekleri beklemeden sürdürür.
+
+GEMINI_ENGINE=thread ile eski ThreadPoolExecutor yolu kullanılır (tasks.process_catalog_job).
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import job_metrics
+from concurrency import AIMDController, AsyncGate
+from job_metrics import JobMetrics
+
+Item = Tuple[int, Dict[str, Any], List[str]]
+BatchCallback = Callable[[List[Item], List[Tuple[int, Dict[str, Any]]]], None]
+BatchProcessor = Callable[[List[Item]], Awaitable[List[Tuple[int, Dict[str, Any]]]]]
+
+
+def async_concurrency() -> int:
+    """Aynı anda uçuştaki batch sayısı üst sınırı (GEMINI_ASYNC_CONCURRENCY)."""
+    try:
+        value = int(os.getenv("GEMINI_ASYNC_CONCURRENCY", "100"))
+    except ValueError:
+        value = 100
+    return max(1, min(value, 1000))
+
+
+async def process_single_product_async(
+    idx: int,
+    row_dict: Dict[str, Any],
+    eksik_sutunlar: List[str],
+    output_lang: str = "tr",
+    gemini_output: Optional[Dict[str, Any]] = None,
+) -> Tuple[int, Dict[str, Any]]:
+    """tasks._process_single_product'ın asyncio sürümü (aynı adımlar, aynı sonuç)."""
+    from main import urun_isle_async, gemini_eksik_sutunlar_toplu_sor_async
+    from tasks import (
+        _apply_gemini_output, _remaining_missing, _fill_from_search, _apply_fill, _copy_derived_columns,
+        _followup_columns,
+    )
+
+    if gemini_output is None:
+        gemini_output = await urun_isle_async(
+            row_dict,
+            eksik_sutunlar=eksik_sutunlar if eksik_sutunlar else None,
+            output_lang=output_lang,
+        )
+    flat_result = _apply_gemini_output(row_dict, gemini_output)
+
+    if os.getenv("GEMINI_EKSIK_SUTUN", "1") == "1":
+        kalan_eksik = _remaining_missing(flat_result, eksik_sutunlar)
+        # googlesearch bloklayan HTTP yapar → thread'e al (context, metrics bağıyla birlikte kopyalanır)
+        await asyncio.to_thread(_fill_from_search, row_dict, flat_result, kalan_eksik)
+        kalan_eksik = _followup_columns(gemini_output, kalan_eksik)
+
+        if kalan_eksik:
+            try:
+                job_metrics.incr("followup_calls")
+                ek_doldurma = await gemini_eksik_sutunlar_toplu_sor_async(
+                    urun_adi=row_dict.get("Başlık", ""),
+                    eksik_sutunlar=kalan_eksik,
+                    marka=row_dict.get("Marka"),
+                    output_lang=output_lang,
+                )
+                _apply_fill(flat_result, ek_doldurma)
+            except Exception:
+                pass
+
+    _copy_derived_columns(flat_result)
+    return (idx, flat_result)
+
+
+async def process_batch_async(
+    items: List[Item],
+    output_lang: str = "tr",
+    metrics: Optional[JobMetrics] = None,
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """tasks._process_product_batch'in asyncio sürümü."""
+    from main import urun_isle_toplu_async
+    from tasks import _error_row
+
+    with job_metrics.bind(metrics):
+        toplu_cikti: Dict[int, Dict[str, Any]] = {}
+        if len(items) > 1:
+            toplu_cikti = await urun_isle_toplu_async(
+                [(idx, row_dict, eksik) for idx, row_dict, eksik in items],
+                output_lang=output_lang,
+            )
+
+        async def _one(item: Item) -> Tuple[int, Dict[str, Any]]:
+            idx, row_dict, eksik_sutunlar = item
+            try:
+                return await process_single_product_async(
+                    idx, row_dict, eksik_sutunlar, output_lang, gemini_output=toplu_cikti.get(idx)
+                )
+            except Exception as e:
+                return (idx, _error_row(row_dict, e))
+
+        return list(await asyncio.gather(*(_one(item) for item in items)))
+
+
+async def process_variant_group_async(
+    group: Any,
+    rep_result: Optional[Dict[str, Any]],
+    output_lang: str = "tr",
+    metrics: Optional[JobMetrics] = None,
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """tasks._process_variant_group'un asyncio sürümü."""
+    from main import varyant_farklarini_sor_async
+    from tasks import _variant_plan, _variant_results
+
+    plan = _variant_plan(group, rep_result)
+    if plan is None:
+        return await process_batch_async(group.siblings, output_lang, metrics)
+    sorulacak, farkli_by_idx = plan
+
+    with job_metrics.bind(metrics):
+        cevaplar = (
+            await varyant_farklarini_sor_async(group.representative[1], rep_result, sorulacak, output_lang)
+            if sorulacak else {}
+        )
+        results, fallback = _variant_results(group, rep_result, farkli_by_idx, cevaplar, sorulacak)
+    if fallback:
+        results.extend(await process_batch_async(fallback, output_lang, metrics))
+    return results
+
+
+async def _run(
+    batches: List[List[Item]],
+    output_lang: str,
+    metrics: Optional[JobMetrics],
+    on_batch: BatchCallback,
+    controller: AIMDController,
+    process: Optional[BatchProcessor] = None,
+    on_start: Optional[Callable[[List[Item]], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> None:
+    from tasks import _error_row
+
+    gate = AsyncGate(controller)
+    loop = asyncio.get_running_loop()
+    # Geri çağrılar tek thread'de, gönderildikleri sırayla (on_start → on_batch sırası korunur)
+    writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-writer")
+
+    def _off_loop(fn: Callable[..., Any], *args: Any) -> Awaitable[Any]:
+        return loop.run_in_executor(writer, functools.partial(contextvars.copy_context().run, fn, *args))
+
+    if process is None:
+        async def process(items: List[Item]):
+            return await process_batch_async(items, output_lang, metrics)
+
+    async def _guarded(items: List[Item]):
+        async with gate:
+            # Durdurma istendiyse yeni batch başlamaz; uçuştakiler tamamlanıp kaydedilir
+            if should_stop is not None and await _off_loop(should_stop):
+                return items, None
+            if on_start is not None:
+                await _off_loop(on_start, items)
+            try:
+                return items, await process(items)
+            except Exception as e:
+                return items, [(idx, _error_row(row_dict, e)) for idx, row_dict, _ in items]
+
+    # Görevler sırayla oluşturulur ki kapıya batch sırasıyla girilsin
+    # (as_completed çıplak coroutine'leri bir küme üzerinden, rastgele sırada başlatır)
+    tasks = [asyncio.ensure_future(_guarded(items)) for items in batches]
+    try:
+        for done in asyncio.as_completed(tasks):
+            items, results = await done
+            if results is not None:
+                await _off_loop(on_batch, items, results)
+    finally:
+        # Thread bitince thread'e bağlı SQLite bağlantıları da kapanır
+        writer.shutdown(wait=True)
+
+
+def run_batches(
+    batches: List[List[Item]],
+    output_lang: str,
+    metrics: Optional[JobMetrics],
+    on_batch: BatchCallback,
+    controller: Optional[AIMDController] = None,
+    process: Optional[BatchProcessor] = None,
+    on_start: Optional[Callable[[List[Item]], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> None:
+    """
+    Batch'leri tek event loop'ta işler; her batch tamamlandığında on_batch(items, results)
+    yazıcı thread'de çağrılır (checkpoint / status yazımı için; on_start ve should_stop da orada, sırayla).
+    controller verilmezse limit sabit async_concurrency() olur.
+    process verilmezse her batch process_batch_async ile işlenir.
+    on_start(items): batch eşzamanlılık kapısından geçip işlenmeye başlarken (in_flight durumu için).
+    should_stop(): True dönerse kalan batch'ler başlatılmadan atlanır (on_batch çağrılmaz).
+    """
+    if controller is None:
+        limit = async_concurrency()
+        controller = AIMDController(initial=limit, maximum=limit, adaptive=False)
+    asyncio.run(_run(batches, output_lang, metrics, on_batch, controller, process, on_start, should_stop))
@@ -0,0 +1,176 @@
+"""
+Offline end-to-end benchmark for process_catalog_job (mock LLM backend, no API key / Celery worker).
+
+Sentetik katalog üretir, job'u doğrudan (Celery'siz) çalıştırır ve verimi raporlar.
+
+Örnek:
+    python benchmark.py --rows 2000 --latency lognormal:0.8,0.3 --rate-429 0.02
+    python benchmark.py --rows 500 --engine thread --batch 5 --rpm 600
+    python benchmark.py --input jobs/<job_id>/upload.xlsx --replay jobs/rec --latency-scale 0.5
+    python benchmark.py --materialize --rows 2000 --columns 3000   # Excel yazıcıları: bellek / süre
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+
+def synthetic_catalog(rows: int, seed: int = 0):
+    """Marka + model kodu + renk varyantları olan örnek katalog."""
+    import pandas as pd
+
+    rng = random.Random(seed)
+    markalar = ["Hisense", "Samsung", "Bosch", "Arçelik", "Philips", "Tefal"]
+    kategoriler = {
+        "Klima": ["Kapasite", "Enerji Sınıfı"],
+        "Laptop": ["RAM Bellek Boyutu", "Sabit disk kapasitesi", "İşletim Sistemi"],
+        "KETTLE": ["Kapasite", "Güç"],
+    }
+    renkler = ["Siyah", "Beyaz", "Gri", "Kırmızı"]
+    kolonlar = sorted({c for cs in kategoriler.values() for c in cs})
+    kayitlar = []
+    for i in range(rows):
+        kategori = rng.choice(list(kategoriler))
+        marka = rng.choice(markalar)
+        kod = f"{marka[:2].upper()}{rng.randint(100, 999)}X{i // 3}"
+        kayit = {
+            "SHOP_SKU": f"SKU{i}",
+            "Başlık": f"{marka} {kategori} {kod} {rng.choice(renkler)}",
+            "Marka": marka,
+            "Kategori": kategori,
+            "Renk (temel)": None,
+            "EAN": None,
+        }
+        for kolon in kolonlar:
+            kayit[kolon] = None
+        kayitlar.append(kayit)
+    return pd.DataFrame(kayitlar)
+
+
+def materialize_benchmark(rows: int, columns: int, fill: float = 0.05, seed: int = 0) -> dict:
+    """
+    Geniş (Mirakl benzeri) checkpoint'i iki yazıcıyla Excel'e yazar: akışlı (openpyxl write-only)
+    ve eski yol (DataFrame.to_excel). Her biri için süre ve tracemalloc tepe belleği.
+    """
+    import tracemalloc
+    from pathlib import Path
+
+    from checkpoint import CheckpointStore
+
+    rng = random.Random(seed)
+    tmp_dir = Path(tempfile.mkdtemp(prefix="bench_xlsx_"))
+    store = CheckpointStore(tmp_dir / "checkpoint.sqlite")
+    sutunlar = ["SHOP_SKU", "Başlık"] + [f"ATTR_{i}" for i in range(columns - 2)]
+    store.set_columns(sutunlar)
+    dolu = max(1, int(columns * fill))
+    for baslangic in range(0, rows, 500):
+        parca = []
+        for i in range(baslangic, min(rows, baslangic + 500)):
+            kayit = {"SHOP_SKU": f"SKU{i}", "Başlık": f"Ürün {i}"}
+            for sutun in rng.sample(sutunlar[2:], min(dolu, len(sutunlar) - 2)):
+                kayit[sutun] = rng.choice(["Siyah", "220 V", "1.5 kg", 42, 3.5])
+            parca.append((i, kayit))
+        store.put_many(parca)
+
+    sonuc = {"rows": rows, "columns": columns, "fill": fill}
+    for writer in ("stream", "pandas"):
+        tracemalloc.start()
+        start = time.perf_counter()
+        store.materialize(tmp_dir / f"output_{writer}.xlsx", force=True, writer=writer)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        sonuc[writer] = {
+            "seconds": round(elapsed, 2),
+            "peak_mb": round(peak / 1024 / 1024, 1),
+            "file_mb": round((tmp_dir / f"output_{writer}.xlsx").stat().st_size / 1024 / 1024, 2),
+        }
+    store.close()
+    sonuc["dir"] = str(tmp_dir)
+    return sonuc
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="process_catalog_job offline benchmark (LLM_BACKEND=mock)")
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--engine", choices=["async", "thread"], default="async")
+    parser.add_argument("--batch", type=int, default=1, help="GEMINI_BATCH_SIZE")
+    parser.add_argument("--latency", default="lognormal:0.8,0.3", help="MOCK_LLM_LATENCY")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="MOCK_LLM_429_RATE")
+    parser.add_argument("--rpm", type=int, default=0, help="MOCK_LLM_RPM (sahte sunucu kotası)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="Gemini cache açık kalsın")
+    parser.add_argument("--web-search", action="store_true", help="EAN/boyut internet aramaları açık kalsın")
+    parser.add_argument("--input", help="Sentetik katalog yerine bu Excel / job girdisi (örn. jobs/<id>/upload.xlsx veya input.arrow)")
+    parser.add_argument("--record", help="LLM_RECORD: trafiği bu arşive kaydet")
+    parser.add_argument("--replay", help="LLM_REPLAY: yanıtları bu arşivden (dosya/klasör) oynat")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="REPLAY_LATENCY_SCALE")
+    parser.add_argument("--materialize", action="store_true", help="Sadece Excel yazıcılarını karşılaştır (LLM yok)")
+    parser.add_argument("--columns", type=int, default=3000, help="--materialize: sütun sayısı")
+    parser.add_argument("--fill", type=float, default=0.05, help="--materialize: satır başına dolu sütun oranı")
+    args = parser.parse_args()
+
+    if args.materialize:
+        print(json.dumps(materialize_benchmark(args.rows, args.columns, args.fill, args.seed), ensure_ascii=False, indent=2))
+        return
+
+    jobs_dir = tempfile.mkdtemp(prefix="bench_jobs_")
+    os.environ.update(
+        LLM_BACKEND="mock",
+        JOBS_BASE_DIR=jobs_dir,
+        GEMINI_ENGINE=args.engine,
+        GEMINI_BATCH_SIZE=str(args.batch),
+        MOCK_LLM_LATENCY=args.latency,
+        MOCK_LLM_429_RATE=str(args.rate_429),
+        MOCK_LLM_RPM=str(args.rpm),
+        MOCK_LLM_SEED=str(args.seed),
+        GEMINI_CACHE="1" if args.cache else "0",
+        WEB_SEARCH="1" if args.web_search else "0",
+    )
+    os.environ.setdefault("GEMINI_RATE_LIMIT", "memory")
+    if args.record:
+        os.environ["LLM_RECORD"] = args.record
+    if args.replay:
+        os.environ.update(LLM_REPLAY=args.replay, REPLAY_LATENCY_SCALE=str(args.latency_scale))
+
+    import tasks
+
+    if args.input and args.input.endswith(".arrow"):
+        import job_input
+        from pathlib import Path
+
+        df = job_input.read_input(Path(args.input).parent)
+    elif args.input:
+        import pandas as pd
+
+        df = pd.read_excel(args.input)
+    else:
+        df = synthetic_catalog(args.rows, args.seed)
+    rows = len(df)
+    job_id = tasks.create_job_from_dataframe(df)
+    start = time.perf_counter()
+    status = tasks.process_catalog_job(job_id)
+    elapsed = time.perf_counter() - start
+
+    ozet = {
+        "rows": rows,
+        "engine": args.engine,
+        "batch": args.batch,
+        "seconds": round(elapsed, 2),
+        "rows_per_s": round(rows / elapsed, 2) if elapsed else None,
+        "api_calls": status.get("api_calls"),
+        "calls_per_row": status.get("calls_per_row"),
+        "rate_limit_429": (status.get("concurrency") or {}).get("rate_limit_429"),
+        "final_concurrency": (status.get("concurrency") or {}).get("limit"),
+        "replay_misses": status.get("replay_misses"),
+        "jobs_dir": jobs_dir,
+    }
+    print(json.dumps(ozet, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
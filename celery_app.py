@@ -30,6 +30,9 @@ def make_celery() -> Celery:
         timezone="Europe/Istanbul",
         enable_utc=True,
         include=["tasks"],
+        # Redis broker'da görev önceliği (POST /jobs priority → 0 en yüksek … 9)
+        broker_transport_options={"priority_steps": list(range(10)), "queue_order_strategy": "priority"},
+        task_default_priority=5,
     )
 
     return app
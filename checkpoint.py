@@ -0,0 +1,372 @@
+"""
+Append-only per-row checkpoint store (SQLite) for processed catalog rows.
+
+Her tamamlanan satır (index → sonuç sözlüğü) tek bir transaction ile eklenir; tüm sonuçları
+sıralayıp output.xlsx'i yeniden yazmak yerine sadece yeni satırlar diske gider. Excel çıktısı
+job bittiğinde veya indirme isteğinde materialize() ile bir kez üretilir.
+
+Her satırla birlikte girdi satırının hash'i (row_hash) saklanır: devam ederken bir satır ancak
+checkpoint'te varsa ve girdisi değişmemişse atlanır (önceki çıktıyı okumaya gerek yok).
+Değişen sütunların listesi de (changed_columns) saklanır; önizleme sayfaları (page) sadece
+değişen satırları SQL ile süzebilir. Hata placeholder'ı olarak yazılan satırlar failed bayrağıyla
+işaretlenir: devam ederken bunlar atlanmaz, yeniden denenir (geçici 429 / zaman aşımı kalıcı olmasın).
+
+Excel yazımı varsayılan olarak akışlıdır (openpyxl write-only): satırlar checkpoint'ten imleçle
+okunup orijinal sütun sırasıyla doğrudan dosyaya yazılır; bellekte DataFrame / tam workbook kurulmaz,
+tepe bellek satır sayısından bağımsızdır. OUTPUT_WRITER=pandas eski yolu (DataFrame.to_excel) kullanır.
+
+Dosya: jobs/<job_id>/checkpoint.sqlite (main() için: <çıktı dosyası>.checkpoint.sqlite)
+"""
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+def _jsonable(value: Any) -> Any:
+    """json.dumps default: numpy/pandas skalerleri, tarih ve NaT."""
+    if hasattr(value, "item"):
+        try:
+            return value.item()
+        except (ValueError, TypeError):
+            pass
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    text = str(value)
+    return None if text in ("NaT", "nan", "<NA>") else text
+
+
+def _dumps(result: Dict[str, Any], sort_keys: bool = False) -> str:
+    # NaN → null: pandas boş hücreleri tekrar NaN olarak okur
+    temiz = {
+        str(k): (None if isinstance(v, float) and math.isnan(v) else v)
+        for k, v in result.items()
+    }
+    return json.dumps(temiz, ensure_ascii=False, default=_jsonable, sort_keys=sort_keys)
+
+
+def row_hash(row_dict: Dict[str, Any]) -> str:
+    """Girdi satırının içerik hash'i (sütun sırasından bağımsız)."""
+    return hashlib.sha256(_dumps(row_dict, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _cell(value: Any) -> Optional[str]:
+    """Karşılaştırma için hücre: boş / NaN → None, 42.0 → "42", metin kırpılır."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if hasattr(value, "item"):
+        try:
+            value = value.item()
+        except (ValueError, TypeError):
+            pass
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip()
+    return None if text in ("", "nan", "NaT", "<NA>") else text
+
+
+def changed_columns(row_dict: Dict[str, Any], result: Dict[str, Any]) -> List[str]:
+    """Sonuçta girdiden farklı olan sütunlar (eklenen sütunlar dahil), sonuç sırasıyla."""
+    return [str(k) for k, v in result.items() if _cell(v) != _cell(row_dict.get(k))]
+
+
+class CheckpointStore:
+    """
+    index → sonuç satırı. One connection per thread; WAL mode so the API process can read
+    (download / status) while the worker appends.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                idx INTEGER PRIMARY KEY,
+                result TEXT NOT NULL,
+                updated REAL NOT NULL,
+                input_hash TEXT
+            )
+            """
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(rows)")}
+        if "input_hash" not in columns:
+            conn.execute("ALTER TABLE rows ADD COLUMN input_hash TEXT")
+        # changed: değişen sütunlar (JSON listesi); NULL = bilinmiyor (eski kayıt / main())
+        if "changed" not in columns:
+            conn.execute("ALTER TABLE rows ADD COLUMN changed TEXT")
+        # failed: 1 = hata placeholder'ı, 0 = başarılı; NULL = bilinmiyor (eski kayıt, failed_indices doldurur)
+        if "failed" not in columns:
+            conn.execute("ALTER TABLE rows ADD COLUMN failed INTEGER")
+        # tail / recent: son eklenenler tüm tabloyu taramadan
+        conn.execute("CREATE INDEX IF NOT EXISTS rows_updated ON rows (updated)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put_many(
+        self,
+        rows: Iterable[Tuple[int, Dict[str, Any]]],
+        input_hashes: Optional[Dict[int, str]] = None,
+        changes: Optional[Dict[int, List[str]]] = None,
+        failed: Optional[Dict[int, bool]] = None,
+    ) -> int:
+        """
+        Satırları tek transaction'da ekle (aynı index tekrar gelirse son sonuç geçerli).
+        input_hashes: index → row_hash(girdi satırı); devam ederken değişen girdiler yeniden işlenir.
+        changes: index → changed_columns(girdi, sonuç); page(only_changed=True) için.
+        failed: index → sonuç hata placeholder'ı mı; devam ederken hatalı satırlar yeniden işlenir.
+        """
+        now = time.time()
+        hashes = input_hashes or {}
+        changes = changes or {}
+        failed = failed or {}
+        data = []
+        for idx, result in rows:
+            changed = changes.get(int(idx))
+            flag = failed.get(int(idx))
+            data.append((
+                int(idx), _dumps(result), now, hashes.get(int(idx)),
+                json.dumps(changed, ensure_ascii=False) if changed is not None else None,
+                None if flag is None else int(bool(flag)),
+            ))
+        if not data:
+            return 0
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO rows (idx, result, updated, input_hash, changed, failed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                data,
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(data)
+
+    def drop_from(self, n: int) -> int:
+        """index >= n olan satırları sil (girdi kısaldı: eski satırlar çıktıda kalmasın). Silinen sayısı."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            dropped = conn.execute("DELETE FROM rows WHERE idx >= ?", (int(n),)).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return dropped
+
+    def put(self, idx: int, result: Dict[str, Any], input_hash: Optional[str] = None) -> None:
+        self.put_many([(idx, result)], {int(idx): input_hash} if input_hash else None)
+
+    def get(self, idx: int) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT result FROM rows WHERE idx = ?", (int(idx),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def indices(self) -> Set[int]:
+        return {r[0] for r in self._conn().execute("SELECT idx FROM rows")}
+
+    def input_hashes(self) -> Dict[int, Optional[str]]:
+        """index → kayıtlı girdi hash'i (hash'siz eski kayıtlar için None)."""
+        return {r[0]: r[1] for r in self._conn().execute("SELECT idx, input_hash FROM rows")}
+
+    def failed_flags(self) -> Dict[int, bool]:
+        """index → hata bayrağı; bayrağı bilinmeyen eski kayıtlar dahil edilmez."""
+        return {
+            r[0]: bool(r[1])
+            for r in self._conn().execute("SELECT idx, failed FROM rows WHERE failed IS NOT NULL")
+        }
+
+    def failed_indices(self, is_failed: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Set[int]:
+        """
+        Hata placeholder'ı olarak kaydedilmiş satırlar.
+        is_failed: bayrağı olmayan (failed sütunundan önceki) kayıtlar sonuçlarına bakılarak
+        bir kez sınıflandırılır ve bayrak yazılır; sonraki çağrılar sonuç okumaz.
+        """
+        conn = self._conn()
+        if is_failed is not None:
+            flags = [
+                (int(is_failed(json.loads(result))), idx)
+                for idx, result in conn.execute("SELECT idx, result FROM rows WHERE failed IS NULL")
+            ]
+            if flags:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany("UPDATE rows SET failed = ? WHERE idx = ?", flags)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        return {r[0] for r in conn.execute("SELECT idx FROM rows WHERE failed = 1")}
+
+    def count(self) -> int:
+        return int(self._conn().execute("SELECT COUNT(*) FROM rows").fetchone()[0])
+
+    def items(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """(index, sonuç) - index sırasıyla."""
+        for idx, result in self._conn().execute("SELECT idx, result FROM rows ORDER BY idx"):
+            yield idx, json.loads(result)
+
+    def changes(self) -> Dict[int, Optional[List[str]]]:
+        """index → değişen sütunlar (bilinmiyorsa None)."""
+        return {
+            r[0]: json.loads(r[1]) if r[1] is not None else None
+            for r in self._conn().execute("SELECT idx, changed FROM rows")
+        }
+
+    def page(
+        self, offset: int = 0, limit: int = 100, only_changed: bool = False
+    ) -> Tuple[int, List[Tuple[int, Dict[str, Any], Optional[List[str]]]]]:
+        """
+        (eşleşen satır sayısı, [(index, sonuç, değişen sütunlar)]) - index sırasıyla bir sayfa.
+        only_changed: değişikliği olmayan satırlar atlanır (değişikliği bilinmeyenler dahil edilir).
+        """
+        where = " WHERE changed IS NULL OR changed != '[]'" if only_changed else ""
+        conn = self._conn()
+        total = int(conn.execute(f"SELECT COUNT(*) FROM rows{where}").fetchone()[0])
+        rows = conn.execute(
+            f"SELECT idx, result, changed FROM rows{where} ORDER BY idx LIMIT ? OFFSET ?",
+            (int(limit), int(offset)),
+        ).fetchall()
+        return total, [
+            (idx, json.loads(result), json.loads(changed) if changed is not None else None)
+            for idx, result, changed in rows
+        ]
+
+    def recent(self, n: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """En son eklenen n satır (index, sonuç) - eskiden yeniye."""
+        rows = self._conn().execute(
+            "SELECT idx, result FROM rows ORDER BY updated DESC, idx DESC LIMIT ?", (int(n),)
+        ).fetchall()
+        return [(idx, json.loads(result)) for idx, result in reversed(rows)]
+
+    def tail(self, n: int) -> List[Dict[str, Any]]:
+        """En son eklenen n satır (eskiden yeniye)."""
+        return [result for _, result in self.recent(n)]
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        self._conn().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _version(self) -> str:
+        row = self._conn().execute("SELECT COUNT(*), COALESCE(MAX(updated), 0) FROM rows").fetchone()
+        return f"{row[0]}:{row[1]}"
+
+    def set_columns(self, columns: List[str]) -> None:
+        """Çıktının sütun sırası (orijinal Excel başlıkları); indirme anında materialize için saklanır."""
+        self.set_meta("columns", json.dumps([str(c) for c in columns], ensure_ascii=False))
+
+    def columns(self) -> Optional[List[str]]:
+        value = self.get_meta("columns")
+        return json.loads(value) if value else None
+
+    def result_columns(self) -> List[str]:
+        """Önizleme / çıktı sütunları: kayıtlı sıra (set_columns), yoksa satırlardaki anahtarlar."""
+        return self.columns() or self._all_keys()
+
+    def _all_keys(self) -> List[str]:
+        """Sütun listesi kayıtlı değilse: satırlardaki anahtarlar, ilk görülme sırasıyla."""
+        keys: Dict[str, None] = {}
+        for _, result in self.items():
+            keys.update(dict.fromkeys(result))
+        return list(keys)
+
+    def materialize(
+        self,
+        xlsx_path: Path,
+        columns: Optional[List[str]] = None,
+        force: bool = False,
+        writer: Optional[str] = None,
+    ) -> bool:
+        """
+        Checkpoint'teki satırları index sırasıyla Excel'e yaz (orijinal sütunlar ve sırası).
+        Son materialize'dan beri yeni satır yoksa dosyaya dokunmaz. Yazıldıysa True.
+        writer: "stream" (varsayılan, OUTPUT_WRITER) | "pandas"
+        """
+        columns = columns or self.columns()
+        version = self._version()
+        xlsx_path = Path(xlsx_path)
+        if not force and xlsx_path.exists() and self.get_meta("materialized") == version:
+            return False
+        if self.count() == 0:
+            return False
+        # Worker (job sonu) ve API (indirme) aynı anda yazabilir: process/thread'e özel geçici dosya
+        tmp = xlsx_path.with_name(f"{xlsx_path.stem}.{os.getpid()}-{threading.get_ident()}.tmp{xlsx_path.suffix}")
+        writer = (writer or os.getenv("OUTPUT_WRITER", "stream")).strip().lower()
+        try:
+            if writer == "pandas":
+                self._write_pandas(tmp, columns)
+            else:
+                self._write_stream(tmp, columns or self._all_keys())
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        tmp.replace(xlsx_path)
+        self.set_meta("materialized", version)
+        return True
+
+    def _write_pandas(self, path: Path, columns: Optional[List[str]]) -> None:
+        import pandas as pd
+
+        out_df = pd.DataFrame([result for _, result in self.items()])
+        if columns:
+            out_df = out_df.reindex(columns=columns)
+        out_df.to_excel(path, index=False)
+
+    def _write_stream(self, path: Path, columns: List[str]) -> None:
+        """openpyxl write-only: satır satır yaz; başlık pandas.to_excel ile aynı görünümde."""
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+        from openpyxl.styles import Alignment, Border, Font, Side
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Sheet1")
+        font = Font(bold=True)
+        border = Border(*(Side(style="thin"),) * 4)
+        alignment = Alignment(horizontal="center", vertical="top")
+        header = []
+        for name in columns:
+            cell = WriteOnlyCell(ws, value=name)
+            cell.font, cell.border, cell.alignment = font, border, alignment
+            header.append(cell)
+        ws.append(header)
+        for _, result in self.items():
+            row = []
+            for name in columns:
+                value = result.get(name)
+                if isinstance(value, str):
+                    value = ILLEGAL_CHARACTERS_RE.sub("", value)
+                elif isinstance(value, (dict, list)):
+                    value = json.dumps(value, ensure_ascii=False)
+                row.append(value)
+            ws.append(row)
+        wb.save(path)
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
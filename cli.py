@@ -0,0 +1,232 @@
+"""
+Command-line catalog cleaning on the same engine as the service (no Celery worker / Redis needed).
+
+    python -m cli clean girdi.xlsx cikti.xlsx --workers 20 --batch 5
+
+Girdi sabit kimlikli bir job olarak kaydedilir (jobs/local-<çıktı yolunun hash'i>) ve
+tasks.process_catalog_job bu process'te doğrudan çağrılır: asyncio motoru + AIMD eşzamanlılık,
+satır checkpoint'i, Gemini cache, sütun budama ve varyant gruplama Celery yoluyla aynıdır.
+Aynı çıktı için tekrar çalıştırmak checkpoint'ten devam eder (girdisi değişen satırlar yeniden işlenir;
+giriş dosyası değişmediyse Excel yeniden okunmaz). Eski main() checkpoint'i (<çıktı>.checkpoint.sqlite)
+ilk çalıştırmada job'a aktarılır. dashboard.py aynı fonksiyonu local_runner.py üzerinden çalıştırır.
+
+Ctrl+C: ilk basışta yeni batch başlamaz (pause_job ile aynı bayrak), uçuştakiler checkpoint'e yazılır
+ve o ana kadarki çıktı kaydedilir; ikinci basış beklemeden çıkar.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import signal
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+import job_input
+import job_state
+import tasks
+from checkpoint import CheckpointStore
+from job_state import DONE, FAILED, PAUSE
+from progress_record import COMPLETE, STOPPED, ProgressRecord, progress_path
+
+LANGUAGES = ("tr", "en", "de", "it")
+
+
+def local_job_id(output_file: str) -> str:
+    """Çıktı dosyasına bağlı sabit job kimliği (aynı çıktı → aynı checkpoint)."""
+    digest = hashlib.sha1(os.path.abspath(output_file).encode("utf-8")).hexdigest()[:16]
+    return f"local-{digest}"
+
+
+def apply_options() -> None:
+    """
+    Yerel çalıştırma varsayılanları. --workers / --engine env'e yazılmaz, process_catalog_job'a
+    argüman olarak geçer: dashboard'un uzun ömürlü process'inde bir işin ayarı sonrakine kalmaz.
+    """
+    # Tek yerel job: adil paylaşım kuyruğu ve SSE yayını gereksiz
+    os.environ.setdefault("JOB_SCHEDULER", "0")
+    os.environ.setdefault("JOB_EVENTS", "off")
+
+
+def _import_main_checkpoint(job_id: str, output_file: str, total: int) -> int:
+    """
+    Eski main() checkpoint'ini (<çıktı>.checkpoint.sqlite) job'a aktar; job'un checkpoint'i boşsa bir kez.
+    total: girdideki ürün sayısı (fazlası aktarılmaz).
+    """
+    legacy_path = Path(str(output_file) + ".checkpoint.sqlite")
+    if not legacy_path.exists():
+        return 0
+    store = tasks._checkpoint(job_id)
+    try:
+        if store.count():
+            return 0
+        legacy = CheckpointStore(legacy_path)
+        try:
+            hashes = legacy.input_hashes()
+            rows = ((idx, result) for idx, result in legacy.items() if idx < total)
+            return store.put_many(rows, {i: h for i, h in hashes.items() if h})
+        finally:
+            legacy.close()
+    finally:
+        store.close()
+
+
+def _last_products(store: CheckpointStore, titles: Dict[int, Any], n: int = 5) -> List[Dict[str, Any]]:
+    return [
+        {"Orijinal_Baslik": titles.get(idx), "Temiz_Baslik": result.get("Başlık")}
+        for idx, result in store.recent(n)
+    ]
+
+
+def _update_record(job_id: str, record: ProgressRecord, store: CheckpointStore, titles: Dict[int, Any]) -> None:
+    progress = job_state.get_store().progress(job_id)
+    # Job başında satır durumları checkpoint'ten yeniden kurulana kadar sayaç geri gitmesin
+    processed = max(record.processed, progress[DONE] + progress[FAILED])
+    record.update(processed, progress[FAILED], _last_products(store, titles))
+
+
+def _watch_progress(job_id: str, record: ProgressRecord, titles: Dict[int, Any], stop: threading.Event) -> None:
+    """İlerleme kaydını job-state sayaçlarından güncelle (yarım saniyede bir; dashboard.py okur)."""
+    store = tasks._checkpoint(job_id)
+    try:
+        while not stop.wait(0.5):
+            _update_record(job_id, record, store, titles)
+    finally:
+        store.close()
+
+
+def _install_interrupt(job_id: str) -> Callable[[], None]:
+    """Ctrl+C: ilk basış job'u duraklatır, ikincisi KeyboardInterrupt. Dönen: eski handler'ı geri yükler."""
+    if threading.current_thread() is not threading.main_thread():
+        return lambda: None
+    requested = False
+
+    def _handler(signum, frame) -> None:
+        nonlocal requested
+        if requested:
+            raise KeyboardInterrupt
+        requested = True
+        print("\n⏸️  Durduruluyor: uçuştaki istekler tamamlanıyor (hemen çıkmak için tekrar Ctrl+C)...", flush=True)
+        # Bayrak ayrı thread'de yazılır: handler bu thread'in açık bir SQLite işleminin ortasında çalışabilir
+        threading.Thread(target=job_state.get_store().set_control, args=(job_id, PAUSE), daemon=True).start()
+
+    previous = signal.signal(signal.SIGINT, _handler)
+    return lambda: signal.signal(signal.SIGINT, previous)
+
+
+def _source(input_file: str) -> List[Any]:
+    """Giriş dosyasının kimliği (yol, mtime, boyut); değişmediyse kayıtlı girdi yeniden kullanılır."""
+    info = os.stat(input_file)
+    return [os.path.abspath(input_file), info.st_mtime, info.st_size]
+
+
+def _registered_input(job_id: str, source: List[Any]) -> bool:
+    return (
+        tasks._read_job_config(job_id).get("source") == source
+        and job_input.input_exists(tasks._job_dir(job_id))
+        and job_state.get_store().exists(job_id)
+    )
+
+
+def clean_file(
+    input_file: str,
+    output_file: str,
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    language: str = "tr",
+    engine: Optional[str] = None,
+    stop: Optional[threading.Event] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    input_file'ı temizleyip output_file'a yaz; önceki çalışmanın checkpoint'inden devam eder.
+    stop: set edilirse job duraklatılır (local_runner; job kaydından önce gelse de kaybolmaz).
+    Dönen: tasks.read_job_status (phase complete / paused / processing); girdi okunamazsa None.
+    """
+    apply_options()
+    if not os.path.exists(input_file):
+        print(f"❌ Dosya bulunamadı: {input_file}", flush=True)
+        return None
+    job_id = local_job_id(output_file)
+    source = _source(input_file)
+    if _registered_input(job_id, source):
+        # Aynı giriş dosyası: job'un Arrow girdisi kullanılır, Excel yeniden okunmaz
+        rows, _ = tasks._load_job_frame(job_id)
+        job_state.get_store().set_control(job_id, None)
+        tasks._update_job_config(job_id, language=language, batch_size=batch_size, phase=tasks.PHASE_QUEUED)
+        print(f"✅ Kayıtlı girdi kullanılıyor: {len(rows)} ürün", flush=True)
+    else:
+        print(f"📂 Excel okunuyor: {input_file}", flush=True)
+        try:
+            df = pd.read_excel(input_file)
+        except Exception as e:
+            print(f"❌ Dosya okunurken hata oluştu: {str(e)}", flush=True)
+            return None
+        if df.empty or len(df.columns) == 0:
+            print("❌ Excel dosyasında ürün satırı yok", flush=True)
+            return None
+        rows = df.iloc[1:].reset_index(drop=True) if tasks._is_technical_header(df) else df
+        print(f"✅ Dosya okundu: {len(rows)} ürün", flush=True)
+        tasks.create_job_from_dataframe(df, language, batch_size, job_id=job_id)
+        tasks._update_job_config(job_id, source=source)
+        imported = _import_main_checkpoint(job_id, output_file, len(rows))
+        if imported:
+            print(f"♻️  Önceki main() checkpoint'inden {imported} ürün aktarıldı", flush=True)
+    if stop is not None and stop.is_set():
+        job_state.get_store().set_control(job_id, PAUSE)
+
+    store = tasks._checkpoint(job_id)
+    titles = rows["Başlık"].to_dict() if "Başlık" in rows.columns else {}
+    record = ProgressRecord(progress_path(output_file), input_file, len(rows), min(store.count(), len(rows)))
+    watcher_stop = threading.Event()
+    watcher = threading.Thread(target=_watch_progress, args=(job_id, record, titles, watcher_stop), daemon=True)
+    watcher.start()
+    restore = _install_interrupt(job_id)
+    try:
+        status = tasks.process_catalog_job(job_id, workers=workers, engine=engine)
+    except KeyboardInterrupt:
+        print("\n⚠️  İşlem kullanıcı tarafından durduruldu!", flush=True)
+        status = tasks.read_job_status(job_id)
+    finally:
+        restore()
+        watcher_stop.set()
+        watcher.join()
+
+    complete = status.get("phase") == tasks.PHASE_COMPLETE
+    try:
+        _update_record(job_id, record, store, titles)
+        record.finish(COMPLETE if complete else STOPPED)
+        store.materialize(Path(output_file), force=True)
+        toplam = store.count()
+    finally:
+        store.close()
+    if complete:
+        print(f"\n✅ Bitti! Toplam {toplam} ürün işlendi. Dosya: '{output_file}'", flush=True)
+    else:
+        print(f"💾 Mevcut ilerleme kaydedildi: {toplam} ürün. Kaldığı yerden devam etmek için tekrar başlatın.", flush=True)
+    return status
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Katalog temizleme (servisle aynı motor; Celery gerekmez)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    clean = commands.add_parser("clean", help="Excel kataloğunu temizle (kaldığı yerden devam eder)")
+    clean.add_argument("input", help="Girdi Excel dosyası")
+    clean.add_argument("output", help="Çıktı Excel dosyası")
+    clean.add_argument("--workers", type=int, help="Eşzamanlı istek üst sınırı (GEMINI_PARALLEL_WORKERS)")
+    clean.add_argument("--batch", type=int, help="İstek başına ürün (GEMINI_BATCH_SIZE)")
+    clean.add_argument("--language", choices=LANGUAGES, default="tr", help="Çıktı dili")
+    clean.add_argument("--engine", choices=["async", "thread"], help="GEMINI_ENGINE")
+    args = parser.parse_args(argv)
+
+    status = clean_file(args.input, args.output, args.workers, args.batch, args.language, args.engine)
+    if status is None:
+        return 1
+    return 0 if status.get("phase") == tasks.PHASE_COMPLETE else 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Near-duplicate product coalescing before Gemini calls.
+
+Kataloglarda aynı modelin birçok varyantı var (örn. aynı HLEH10A2TCEX kodu farklı renklerde).
+İşlemeden önce satırlar marka + model kodu + normalize başlık ile gruplanır; her gruptan
+yalnızca temsilci ürün tam işlenir (urun_isle + eksik sütun doldurma), sonucu varyantlara
+kopyalanır ve varyantlar için sadece farklı olan alanlar (başlık + farklı sütunlar) grup
+başına tek istekte sorulur (main.varyant_farklarini_sor).
+
+Ayarlar (env):
+- GEMINI_COALESCE=0 → gruplama kapalı, her satır ayrı işlenir
+"""
+from __future__ import annotations
+
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+Item = Tuple[int, Dict[str, Any], List[str]]
+
+# main.ean_ara_internet / gemini_eksik_sutun_sor ile aynı model kodu deseni
+MODEL_KODU_DESENI = re.compile(r"[A-Z0-9]{4,}[-]?[A-Z0-9]{0,}")
+
+# Varyantlar arasında genelde sadece renk değişir; başlık karşılaştırmasında yok sayılır
+RENK_KELIMELERI = {
+    "siyah", "beyaz", "gri", "kirmizi", "mavi", "yesil", "sari", "turuncu", "mor", "pembe",
+    "kahverengi", "lacivert", "bej", "gumus", "altin", "antrasit", "krem", "inox", "fume",
+    "black", "white", "grey", "gray", "red", "blue", "green", "yellow", "orange", "purple",
+    "pink", "brown", "navy", "beige", "silver", "gold", "schwarz", "weiss", "nero", "bianco",
+}
+
+# Her varyanta özgü sütunlar: temsilciden asla kopyalanmaz, varyantın kendi değeri kalır
+_KIMLIK_ANAHTARLARI = ("sku", "ean", "barkod", "barcode", "gtin")
+
+
+@dataclass
+class VariantGroup:
+    key: Tuple[str, str, str]
+    representative: Item
+    siblings: List[Item] = field(default_factory=list)
+
+
+def coalesce_enabled() -> bool:
+    return os.getenv("GEMINI_COALESCE", "1") == "1"
+
+
+def _sade(text: str) -> str:
+    """Küçük harf + aksan/Türkçe karakterleri sadeleştir (ı→i, ş→s, ...)."""
+    text = str(text or "").replace("ı", "i").replace("İ", "i").lower()
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def _dolu(value: Any) -> bool:
+    return value is not None and pd.notna(value) and str(value).strip() != ""
+
+
+def model_kodu(baslik: Any) -> Optional[str]:
+    match = MODEL_KODU_DESENI.search(str(baslik or ""))
+    if match and len(match.group(0)) >= 4:
+        return match.group(0)
+    return None
+
+
+def normalize_baslik(row_dict: Dict[str, Any], kod: str = "") -> str:
+    """Başlıktan model kodunu, renk kelimelerini ve satırın kendi renk değerlerini çıkarır."""
+    baslik = str(row_dict.get("Başlık") or "")
+    if kod:
+        baslik = baslik.replace(kod, " ")
+    atla = set(RENK_KELIMELERI)
+    for sutun, deger in row_dict.items():
+        if _dolu(deger) and ("renk" in _sade(sutun) or "colo" in _sade(sutun)):
+            atla.update(re.findall(r"\w+", _sade(deger)))
+    kelimeler = [k for k in re.findall(r"\w+", _sade(baslik)) if k not in atla]
+    return " ".join(kelimeler)
+
+
+def group_key(row_dict: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+    """(marka, model kodu, normalize başlık); model kodu bulunamazsa None (gruplanmaz)."""
+    kod = model_kodu(row_dict.get("Başlık"))
+    if not kod:
+        return None
+    marka = _sade(row_dict.get("Marka")) if _dolu(row_dict.get("Marka")) else ""
+    return (marka.strip(), kod, normalize_baslik(row_dict, kod))
+
+
+def group_items(items: List[Item]) -> Tuple[List[Item], List[VariantGroup]]:
+    """
+    items → (tam işlenecekler, varyant grupları).
+    Tam işlenecekler: gruplanmayan satırlar + her grubun temsilcisi (ilk satır), orijinal sırada.
+    """
+    groups: Dict[Tuple[str, str, str], VariantGroup] = {}
+    primary: List[Item] = []
+    for item in items:
+        key = group_key(item[1])
+        if key is None:
+            primary.append(item)
+        elif key in groups:
+            groups[key].siblings.append(item)
+        else:
+            groups[key] = VariantGroup(key=key, representative=item)
+            primary.append(item)
+    return primary, [g for g in groups.values() if g.siblings]
+
+
+def _kimlik_sutunu(sutun: str) -> bool:
+    ad = _sade(sutun)
+    return any(k in ad for k in _KIMLIK_ANAHTARLARI)
+
+
+def missing_identity_columns(flat_result: Dict[str, Any], eksik_sutunlar: List[str]) -> List[str]:
+    """Varyantın boş kimlik sütunları (EAN / barkod): temsilciden kopyalanmaz, varyant için ayrıca aranır."""
+    return [s for s in eksik_sutunlar if _kimlik_sutunu(s) and not _dolu(flat_result.get(s))]
+
+
+def _konu(sutun: str) -> str:
+    """Sütunun konusu: parantezli nitelemeler atılmış ad ("Renk (Üreticiye Göre) (tr_TR)" → "renk")."""
+    return " ".join(re.findall(r"\w+", _sade(re.sub(r"\([^)]*\)", " ", str(sutun)))))
+
+
+def differing_columns(rep_row: Dict[str, Any], sib_row: Dict[str, Any]) -> List[str]:
+    """
+    Varyantın yeniden sorulması gereken sütunlar: orijinal değeri temsilciden farklı olanlar
+    ve varyantta boş olup bunlarla aynı konudaki sütunlar (örn. "Renk (temel)" farklıysa boş
+    "Renk (Üreticiye Göre)": temsilcide bu sütun temsilcinin rengiyle doldurulmuştur).
+    Başlık ve kimlik sütunları (SKU, EAN) hariç.
+    """
+    farkli = []
+    adaylar = [
+        s for s in sib_row
+        if s not in ("Başlık", "Warning", "Uyari") and not _kimlik_sutunu(s)
+    ]
+    for sutun in adaylar:
+        deger, rep_deger = sib_row.get(sutun), rep_row.get(sutun)
+        if _dolu(deger) != _dolu(rep_deger) or (_dolu(deger) and str(deger).strip() != str(rep_deger).strip()):
+            farkli.append(sutun)
+    konular = {_konu(s) for s in farkli} - {""}
+    for sutun in adaylar:
+        if sutun not in farkli and not _dolu(sib_row.get(sutun)) and _konu(sutun) in konular:
+            farkli.append(sutun)
+    return farkli
+
+
+def fan_out(
+    rep_result: Dict[str, Any],
+    sib_row: Dict[str, Any],
+    farkli_sutunlar: List[str],
+    cevap: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Temsilcinin işlenmiş satırını varyanta uyarlar: kimlik + farklı sütunlar varyanttan, cevap üstüne yazılır.
+    Warning temsilciden kopyalanmaz: varyant sorulduysa (cevap dolu) kendi uyarısı, sorulmadıysa
+    girdisi temsilciyle aynıdır ve temsilcinin uyarısı geçerlidir. Boş kimlik sütunları
+    (missing_identity_columns) çağıran tarafından varyant için ayrıca doldurulur.
+    """
+    flat_result = dict(rep_result)
+    for sutun, deger in sib_row.items():
+        if _kimlik_sutunu(sutun) or sutun in farkli_sutunlar:
+            flat_result[sutun] = deger
+    if cevap:
+        uyari = cevap.get("uyari")
+        flat_result["Warning"] = uyari if _dolu(uyari) and uyari != "null" else ""
+    if cevap.get("temiz_baslik"):
+        flat_result["Başlık"] = cevap["temiz_baslik"]
+    ozellikler = cevap.get("duzenlenmis_ozellikler") or {}
+    if isinstance(ozellikler, dict):
+        for sutun, deger in ozellikler.items():
+            if sutun in farkli_sutunlar and _dolu(deger) and "bilinmiyor" not in str(deger).lower():
+                flat_result[sutun] = str(deger).strip() if isinstance(deger, str) else deger
+    return flat_result
@@ -0,0 +1,164 @@
+"""
+Category-aware column pruning for Gemini prompts.
+
+Geniş Mirakl export'larında (~3000 sütun) bir satırın boş sütunlarının çoğu o ürünün
+kategorisiyle ilgisizdir. Bu modül kategori → ilgili sütunlar haritası kurar; urun_isle'ye
+(_Eksik_Sutunlar) ve gemini_eksik_sutunlar_toplu_sor'a sadece bu sütunlar gönderilir.
+
+Harita iki kaynaktan kurulur:
+1. Mirakl template başlıkları (mirakl_bucket.load_template_header + fetfra_to_template.xlsx);
+   kategori kodu eşlemede varsa template'deki sütunlar ilgilidir.
+2. Export'taki dolu hücre istatistiği: kategorinin en az bir satırında dolu olan sütunlar ilgilidir.
+   Export'un hiçbir satırında dolu olmayan sütunlar sadece geniş export'larda (GEMINI_PRUNE_WIDE_COLUMNS)
+   budanır; dar yüklemelerde kullanıcı tam da bu sütunların doldurulmasını istiyor olabilir.
+Template'i olmayan kategoriler için 2. kaynak kullanılır; kategorisi bilinmeyen satırlar budanmaz.
+
+Ayarlar (env):
+- GEMINI_PRUNE_COLUMNS=0     → budama kapalı (tüm boş sütunlar gönderilir)
+- GEMINI_RELEVANCE_SOURCE    → auto (varsayılan) | templates | stats
+- GEMINI_PRUNE_MIN_FILL      → stats kaynağında sütunun ilgili sayılması için kategorideki dolu oranı (varsayılan 0 = en az bir satır)
+- GEMINI_PRUNE_WIDE_COLUMNS  → bu sayıdan fazla sütunlu export "geniş" sayılır (varsayılan 300)
+- MIRAKL_TEMPLATES_DIR / MIRAKL_MAPPING_FILE → varsayılan mirakl_bucket.TEMPLATES_DIR / MAPPING_FILE
+"""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# Yüklenen Excel'de "Kategori", ham Mirakl export'unda "CATEGORY"
+CATEGORY_COLUMNS = ("Kategori", "CATEGORY")
+
+# Pazaryeri için her kategoride zorunlu; istatistikte hiç dolu olmasa da budanmaz
+_HER_ZAMAN_ILGILI = ("ean", "barkod", "barcode", "gtin")
+
+
+def prune_enabled() -> bool:
+    return os.getenv("GEMINI_PRUNE_COLUMNS", "1") == "1"
+
+
+def row_category(row_dict: Dict[str, object]) -> Optional[str]:
+    for col in CATEGORY_COLUMNS:
+        value = row_dict.get(col)
+        if value is not None and pd.notna(value) and str(value).strip() and str(value).strip() != "CATEGORY":
+            return str(value).strip()
+    return None
+
+
+def _her_zaman_ilgili(sutun: str) -> bool:
+    ad = str(sutun).lower()
+    return any(k in ad for k in _HER_ZAMAN_ILGILI)
+
+
+class RelevanceMap:
+    """Kategori → ilgili sütun kümesi. Haritada olmayan kategori için budama yapılmaz."""
+
+    def __init__(self, by_category: Optional[Dict[str, Set[str]]] = None, source: str = "") -> None:
+        self.by_category: Dict[str, Set[str]] = by_category or {}
+        self.source = source
+
+    def __bool__(self) -> bool:
+        return bool(self.by_category)
+
+    def relevant(self, row_dict: Dict[str, object]) -> Optional[Set[str]]:
+        category = row_category(row_dict)
+        if category is None:
+            return None
+        return self.by_category.get(category)
+
+    def prune(self, row_dict: Dict[str, object], eksik_sutunlar: List[str]) -> List[str]:
+        relevant = self.relevant(row_dict)
+        if relevant is None:
+            return eksik_sutunlar
+        return [s for s in eksik_sutunlar if s in relevant or _her_zaman_ilgili(s)]
+
+    @classmethod
+    def from_stats(cls, df: pd.DataFrame, min_fill: float = 0.0, wide_columns: int = 300) -> "RelevanceMap":
+        """
+        Kategorinin satırlarında dolu oranı min_fill'den büyük (0 ise en az bir dolu) sütunlar.
+        Hiçbir kategoride dolu olmayan sütunlar, export wide_columns'tan dar ise ilgili sayılır.
+        """
+        category_col = next((c for c in CATEGORY_COLUMNS if c in df.columns), None)
+        if category_col is None or df.empty:
+            return cls(source="stats")
+        filled = df.notna() & df.astype(str).apply(lambda s: s.str.strip() != "")
+        never_filled = set(filled.columns[~filled.any()]) if len(df.columns) <= wide_columns else set()
+        categories = df[category_col].astype(str).str.strip()
+        by_category: Dict[str, Set[str]] = {}
+        for category, ratios in filled.groupby(categories).mean().iterrows():
+            if not category or category in ("nan", "CATEGORY"):
+                continue
+            by_category[category] = set(ratios[ratios > min_fill].index) | never_filled
+        return cls(by_category, source="stats")
+
+    @classmethod
+    def from_templates(
+        cls,
+        categories: List[str],
+        columns: List[str],
+        templates_dir: Optional[Path] = None,
+        mapping_file: Optional[Path] = None,
+    ) -> "RelevanceMap":
+        """fetfra_to_template.xlsx eşlemesindeki kategoriler için template başlığı ∩ export sütunları."""
+        import mirakl_bucket
+
+        templates_dir = Path(templates_dir or os.getenv("MIRAKL_TEMPLATES_DIR") or BASE_DIR / mirakl_bucket.TEMPLATES_DIR)
+        mapping_file = Path(mapping_file or os.getenv("MIRAKL_MAPPING_FILE") or BASE_DIR / mirakl_bucket.MAPPING_FILE)
+        if not mapping_file.exists() or not templates_dir.is_dir():
+            return cls(source="templates")
+
+        mapping_df = mirakl_bucket.load_mapping(str(mapping_file))
+        template_of = dict(zip(mapping_df["FET_FRA_CODE"], mapping_df["TEMPLATE_FILE"]))
+        column_set = set(columns)
+        headers: Dict[str, Set[str]] = {}
+        by_category: Dict[str, Set[str]] = {}
+        for category in categories:
+            template_file = template_of.get(category)
+            if not template_file:
+                continue
+            if template_file not in headers:
+                path = templates_dir / template_file
+                try:
+                    headers[template_file] = set(mirakl_bucket.load_template_header(str(path))) & column_set
+                except Exception as e:
+                    print(f"⚠️ Template okunamadı ({template_file}): {str(e)[:80]}", flush=True)
+                    headers[template_file] = set()
+            if headers[template_file]:
+                by_category[category] = headers[template_file]
+        return cls(by_category, source="templates")
+
+
+def build_relevance_map(df: pd.DataFrame) -> RelevanceMap:
+    """Job DataFrame'i için harita: template'i olan kategoriler template'ten, diğerleri istatistikten."""
+    if not prune_enabled():
+        return RelevanceMap()
+    source = os.getenv("GEMINI_RELEVANCE_SOURCE", "auto").strip().lower()
+    category_col = next((c for c in CATEGORY_COLUMNS if c in df.columns), None)
+    if category_col is None:
+        return RelevanceMap()
+    categories = sorted({str(c).strip() for c in df[category_col].dropna()} - {"", "CATEGORY"})
+
+    templates = RelevanceMap(source="templates")
+    if source in ("auto", "templates"):
+        try:
+            templates = RelevanceMap.from_templates(categories, list(df.columns))
+        except Exception as e:
+            print(f"⚠️ Template ilgililik haritası kurulamadı: {str(e)[:100]}", flush=True)
+    if source == "templates":
+        return templates
+
+    try:
+        min_fill = float(os.getenv("GEMINI_PRUNE_MIN_FILL", "0"))
+        wide_columns = int(os.getenv("GEMINI_PRUNE_WIDE_COLUMNS", "300"))
+    except ValueError:
+        min_fill, wide_columns = 0.0, 300
+    stats = RelevanceMap.from_stats(df, min_fill=min_fill, wide_columns=wide_columns)
+    if source == "stats" or not templates:
+        return stats
+    merged = dict(stats.by_category)
+    merged.update(templates.by_category)
+    return RelevanceMap(merged, source="templates+stats")
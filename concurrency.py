@@ -0,0 +1,176 @@
+"""
+Adaptive (AIMD) concurrency control for Gemini jobs.
+
+Sabit GEMINI_PARALLEL_WORKERS yerine eşzamanlılık limiti çalışma anında ayarlanır:
+her pencerede (yaklaşık `limit` kadar API çağrısı) 429 / hata oranı / gecikme ölçülür;
+sorun yoksa limit +1 artar (additive increase), 429 veya yüksek hata oranında
+çarpımsal olarak düşer (multiplicative decrease). Böylece job kendi kendine
+sürdürülebilir en yüksek verime yakınsar.
+
+Ayarlar (env):
+- GEMINI_ADAPTIVE=0           → limit sabit kalır (başlangıç değeri)
+- GEMINI_PARALLEL_WORKERS     → başlangıç limiti (varsayılan 10)
+- GEMINI_MIN_CONCURRENCY      → alt sınır (varsayılan 1)
+- GEMINI_MAX_CONCURRENCY      → üst sınır (varsayılan: asyncio'da GEMINI_ASYNC_CONCURRENCY, thread'de 64)
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from job_metrics import JobMetrics
+
+# Bir pencerede bu oranın üstünde hata → çarpımsal düşüş
+_ERROR_RATE_LIMIT = 0.1
+# Ortalama gecikme en iyi gözlenen değerin bu katını aşarsa → hafif düşüş
+_LATENCY_FACTOR = 2.5
+_HISTORY_LEN = 50
+
+
+class AIMDController:
+    """
+    Additive-increase / multiplicative-decrease limit. observe() her batch tamamlandığında
+    job sayaçlarıyla (api_calls, api_errors, rate_limit_429, api_latency_s) çağrılır.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = 1,
+        maximum: int = 100,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        adaptive: bool = True,
+        metrics: Optional[JobMetrics] = None,
+    ) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self._limit = float(min(max(initial, self.minimum), self.maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.adaptive = adaptive
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._window_start = metrics.counters() if metrics is not None else {}
+        self._best_latency: Optional[float] = None
+        self.history: List[Dict[str, Any]] = []
+        self._record("start")
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _record(self, reason: str, **extra: Any) -> None:
+        self.history.append({"t": round(time.time(), 1), "limit": self.limit, "reason": reason, **extra})
+        del self.history[:-_HISTORY_LEN]
+        if self.metrics is not None:
+            self.metrics.set("concurrency_limit", self.limit)
+            self.metrics.set("concurrency_history", list(self.history))
+
+    def observe(self) -> int:
+        """Pencere dolduysa limiti güncelle; güncel limiti döner."""
+        if not self.adaptive or self.metrics is None:
+            return self.limit
+        with self._lock:
+            now = self.metrics.counters()
+            delta = {k: now.get(k, 0) - self._window_start.get(k, 0)
+                     for k in ("api_calls", "api_errors", "rate_limit_429", "api_latency_s")}
+            calls = delta["api_calls"]
+            throttled = delta["rate_limit_429"] > 0
+            # 429 hemen tepki ister; diğer durumlarda yaklaşık `limit` çağrılık pencere bekle
+            if not throttled and calls < max(3, self.limit):
+                return self.limit
+
+            error_rate = delta["api_errors"] / calls if calls else 0.0
+            latency = delta["api_latency_s"] / calls if calls else None
+            if latency is not None and (self._best_latency is None or latency < self._best_latency):
+                self._best_latency = latency
+
+            old = self.limit
+            if throttled:
+                self._limit = max(self.minimum, math.floor(self._limit * self.decrease))
+                reason = "429"
+            elif error_rate > _ERROR_RATE_LIMIT:
+                self._limit = max(self.minimum, math.floor(self._limit * self.decrease))
+                reason = "errors"
+            elif latency is not None and self._best_latency and latency > self._best_latency * _LATENCY_FACTOR:
+                self._limit = max(self.minimum, math.floor(self._limit * 0.8))
+                reason = "latency"
+            else:
+                self._limit = min(float(self.maximum), self._limit + self.increase)
+                reason = "increase"
+            self._window_start = now
+            if self.limit != old:
+                self._record(
+                    reason,
+                    latency_s=round(latency, 2) if latency is not None else None,
+                    error_rate=round(error_rate, 3),
+                )
+            return self.limit
+
+
+def controller_from_env(metrics: Optional[JobMetrics], maximum: int, workers: Optional[int] = None) -> AIMDController:
+    """
+    workers: çağrıya özel limit (ör. CLI --workers); hem başlangıç hem üst sınır olur,
+    GEMINI_PARALLEL_WORKERS / GEMINI_MAX_CONCURRENCY yerine geçer. AIMD 429'da düşürür,
+    sonra bu sınıra kadar toparlar.
+    """
+    def _int(name: str, default: int) -> int:
+        try:
+            return int(os.getenv(name, str(default)))
+        except ValueError:
+            return default
+
+    return AIMDController(
+        initial=workers or _int("GEMINI_PARALLEL_WORKERS", 10),
+        minimum=_int("GEMINI_MIN_CONCURRENCY", 1),
+        maximum=workers or _int("GEMINI_MAX_CONCURRENCY", maximum),
+        adaptive=os.getenv("GEMINI_ADAPTIVE", "1") == "1",
+        metrics=metrics,
+    )
+
+
+class AsyncGate:
+    """asyncio tarafı: uçuştaki iş sayısını controller.limit ile sınırlar (limit çalışırken değişebilir)."""
+
+    def __init__(self, controller: AIMDController) -> None:
+        self.controller = controller
+        self._cond = asyncio.Condition()
+        self._inflight = 0
+
+    async def __aenter__(self) -> "AsyncGate":
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._inflight < self.controller.limit)
+            self._inflight += 1
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.controller.observe()
+        async with self._cond:
+            self._inflight -= 1
+            self._cond.notify_all()
+
+
+class ThreadGate:
+    """Thread tarafı: ThreadPoolExecutor üst sınırı maximum, fiili eşzamanlılık controller.limit."""
+
+    def __init__(self, controller: AIMDController) -> None:
+        self.controller = controller
+        self._cond = threading.Condition()
+        self._inflight = 0
+
+    def __enter__(self) -> "ThreadGate":
+        with self._cond:
+            self._cond.wait_for(lambda: self._inflight < self.controller.limit)
+            self._inflight += 1
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.controller.observe()
+        with self._cond:
+            self._inflight -= 1
+            self._cond.notify_all()
@@ -5,14 +5,11 @@ import os
 import time
 from threading import Thread
 import webbrowser
-import subprocess
 import shutil
 
-app = Flask(__name__)
+from local_runner import get_runner
 
-# Script çalışma durumu
-script_running = False
-script_process = None
+app = Flask(__name__)
 
 # Dosya yükleme ayarları
 UPLOAD_FOLDER = '.'
@@ -25,33 +22,76 @@ def allowed_file(filename):
 CIKIS_DOSYASI = "temizlenmis_katalog.xlsx"
 GIRIS_DOSYASI = "GüneşProducts_20251222_203037.xlsx"  # Varsayılan, yükleme ile değişebilir
 
+# Toplam ürün sayısı önbelleği: giriş dosyası → (mtime, toplam); Excel her dosya sürümü için bir kez okunur
+_toplam_onbellek = {}
+
+def toplam_urun_sayisi(dosya):
+    """Giriş Excel'indeki ürün sayısı (teknik başlık satırı hariç), dosya mtime'ına göre önbellekli"""
+    mtime = os.path.getmtime(dosya)
+    onbellek = _toplam_onbellek.get(os.path.abspath(dosya))
+    if onbellek and onbellek[0] == mtime:
+        return onbellek[1]
+    df_input = pd.read_excel(dosya)
+    # İlk satır teknik kodlar olabilir
+    if len(df_input) > 0 and str(df_input.iloc[0].get('Başlık', '')).startswith('TITLE'):
+        total = len(df_input) - 1
+    else:
+        total = len(df_input)
+    _toplam_onbellek[os.path.abspath(dosya)] = (mtime, total)
+    return total
+
 def get_progress():
     """İlerlemeyi hesapla"""
     try:
-        # Toplam ürün sayısı
-        df_input = pd.read_excel(GIRIS_DOSYASI)
-        # İlk satır teknik kodlar olabilir
-        if len(df_input) > 0 and df_input.iloc[0].get('Başlık', '').startswith('TITLE'):
-            total = len(df_input) - 1
-        else:
-            total = len(df_input)
+        # Öncelik: main()'in yazdığı küçük ilerleme kaydı (sabit süre; Excel okunmaz)
+        from progress_record import progress_path, read as kayit_oku
+        kayit = kayit_oku(progress_path(CIKIS_DOSYASI))
+        if kayit and kayit.get('input') == os.path.abspath(GIRIS_DOSYASI):
+            total = kayit['total']
+            processed = min(kayit['processed'], total)
+            return {
+                'total': total,
+                'processed': processed,
+                'remaining': total - processed,
+                'percentage': round((processed / total * 100) if total > 0 else 0, 1),
+                'last_update': time.ctime(kayit['updated']),
+                'last_products': kayit.get('last_products', []),
+                'is_complete': processed >= total,
+                'failed': kayit.get('failed', 0),
+                'rows_per_s': kayit.get('rows_per_s'),
+                'eta_s': kayit.get('eta_s') if kayit.get('state') == 'running' else None,
+                'state': kayit.get('state'),
+            }
+
+        # Kayıt yoksa (eski çalışma / başka giriş dosyası): önbellekli toplam + checkpoint sayacı
+        total = toplam_urun_sayisi(GIRIS_DOSYASI)
         
-        # İşlenen ürün sayısı
-        if os.path.exists(CIKIS_DOSYASI):
+        # İşlenen ürün sayısı (eski main.py çalışmalarının checkpoint'i; Excel sadece sonda)
+        checkpoint_dosyasi = CIKIS_DOSYASI + ".checkpoint.sqlite"
+        if os.path.exists(checkpoint_dosyasi):
+            from checkpoint import CheckpointStore
+            checkpoint = CheckpointStore(checkpoint_dosyasi)
+            processed = checkpoint.count()
+            df_output = pd.DataFrame(checkpoint.tail(5))
+            checkpoint.close()
+            son_kayit = checkpoint_dosyasi + "-wal" if os.path.exists(checkpoint_dosyasi + "-wal") else checkpoint_dosyasi
+        elif os.path.exists(CIKIS_DOSYASI):
             df_output = pd.read_excel(CIKIS_DOSYASI)
             processed = len(df_output)
+            son_kayit = CIKIS_DOSYASI
         else:
             processed = 0
+            son_kayit = None
         
         # Son güncelleme zamanı
-        if os.path.exists(CIKIS_DOSYASI):
-            last_update = time.ctime(os.path.getmtime(CIKIS_DOSYASI))
+        if son_kayit:
+            last_update = time.ctime(os.path.getmtime(son_kayit))
         else:
             last_update = "Henüz dosya oluşturulmadı"
         
         # Son işlenen ürünler
         if processed > 0:
-            last_products = df_output.tail(5)[['Orijinal_Baslik', 'Temiz_Baslik']].to_dict('records')
+            last_products = df_output.tail(5).reindex(columns=['Orijinal_Baslik', 'Temiz_Baslik']).to_dict('records')
         else:
             last_products = []
         
@@ -354,6 +394,9 @@ def index():
             
             <div class="last-update">
                 📅 Son Güncelleme: {{ progress.last_update }}
+                {% if progress.rows_per_s %}
+                <br>⚡ Hız: {{ progress.rows_per_s }} ürün/sn{% if progress.eta_s %} · ⏳ Tahmini kalan: {{ (progress.eta_s / 60) | round(1) }} dk{% endif %}
+                {% endif %}
             </div>
             
             <div class="upload-section">
@@ -409,7 +452,8 @@ def index():
                 fetch('/api/progress')
                     .then(response => response.json())
                     .then(data => {
-                        scriptRunning = data.script_running || false;
+                        // Durdurulurken "Başlat" görünür: basılırsa boşalma bitince kaldığı yerden devam eder
+                        scriptRunning = (data.script_running && !data.script_stopping) || false;
                         updateButtons();
                     });
             }
@@ -539,53 +583,28 @@ def index():
 def api_progress():
     """API endpoint for progress"""
     progress = get_progress()
-    progress['script_running'] = script_running
+    runner = get_runner()
+    progress['script_running'] = runner.running
+    progress['script_stopping'] = runner.stopping
+    progress['script_error'] = runner.last_error
     return jsonify(progress)
 
 @app.route('/api/start', methods=['POST'])
 def start_script():
-    """Script'i başlat"""
-    global script_running, script_process
-    
-    if script_running:
+    """İşlemeyi başlat / devam ettir (bu process'teki runner; checkpoint'ten kaldığı yerden)"""
+    runner = get_runner()
+    devam = runner.stopping
+    if not runner.start(GIRIS_DOSYASI, CIKIS_DOSYASI):
         return jsonify({'status': 'error', 'message': 'Script zaten çalışıyor!'}), 400
-    
-    try:
-        # Script'i arka planda başlat
-        script_process = subprocess.Popen(
-            ['python3', 'main.py'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            cwd=os.path.dirname(os.path.abspath(__file__))
-        )
-        script_running = True
-        
-        # Script bitince durumu güncelle
-        def check_process():
-            global script_running
-            script_process.wait()
-            script_running = False
-        
-        Thread(target=check_process, daemon=True).start()
-        
-        return jsonify({'status': 'success', 'message': 'Script başlatıldı!'})
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+    mesaj = 'Durdurma tamamlanınca kaldığı yerden devam edecek!' if devam else 'Script başlatıldı!'
+    return jsonify({'status': 'success', 'message': mesaj})
 
 @app.route('/api/stop', methods=['POST'])
 def stop_script():
-    """Script'i durdur"""
-    global script_running, script_process
-    
-    if not script_running or script_process is None:
+    """Durdur: yeni istek başlamaz, uçuştakiler checkpoint'e yazılır (hemen döner)"""
+    if not get_runner().stop():
         return jsonify({'status': 'error', 'message': 'Script çalışmıyor!'}), 400
-    
-    try:
-        script_process.terminate()
-        script_running = False
-        return jsonify({'status': 'success', 'message': 'Script durduruldu!'})
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+    return jsonify({'status': 'success', 'message': 'Durduruluyor: uçuştaki istekler tamamlanıyor, ilerleme kaydedildi.'})
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
@@ -614,33 +633,9 @@ def upload_file():
             filepath = os.path.join(UPLOAD_FOLDER, filename)
             file.save(filepath)
             
-            # GIRIS_DOSYASI'ı güncelle
+            # GIRIS_DOSYASI'ı güncelle (runner bir sonraki başlatmada bu dosyayı işler)
             GIRIS_DOSYASI = filename
             
-            # main.py'deki dosya adını da güncelle
-            try:
-                with open('main.py', 'r', encoding='utf-8') as f:
-                    content = f.read()
-                content = content.replace(
-                    f'GIRIS_DOSYASI = "{GIRIS_DOSYASI}"',
-                    f'GIRIS_DOSYASI = "{filename}"'
-                )
-                # Eğer eski dosya adı varsa onu da değiştir
-                old_patterns = [
-                    'GIRIS_DOSYASI = "laptop.xlsx"',
-                    'GIRIS_DOSYASI = "laptopp.xlsx"',
-                    'GIRIS_DOSYASI = "GüneşProducts_20251222_203037.xlsx"'
-                ]
-                for pattern in old_patterns:
-                    if pattern in content:
-                        content = content.replace(pattern, f'GIRIS_DOSYASI = "{filename}"')
-                        break
-                
-                with open('main.py', 'w', encoding='utf-8') as f:
-                    f.write(content)
-            except Exception as e:
-                print(f"main.py güncellenemedi: {e}")
-            
             # Dosya bilgilerini kontrol et
             df = pd.read_excel(filepath)
             total = len(df)
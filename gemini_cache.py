@@ -0,0 +1,169 @@
+"""
+Content-addressed on-disk cache for Gemini responses (SQLite).
+
+Key = sha256(model name + output language + system-instruction version + prompt),
+so re-running an unchanged catalog costs (almost) no API calls. The database lives
+in the jobs volume (JOBS_BASE_DIR) so it survives redeploys together with the jobs.
+
+Ayarlar (env):
+- GEMINI_CACHE=0            → cache kapalı
+- GEMINI_CACHE_PATH         → SQLite dosya yolu (varsayılan: <JOBS_BASE_DIR>/gemini_cache.sqlite)
+- GEMINI_CACHE_TTL_DAYS     → kayıt ömrü, gün (varsayılan 30)
+- GEMINI_CACHE_MAX_MB       → toplam boyut üst sınırı; aşılınca en eski erişilenler silinir (varsayılan 512)
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import job_metrics
+
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# Her N yazmada bir TTL / boyut temizliği
+_EVICT_EVERY = 200
+
+
+def instruction_version(text: str) -> str:
+    """System instruction metninin kısa hash'i; prompt değişince cache kendiliğinden geçersizleşir."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:12]
+
+
+def cache_key(prompt: str, model_name: str, output_lang: str = "tr", instruction_ver: str = "") -> str:
+    h = hashlib.sha256()
+    for part in (model_name or "", (output_lang or "tr").lower(), instruction_ver or "", prompt or ""):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class GeminiCache:
+    """
+    SQLite-backed response cache. One connection per thread; WAL mode so several
+    Celery worker processes can read/write the same file.
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float, max_bytes: int) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                kind TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        try:
+            row = self._conn().execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+                job_metrics.incr("cache_misses")
+                return None
+            self._conn().execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            job_metrics.incr("cache_misses")
+            return None
+        job_metrics.incr("cache_hits")
+        return row[0]
+
+    def set(self, key: str, response: str, kind: str = "") -> None:
+        now = time.time()
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO responses (key, kind, response, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, response, len(response.encode("utf-8")), now, now),
+            )
+        except sqlite3.Error:
+            return
+        with self._writes_lock:
+            self._writes += 1
+            evict = self._writes % _EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """TTL'i dolanları, sonra boyut sınırı aşılıyorsa en eski erişilenleri sil. Silinen kayıt sayısını döner."""
+        conn = self._conn()
+        removed = 0
+        try:
+            if self.ttl_seconds:
+                cur = conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,))
+                removed += cur.rowcount or 0
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if self.max_bytes and total > self.max_bytes:
+                # Sınırın %90'ına inene kadar LRU sil
+                target = int(self.max_bytes * 0.9)
+                for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall():
+                    if total <= target:
+                        break
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    total -= size
+                    removed += 1
+        except sqlite3.Error:
+            pass
+        return removed
+
+    def stats(self) -> dict:
+        row = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        return {"entries": row[0], "bytes": row[1]}
+
+
+_cache: Optional[GeminiCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[GeminiCache]:
+    """Process-wide cache instance, or None when disabled (GEMINI_CACHE=0) or unavailable."""
+    global _cache
+    if os.getenv("GEMINI_CACHE", "1") != "1":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                jobs_dir = Path(os.getenv("JOBS_BASE_DIR", str(BASE_DIR / "jobs")))
+                path = Path(os.getenv("GEMINI_CACHE_PATH", str(jobs_dir / "gemini_cache.sqlite")))
+                try:
+                    _cache = GeminiCache(
+                        path,
+                        ttl_seconds=float(os.getenv("GEMINI_CACHE_TTL_DAYS", "30")) * 86400,
+                        max_bytes=int(float(os.getenv("GEMINI_CACHE_MAX_MB", "512")) * 1024 * 1024),
+                    )
+                except (sqlite3.Error, OSError) as e:
+                    print(f"⚠️ Gemini cache açılamadı, cache kapalı: {str(e)[:100]}", flush=True)
+                    return None
+    return _cache
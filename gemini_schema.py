@@ -0,0 +1,335 @@
+"""
+Structured-output schemas and the shared response parser for Gemini calls.
+
+Şema modunda (GEMINI_SCHEMA=1, varsayılan) her çağrı response_schema ile yapılır; model
+alanları (temiz_baslik, duzenlenmis_ozellikler, eksik_sutun_degerleri, celiski_cozum, uyari)
+baştan tanımlı tipte döndürür. Tüm yanıtlar aynı ayrıştırıcıdan geçer: bozuk JSON (``` çitleri,
+sondaki virgüller, Python literal'leri, yarıda kesilmiş dizi/nesne) yeniden istek atmadan
+yerelde onarılır, alanlar beklenen tiplere dönüştürülür.
+
+cozulemeyen_sutunlar: _Eksik_Sutunlar'dan ürün için geçerli olduğu halde verilen bilgiden
+doldurulamayanlar; takip çağrısı (tek çağrı modu) sadece bunlar için yapılır.
+
+Gemini şemasında serbest anahtarlı nesne tanımlanamadığı için sözlük alanları
+[{"ad": ..., "deger": ...}] listesi olarak istenir; ayrıştırıcı ikisini de sözlüğe çevirir.
+"""
+from __future__ import annotations
+
+import ast
+import contextvars
+import json
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+import job_metrics
+
+
+def schema_enabled() -> bool:
+    return os.getenv("GEMINI_SCHEMA", "1") == "1"
+
+
+_METIN = {"type": "STRING"}
+_CIFTLER = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"ad": _METIN, "deger": _METIN},
+        "required": ["ad", "deger"],
+    },
+}
+CELISKI_SEMASI = {
+    "type": "OBJECT",
+    "properties": {"ozellik_adi": _METIN, "dogru_deger": _METIN, "kaynak": _METIN},
+    "required": ["ozellik_adi", "dogru_deger", "kaynak"],
+}
+_URUN_ALANLARI = {
+    "temiz_baslik": _METIN,
+    "duzenlenmis_ozellikler": _CIFTLER,
+    "eksik_sutun_degerleri": _CIFTLER,
+    "celiski_cozum": {**CELISKI_SEMASI, "nullable": True},
+    "uyari": {"type": "STRING", "nullable": True},
+    "cozulemeyen_sutunlar": {"type": "ARRAY", "items": _METIN},
+}
+URUN_SEMASI = {
+    "type": "OBJECT",
+    "properties": _URUN_ALANLARI,
+    "required": ["temiz_baslik", "duzenlenmis_ozellikler"],
+}
+TOPLU_SEMASI = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"_id": _METIN, **_URUN_ALANLARI},
+        "required": ["_id", "temiz_baslik", "duzenlenmis_ozellikler"],
+    },
+}
+VARYANT_SEMASI = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"_id": _METIN, "temiz_baslik": _METIN, "duzenlenmis_ozellikler": _CIFTLER, "uyari": _METIN},
+        "required": ["_id", "temiz_baslik"],
+    },
+}
+EKSIK_SUTUN_SEMASI = _CIFTLER
+
+# Şema modunda sistem talimatına eklenir (talimatlardaki sözlük örnekleri liste olarak döner)
+SEMA_NOTU = """
+ÇIKTI ŞEMASI: Sözlük alanlarını (duzenlenmis_ozellikler, eksik_sutun_degerleri ve sütun → değer cevapları)
+[{"ad": "anahtar", "deger": "değer"}] listesi olarak ver. Bilinmeyen değerleri listeye koyma.
+"""
+
+
+def generation_config(sema: Dict[str, Any]) -> Dict[str, Any]:
+    return {"response_mime_type": "application/json", "response_schema": sema}
+
+
+# ---------------- Yerel JSON onarımı ----------------
+
+_CIT = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+_SONDAKI_VIRGUL = re.compile(r",\s*([}\]])")
+_PY_LITERAL = re.compile(r"\b(None|True|False|NaN)\b")
+
+# cache_dogrulayici içinde: onarım sayaçları artmaz (çağıran zaten sayar), kesik yanıt kapatılmaz
+_dogrulama: contextvars.ContextVar[bool] = contextvars.ContextVar("gemini_schema_dogrulama", default=False)
+
+
+def _kapat(text: str) -> str:
+    """Yarıda kesilmiş JSON'u kapat: açık string'i, son yarım elemanı ve açık parantezleri tamamla."""
+    yigin: List[str] = []
+    string_icinde = False
+    kacis = False
+    son_guvenli = 0
+    for i, c in enumerate(text):
+        if string_icinde:
+            if kacis:
+                kacis = False
+            elif c == "\\":
+                kacis = True
+            elif c == '"':
+                string_icinde = False
+            continue
+        if c == '"':
+            string_icinde = True
+        elif c in "{[":
+            yigin.append("}" if c == "{" else "]")
+        elif c in "}]":
+            if yigin:
+                yigin.pop()
+            son_guvenli = i + 1
+        elif c == ",":
+            son_guvenli = i
+    if not yigin:
+        return text
+    # Son tam elemandan sonrasını at (yarım "anahtar": değer), kalan parantezleri kapat
+    kesik = text[:son_guvenli] if son_guvenli else text
+    yigin = []
+    string_icinde = kacis = False
+    for c in kesik:
+        if string_icinde:
+            if kacis:
+                kacis = False
+            elif c == "\\":
+                kacis = True
+            elif c == '"':
+                string_icinde = False
+            continue
+        if c == '"':
+            string_icinde = True
+        elif c in "{[":
+            yigin.append("}" if c == "{" else "]")
+        elif c in "}]" and yigin:
+            yigin.pop()
+    return kesik.rstrip().rstrip(",") + "".join(reversed(yigin))
+
+
+def _govde(text: str) -> str:
+    """İlk { veya [ ile başlayan kısmı al (öncesindeki açıklama metnini at)."""
+    bas = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if bas < 0:
+        return text
+    son = max(text.rfind("}"), text.rfind("]"))
+    return text[bas:son + 1] if son > bas else text[bas:]
+
+
+def json_yukle(text: Any) -> Any:
+    """
+    Yanıt metnini JSON'a çevirir; bozuksa yerelde onarmayı dener (onarım sayacı: json_repaired).
+    Onarılamazsa ValueError. cache_dogrulayici içinde sayaç artmaz ve yarıda kesilmiş yanıt onarılmaz.
+    """
+    if not isinstance(text, str):
+        return text
+    ham = text.strip()
+    if not ham:
+        raise ValueError("Boş yanıt")
+    try:
+        return json.loads(ham)
+    except json.JSONDecodeError:
+        pass
+
+    aday = ham
+    cit = _CIT.search(aday)
+    if cit:
+        aday = cit.group(1).strip()
+    aday = _govde(aday)
+    dogrulama = _dogrulama.get()
+    onarimlar = [
+        lambda t: t,
+        lambda t: _SONDAKI_VIRGUL.sub(r"\1", t),
+        lambda t: _SONDAKI_VIRGUL.sub(
+            r"\1", _PY_LITERAL.sub(lambda m: {"None": "null", "True": "true", "False": "false", "NaN": "null"}[m.group(1)], t)
+        ),
+    ]
+    if not dogrulama:
+        onarimlar.append(lambda t: _SONDAKI_VIRGUL.sub(r"\1", _kapat(t)))
+    for onar in onarimlar:
+        try:
+            sonuc = json.loads(onar(aday))
+            if not dogrulama:
+                job_metrics.incr("json_repaired")
+            return sonuc
+        except (json.JSONDecodeError, ValueError):
+            continue
+    try:
+        sonuc = ast.literal_eval(aday)
+        if isinstance(sonuc, (dict, list)):
+            if not dogrulama:
+                job_metrics.incr("json_repaired")
+            return sonuc
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        pass
+    if not dogrulama:
+        job_metrics.incr("json_unrepairable")
+    raise ValueError(f"JSON onarılamadı: {ham[:80]}")
+
+
+# ---------------- Alan tipleri ----------------
+
+_ANAHTAR_ADLARI = ("ad", "sutun", "ozellik", "ozellik_adi", "key", "name")
+_DEGER_ADLARI = ("deger", "value", "dogru_deger")
+
+
+def sozluk(value: Any) -> Dict[str, Any]:
+    """Sözlük alanı: dict, [{"ad", "deger"}] listesi, [[k, v]] listesi veya JSON string kabul edilir."""
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str):
+        if not value.strip().startswith(("{", "[")):
+            return {}
+        try:
+            return sozluk(json_yukle(value))
+        except ValueError:
+            return {}
+    sonuc: Dict[str, Any] = {}
+    if isinstance(value, list):
+        for eleman in value:
+            if isinstance(eleman, dict):
+                anahtar = next((eleman[k] for k in _ANAHTAR_ADLARI if eleman.get(k)), None)
+                deger = next((eleman[k] for k in _DEGER_ADLARI if k in eleman), None)
+                if anahtar is not None:
+                    sonuc[str(anahtar)] = deger
+                elif len(eleman) == 1:
+                    sonuc.update(eleman)
+            elif isinstance(eleman, (list, tuple)) and len(eleman) == 2:
+                sonuc[str(eleman[0])] = eleman[1]
+    return sonuc
+
+
+def _metin(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    metin = str(value).strip()
+    return None if metin.lower() in ("", "null", "none") else metin
+
+
+def celiski_ciktisi(value: Any) -> Optional[Dict[str, str]]:
+    if isinstance(value, str):
+        try:
+            value = json_yukle(value)
+        except ValueError:
+            return None
+    if not isinstance(value, dict):
+        return None
+    sonuc = {k: _metin(value.get(k)) or "" for k in ("ozellik_adi", "dogru_deger", "kaynak")}
+    return sonuc if sonuc["ozellik_adi"] and sonuc["dogru_deger"] else None
+
+
+def urun_ciktisi(data: Any) -> Dict[str, Any]:
+    """urun_isle çıktısını şemadaki tiplere getirir (fazla alanlar korunur)."""
+    if isinstance(data, list) and len(data) == 1:
+        data = data[0]
+    if not isinstance(data, dict):
+        raise ValueError("Ürün yanıtı nesne değil")
+    sonuc = dict(data)
+    sonuc["temiz_baslik"] = _metin(data.get("temiz_baslik")) or ""
+    sonuc["duzenlenmis_ozellikler"] = sozluk(data.get("duzenlenmis_ozellikler"))
+    sonuc["eksik_sutun_degerleri"] = sozluk(data.get("eksik_sutun_degerleri"))
+    sonuc["celiski_cozum"] = celiski_ciktisi(data.get("celiski_cozum"))
+    sonuc["uyari"] = _metin(data.get("uyari"))
+    cozulemeyen = data.get("cozulemeyen_sutunlar") or []
+    if isinstance(cozulemeyen, str):
+        cozulemeyen = [cozulemeyen]
+    sonuc["cozulemeyen_sutunlar"] = [str(s).strip() for s in cozulemeyen if _metin(s)] if isinstance(cozulemeyen, list) else []
+    return sonuc
+
+
+# ---------------- Çağrı türüne göre ayrıştırıcılar ----------------
+
+def cache_dogrulayici(ayristir: Callable[[str], Any], kontrol: Callable[[Any], bool] = bool) -> Callable[[str], bool]:
+    """
+    main._gemini_uret(dogrula=...) için: yanıt ayristir'dan geçip kontrol'ü sağlıyorsa True.
+    Onarım sayaçlarına dokunmaz (yanıtı asıl ayrıştıran çağıran sayar); yarıda kesilmiş yanıt
+    (_kapat gerektiren) geçersiz sayılır, kalıcı cache'e kesik çıktı yazılmaz.
+    """
+    def dogrula(text: str) -> bool:
+        token = _dogrulama.set(True)
+        try:
+            return bool(kontrol(ayristir(text)))
+        except ValueError:
+            return False
+        finally:
+            _dogrulama.reset(token)
+    return dogrula
+
+
+def urun_yanitini_ayristir(text: str) -> Dict[str, Any]:
+    return urun_ciktisi(json_yukle(text))
+
+
+def toplu_yaniti_ayristir(text: str) -> Dict[str, Dict[str, Any]]:
+    """Batch / varyant yanıtı → {_id: çıktı}. Dizi veya {"sonuclar": [...]} kabul edilir."""
+    data = json_yukle(text)
+    if isinstance(data, dict):
+        for anahtar in ("sonuclar", "results", "urunler", "items", "varyantlar"):
+            if isinstance(data.get(anahtar), list):
+                data = data[anahtar]
+                break
+        else:
+            data = [data]
+    if not isinstance(data, list):
+        raise ValueError("Batch yanıtı dizi değil")
+    sonuc = {}
+    for eleman in data:
+        if isinstance(eleman, dict) and eleman.get("_id") is not None:
+            eleman = dict(eleman)
+            anahtar = str(eleman.pop("_id"))
+            try:
+                sonuc[anahtar] = urun_ciktisi(eleman)
+            except ValueError:
+                continue
+    return sonuc
+
+
+def eksik_sutun_yanitini_ayristir(text: str, eksik_sutunlar: List[str]) -> Dict[str, str]:
+    """{"Sütun Adı": "değer"} - sadece sorulan ve bilinen sütunlar."""
+    data = json_yukle(text)
+    if isinstance(data, dict) and "eksik_sutun_degerleri" in data:
+        data = data["eksik_sutun_degerleri"]
+    cevaplar = sozluk(data)
+    sonuc = {}
+    for sutun in eksik_sutunlar:
+        deger = _metin(cevaplar.get(sutun))
+        if deger and "bilinmiyor" not in deger.lower():
+            sonuc[sutun] = deger
+    return sonuc
@@ -0,0 +1,166 @@
+"""
+Job event channel: worker publishes progress / row completions / errors, API streams them (SSE).
+
+process_catalog_job her batch tamamlandığında bir "rows" olayı (satır bazlı durum + hata mesajı) ve
+bir "progress" olayı (sayaç özeti) yayınlar; aşama değişiklikleri "phase" olayıdır. GET
+/jobs/{id}/events bu kanala abone olur; istemcilerin GET /jobs/{id} ile yoklama yapmasına gerek kalmaz.
+
+Kanal Redis pub/sub'dır (Celery broker'ı; worker ve API ayrı process'ler). Redis yoksa veya
+JOB_EVENTS=memory ise process içi yayın kullanılır (aynı process'te çalışan worker + API, testler).
+Pub/sub kalıcı değildir: SSE akışı bağlanırken ve boşta kaldığında durumu job-state store'dan okur.
+
+Ayarlar (env):
+- JOB_EVENTS                 → redis (varsayılan) | memory | off
+- JOB_EVENTS_REDIS_URL       → varsayılan CELERY_BROKER_URL (redis://localhost:6379/0)
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
+
+_CHANNEL = "job_events:{job_id}"
+
+
+def _channel(job_id: str) -> str:
+    return _CHANNEL.format(job_id=job_id)
+
+
+class MemoryBus:
+    """Process içi yayın: abone başına asyncio.Queue (worker thread'lerinden call_soon_threadsafe)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    def publish(self, job_id: str, event: Dict[str, Any]) -> None:
+        with self._lock:
+            targets = list(self._subscribers.get(job_id, ()))
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                pass  # abone loop'u kapanmış
+
+    def subscribe(self, job_id: str) -> "MemorySubscription":
+        return MemorySubscription(self, job_id)
+
+
+class MemorySubscription:
+    def __init__(self, bus: MemoryBus, job_id: str) -> None:
+        self.bus = bus
+        self.job_id = job_id
+        self._entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with bus._lock:
+            bus._subscribers.setdefault(job_id, set()).add(self._entry)
+
+    async def start(self) -> None:
+        pass
+
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(self._entry[1].get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self) -> None:
+        with self.bus._lock:
+            subscribers = self.bus._subscribers.get(self.job_id)
+            if subscribers is not None:
+                subscribers.discard(self._entry)
+                if not subscribers:
+                    del self.bus._subscribers[self.job_id]
+
+
+class RedisBus:
+    """Redis pub/sub: worker (sync client) yayınlar, API (redis.asyncio) abone olur."""
+
+    def __init__(self, url: str, client: Any) -> None:
+        self.url = url
+        self.client = client
+
+    def publish(self, job_id: str, event: Dict[str, Any]) -> None:
+        try:
+            self.client.publish(_channel(job_id), json.dumps(event, ensure_ascii=False, default=str))
+        except Exception as e:
+            # Olay kanalı işlemeyi durdurmamalı; SSE akışı store'dan okumaya devam eder
+            print(f"  ⚠️ Job olayı yayınlanamadı: {str(e)[:80]}", flush=True)
+
+    def subscribe(self, job_id: str) -> "RedisSubscription":
+        return RedisSubscription(self.url, job_id)
+
+
+class RedisSubscription:
+    def __init__(self, url: str, job_id: str) -> None:
+        import redis.asyncio as aioredis
+
+        self._client = aioredis.Redis.from_url(url, socket_connect_timeout=2)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._channel = _channel(job_id)
+
+    async def start(self) -> None:
+        """Kanala abone ol (ilk durum okunmadan önce; aradaki olaylar kaçmasın)."""
+        await self._pubsub.subscribe(self._channel)
+
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        message = await self._pubsub.get_message(timeout=timeout)
+        if message is None:
+            return None
+        try:
+            return json.loads(message["data"])
+        except (TypeError, ValueError):
+            return None
+
+    async def close(self) -> None:
+        try:
+            await self._pubsub.aclose()
+            await self._client.aclose()
+        except Exception:
+            pass
+
+
+_bus: Any = None
+_bus_lock = threading.Lock()
+
+
+def _build_bus() -> Any:
+    mode = os.getenv("JOB_EVENTS", "redis").strip().lower()
+    if mode == "memory":
+        return MemoryBus()
+    url = os.getenv("JOB_EVENTS_REDIS_URL") or os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+    try:
+        import redis
+
+        client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        client.ping()
+        return RedisBus(url, client)
+    except Exception as e:
+        print(f"⚠️ Job olayları için Redis'e bağlanılamadı, process içi kanal kullanılıyor: {str(e)[:80]}", flush=True)
+        return MemoryBus()
+
+
+def get_bus() -> Any:
+    """Process-wide event bus, or None when JOB_EVENTS=off."""
+    global _bus
+    if os.getenv("JOB_EVENTS", "redis").strip().lower() == "off":
+        return None
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                _bus = _build_bus()
+    return _bus
+
+
+def publish(job_id: str, event_type: str, **data: Any) -> None:
+    """Olay yayınla: {"type": event_type, **data}. Kanal kapalıysa sessizce geçer."""
+    bus = get_bus()
+    if bus is not None:
+        bus.publish(job_id, {"type": event_type, **data})
+
+
+def sse(event: Dict[str, Any]) -> str:
+    """Server-Sent Events çerçevesi (event: <type> / data: <json>)."""
+    payload = json.dumps(event, ensure_ascii=False, default=str)
+    return f"event: {event.get('type', 'message')}\ndata: {payload}\n\n"
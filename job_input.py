@@ -0,0 +1,116 @@
+"""
+Columnar job input: the uploaded sheet is parsed once and stored as Arrow IPC (Feather v2).
+
+Yükleme jobs/<id>/upload.<uzantı> olarak diske yazılır; prepare_job (Celery) onu bir kez ayrıştırır
+ve jobs/<id>/input.arrow olarak yazar (sıkıştırmasız). process_catalog_job Excel'i yeniden
+ayrıştırmaz: tablo memory-map ile açılır, DataFrame'e dönüşüm (to_pandas) ise sütunları bir kez
+kopyalar. Kazanç ayrıştırma maliyetindedir, kopyasız okuma değildir; job başına bir DataFrame kurulur
+(sütun budama istatistikleri shard'larda da tüm satırlara bakar). Orijinal yükleme sadece sadakat
+için saklanır.
+
+Arrow'a sığmayan karışık tipli sütunlar (aynı sütunda sayı + metin) hücre hücre JSON metni
+olarak saklanır ve okurken geri çevrilir; değerlerin tipi (42 ↔ "42") korunur.
+Eski job'lar (input.xlsx) için read_input Excel'e düşer.
+"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, List, Optional
+
+import pandas as pd
+
+ARROW_NAME = "input.arrow"
+LEGACY_NAME = "input.xlsx"
+
+_META_COLUMNS = b"catalog.columns"
+_META_JSON_COLUMNS = b"catalog.json_columns"
+
+
+def _json_cell(value: Any) -> Any:
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, pd.Timestamp):
+        value = value.isoformat()
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _table(df: pd.DataFrame):
+    """DataFrame → Arrow tablosu; dönüştürülemeyen sütunlar JSON metni olarak."""
+    import pyarrow as pa
+
+    arrays: List[Any] = []
+    names: List[str] = []
+    json_columns: List[str] = []
+    for position, column in enumerate(df.columns):
+        series = df.iloc[:, position]
+        name = str(column)
+        try:
+            arrays.append(pa.Array.from_pandas(series))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            arrays.append(pa.array([_json_cell(v) for v in series], type=pa.string()))
+            json_columns.append(name)
+        names.append(name)
+    metadata = {
+        # Sayısal başlıklar (Excel'de 2024 gibi) okurken orijinal tipine döner
+        _META_COLUMNS: json.dumps([c if isinstance(c, (int, float)) else str(c) for c in df.columns], ensure_ascii=False),
+        _META_JSON_COLUMNS: json.dumps(json_columns, ensure_ascii=False),
+    }
+    return pa.Table.from_arrays(arrays, names=names).replace_schema_metadata(metadata)
+
+
+def write_input(job_dir: Path, df: pd.DataFrame) -> Path:
+    """input.arrow yaz (atomik). Dönen: dosya yolu."""
+    import pyarrow.feather as feather
+
+    path = Path(job_dir) / ARROW_NAME
+    tmp = path.with_suffix(".tmp")
+    feather.write_feather(_table(df), str(tmp), compression="uncompressed")
+    tmp.replace(path)
+    return path
+
+
+def upload_path(job_dir: Path, filename: str = "") -> Path:
+    """Orijinal yüklemenin yolu: upload.<uzantı> (varsayılan .xlsx)."""
+    suffix = Path(filename or "").suffix.lower() or ".xlsx"
+    return Path(job_dir) / f"upload{suffix}"
+
+
+def find_upload(job_dir: Path) -> Optional[Path]:
+    return next(iter(sorted(Path(job_dir).glob("upload.*"))), None)
+
+
+def save_upload(job_dir: Path, content: bytes, filename: str = "") -> Path:
+    """Orijinal yükleme baytları (sadece sadakat / yeniden ayrıştırma için)."""
+    path = upload_path(job_dir, filename)
+    path.write_bytes(content)
+    return path
+
+
+def input_exists(job_dir: Path) -> bool:
+    return (Path(job_dir) / ARROW_NAME).exists() or (Path(job_dir) / LEGACY_NAME).exists()
+
+
+def read_input(job_dir: Path) -> pd.DataFrame:
+    """Job girdisi: input.arrow (memory-map ile açılıp DataFrame'e dönüştürülür) veya eski job'larda input.xlsx."""
+    path = Path(job_dir) / ARROW_NAME
+    if not path.exists():
+        legacy = Path(job_dir) / LEGACY_NAME
+        if not legacy.exists():
+            raise FileNotFoundError(str(path))
+        return pd.read_excel(legacy)
+
+    import pyarrow.feather as feather
+
+    table = feather.read_table(str(path), memory_map=True)
+    metadata = table.schema.metadata or {}
+    df = table.to_pandas()
+    for name in json.loads(metadata.get(_META_JSON_COLUMNS, b"[]")):
+        values = [json.loads(v) if isinstance(v, str) else None for v in df[name]]
+        df[name] = pd.Series(values, index=df.index, dtype=object)
+    columns = json.loads(metadata.get(_META_COLUMNS, b"null"))
+    if columns and len(columns) == len(df.columns):
+        df.columns = columns
+    return df
@@ -0,0 +1,72 @@
+"""
+Per-job counters shared by the worker threads of a single job.
+
+Gemini helpers in main.py only know about prompts, not jobs; they call
+``job_metrics.incr("cache_hits")`` and the counter lands on whichever job
+is bound to the current thread / asyncio task via ``bind()``.
+"""
+from __future__ import annotations
+
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+
+class JobMetrics:
+    """Thread-safe counter bag for one job, plus gauges (last-value-wins, any JSON value)."""
+
+    def __init__(self, initial: Optional[Dict[str, Any]] = None) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, Any] = {}
+        for name, value in (initial or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self._counters[name] = value
+
+    def incr(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set(self, name: str, value: Any) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def get(self, name: str, default: float = 0) -> float:
+        with self._lock:
+            return self._counters.get(name, default)
+
+    def counters(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._counters)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counters, **self._gauges}
+
+
+_current: contextvars.ContextVar[Optional[JobMetrics]] = contextvars.ContextVar(
+    "job_metrics", default=None
+)
+
+
+def current() -> Optional[JobMetrics]:
+    """Metrics bound to the running thread / task, or None outside a job."""
+    return _current.get()
+
+
+def incr(name: str, amount: float = 1) -> None:
+    """Increment a counter on the bound job; no-op when nothing is bound."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.incr(name, amount)
+
+
+@contextmanager
+def bind(metrics: Optional[JobMetrics]) -> Iterator[Optional[JobMetrics]]:
+    """Bind metrics for the duration of the block (ThreadPoolExecutor threads do not inherit context)."""
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
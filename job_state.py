@@ -0,0 +1,247 @@
+"""
+Indexed job-state store (SQLite) replacing the per-job status.csv.
+
+jobs tablosu her job için sayaçları (pending / in_flight / done / failed) tutar; ilerleme okuması
+tek satırlık sorgudur (CSV'yi pandas ile baştan okumak yok). rows tablosu satır bazlı durumu tutar.
+Durum geçişleri ve sayaç güncellemeleri aynı transaction'da yapılır (BEGIN IMMEDIATE); birden çok
+worker process'i aynı dosyaya güncelleme kaybetmeden yazabilir.
+
+Eski job'ların jobs/<id>/status.csv dosyaları ilk erişimde otomatik aktarılır (status.csv.migrated).
+
+Ayarlar (env):
+- JOB_STATE_PATH → SQLite dosya yolu (varsayılan: <JOBS_BASE_DIR>/jobs.sqlite)
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+BASE_DIR = Path(__file__).resolve().parent
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+STATES = (PENDING, IN_FLIGHT, DONE, FAILED)
+
+# Kontrol bayrakları (POST /jobs/{id}/pause|cancel): worker batch aralarında okur
+PAUSE = "pause"
+CANCEL = "cancel"
+CONTROLS = (PAUSE, CANCEL)
+
+# SQLite parametre sınırının altında kalmak için IN (...) listeleri bu boyutta bölünür
+_CHUNK = 500
+
+
+def _chunks(values: Sequence[int]) -> Iterable[Sequence[int]]:
+    for i in range(0, len(values), _CHUNK):
+        yield values[i:i + _CHUNK]
+
+
+class JobStateStore:
+    """
+    jobs + rows tabloları. One connection per thread; WAL mode so the API (reads) and
+    Celery workers (writes) can share the file.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                total INTEGER NOT NULL,
+                pending INTEGER NOT NULL,
+                in_flight INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                sku TEXT,
+                state TEXT NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (job_id, idx)
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_rows_state ON rows(job_id, state)")
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(jobs)")}
+        if "control" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN control TEXT")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            fn(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def exists(self, job_id: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone() is not None
+
+    def create_job(self, job_id: str, skus: Sequence[Optional[str]], states: Optional[Sequence[str]] = None) -> None:
+        """Job'u satırlarıyla kaydet (varsayılan: hepsi pending). Aynı job_id varsa üzerine yazar."""
+        now = time.time()
+        states = list(states) if states is not None else [PENDING] * len(skus)
+        counts = {s: states.count(s) for s in STATES}
+
+        def _tx(conn: sqlite3.Connection) -> None:
+            conn.execute("DELETE FROM rows WHERE job_id = ?", (job_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, total, pending, in_flight, done, failed, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, len(skus), counts[PENDING], counts[IN_FLIGHT], counts[DONE], counts[FAILED], now, now),
+            )
+            conn.executemany(
+                "INSERT INTO rows (job_id, idx, sku, state, updated) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, i, sku, state, now) for i, (sku, state) in enumerate(zip(skus, states))],
+            )
+
+        self._write(_tx)
+
+    def progress(self, job_id: str) -> Dict[str, int]:
+        """{total, pending, in_flight, done, failed} - tek satır okuması. Job yoksa KeyError."""
+        row = self._conn().execute(
+            "SELECT total, pending, in_flight, done, failed FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(job_id)
+        return dict(zip(("total",) + STATES, row))
+
+    def control(self, job_id: str) -> Optional[str]:
+        """Bekleyen kontrol isteği (pause / cancel) veya None - tek satır okuması."""
+        row = self._conn().execute("SELECT control FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_control(self, job_id: str, control: Optional[str]) -> None:
+        """Kontrol bayrağını yaz (None → temizle). Job yoksa KeyError."""
+        if control is not None and control not in CONTROLS:
+            raise ValueError(f"Bilinmeyen kontrol: {control}")
+        cursor = self._conn().execute(
+            "UPDATE jobs SET control = ?, updated = ? WHERE job_id = ?", (control, time.time(), job_id)
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(job_id)
+
+    def set_state(self, job_id: str, indices: Iterable[int], state: str) -> None:
+        """Satırları state'e geçir; job sayaçları aynı transaction'da güncellenir."""
+        if state not in STATES:
+            raise ValueError(f"Bilinmeyen durum: {state}")
+        indices = sorted({int(i) for i in indices})
+        if not indices:
+            return
+        now = time.time()
+
+        def _tx(conn: sqlite3.Connection) -> None:
+            delta = {s: 0 for s in STATES}
+            for part in _chunks(indices):
+                marks = ",".join("?" * len(part))
+                for old, count in conn.execute(
+                    f"SELECT state, COUNT(*) FROM rows WHERE job_id = ? AND idx IN ({marks}) AND state != ? GROUP BY state",
+                    (job_id, *part, state),
+                ):
+                    delta[old] -= count
+                    delta[state] += count
+                conn.execute(
+                    f"UPDATE rows SET state = ?, updated = ? WHERE job_id = ? AND idx IN ({marks}) AND state != ?",
+                    (state, now, job_id, *part, state),
+                )
+            conn.execute(
+                "UPDATE jobs SET pending = pending + ?, in_flight = in_flight + ?, done = done + ?, "
+                "failed = failed + ?, updated = ? WHERE job_id = ?",
+                (delta[PENDING], delta[IN_FLIGHT], delta[DONE], delta[FAILED], now, job_id),
+            )
+
+        self._write(_tx)
+
+    def indices(self, job_id: str, states: Sequence[str]) -> Set[int]:
+        marks = ",".join("?" * len(states))
+        return {
+            r[0]
+            for r in self._conn().execute(
+                f"SELECT idx FROM rows WHERE job_id = ? AND state IN ({marks})", (job_id, *states)
+            )
+        }
+
+    def count(self, job_id: str, states: Sequence[str], start: int = 0, end: Optional[int] = None) -> int:
+        """[start, end) aralığında verilen durumlardaki satır sayısı (shard ilerlemesi için)."""
+        marks = ",".join("?" * len(states))
+        end = end if end is not None else 2 ** 62
+        return int(self._conn().execute(
+            f"SELECT COUNT(*) FROM rows WHERE job_id = ? AND idx >= ? AND idx < ? AND state IN ({marks})",
+            (job_id, int(start), int(end), *states),
+        ).fetchone()[0])
+
+    def drop_first_row(self, job_id: str) -> None:
+        """Teknik başlık satırı (TITLE...) kayıtlıysa çıkar ve satırları yeniden numarala."""
+        rows = self._conn().execute(
+            "SELECT sku, state FROM rows WHERE job_id = ? ORDER BY idx", (job_id,)
+        ).fetchall()
+        if rows:
+            control = self.control(job_id)
+            self.create_job(job_id, [r[0] for r in rows[1:]], [r[1] for r in rows[1:]])
+            if control:
+                self.set_control(job_id, control)
+
+    def delete_job(self, job_id: str) -> None:
+        def _tx(conn: sqlite3.Connection) -> None:
+            conn.execute("DELETE FROM rows WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+        self._write(_tx)
+
+    def migrate_status_csv(self, job_id: str, status_file: Path) -> bool:
+        """Eski status.csv'yi (index, processed, sku) aktar; dosya status.csv.migrated olarak saklanır."""
+        import pandas as pd
+
+        status_df = pd.read_csv(status_file)
+        proc = status_df["processed"]
+        is_done = (proc == True) | (proc.astype(str).str.lower() == "true")
+        skus: List[Optional[str]] = (
+            status_df["sku"].astype(str).tolist() if "sku" in status_df.columns else [None] * len(status_df)
+        )
+        self.create_job(job_id, skus, [DONE if d else PENDING for d in is_done.tolist()])
+        status_file.replace(status_file.with_name(status_file.name + ".migrated"))
+        return True
+
+
+_store: Optional[JobStateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> JobStateStore:
+    """Process-wide store (JOB_STATE_PATH, varsayılan <JOBS_BASE_DIR>/jobs.sqlite)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                jobs_dir = Path(os.getenv("JOBS_BASE_DIR", str(BASE_DIR / "jobs")))
+                _store = JobStateStore(Path(os.getenv("JOB_STATE_PATH", str(jobs_dir / "jobs.sqlite"))))
+    return _store
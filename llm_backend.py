@@ -0,0 +1,291 @@
+"""
+Pluggable LLM backend behind every generate_content call in main.py.
+
+main.model / main.chat_model are lazy handles: the backend (and genai.configure) is only
+created on the first call, so importing main.py no longer needs GEMINI_API_KEY.
+
+Ayarlar (env):
+- LLM_BACKEND=gemini (varsayılan) | mock
+- GEMINI_API_KEY / GEMINI_MODEL → gemini backend
+- LLM_RECORD / LLM_REPLAY       → trafiği kaydet / kayıttan oynat (bkz. llm_replay.py)
+
+Mock backend (offline benchmark / yük testi; ağ çağrısı yok):
+- MOCK_LLM_LATENCY     → gecikme dağılımı: "fixed:0.5", "uniform:0.2,1.5", "lognormal:0.8,0.4"
+                         (ortalama, sigma; saniye) veya "normal:0.8,0.2". Varsayılan "lognormal:0.8,0.3"
+- MOCK_LLM_429_RATE    → rastgele 429 oranı (0-1, varsayılan 0)
+- MOCK_LLM_RPM         → sunucu kotası; dakikalık istek bunu aşarsa 429 (varsayılan 0 = sınırsız)
+- MOCK_LLM_RESPONSES   → canned yanıtlar JSON dosyası: {"prompt içinde geçen metin": <JSON yanıt>, ...}
+                         Eşleşme yoksa yanıt istenen şemadan / girdiden üretilir.
+- MOCK_LLM_SEED        → tekrarlanabilir rastgelelik
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+
+class BackendResponse:
+    """generate_content yanıtının kullanılan kısmı: .text ve .usage_metadata.total_token_count."""
+
+    class _Usage:
+        def __init__(self, total_token_count: int) -> None:
+            self.total_token_count = total_token_count
+
+    def __init__(self, text: str, total_tokens: Optional[int] = None) -> None:
+        self.text = text
+        self.usage_metadata = self._Usage(total_tokens) if total_tokens is not None else None
+
+
+class GeminiBackend:
+    """google.generativeai; genai.configure ilk modelde yapılır."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None, model_name: Optional[str] = None) -> None:
+        self.api_key = api_key if api_key is not None else os.getenv("GEMINI_API_KEY")
+        self.model_name = model_name or os.getenv("GEMINI_MODEL", "gemini-flash-latest")
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def model(self, kind: str) -> Any:
+        if kind not in self._models:
+            with self._lock:
+                if kind not in self._models:
+                    if not self.api_key:
+                        raise ValueError(
+                            "GEMINI_API_KEY environment variable bulunamadı!\n"
+                            "Lütfen .env dosyası oluşturun ve şu satırı ekleyin:\n"
+                            "GEMINI_API_KEY=your_api_key_here\n"
+                            "(API olmadan denemek için LLM_BACKEND=mock)"
+                        )
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=self.api_key)
+                    if kind == "json":
+                        config = {"response_mime_type": "application/json"}
+                    else:
+                        config = {"temperature": 0.1}
+                    self._models[kind] = genai.GenerativeModel(model_name=self.model_name, generation_config=config)
+        return self._models[kind]
+
+
+def _latency_sampler(spec: str, rng: random.Random):
+    """'lognormal:0.8,0.3' → örnekleyici fonksiyon (saniye)."""
+    kind, _, params = (spec or "fixed:0").partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()] or [0.0]
+    kind = kind.strip().lower()
+    if kind == "uniform":
+        low, high = values[0], values[1] if len(values) > 1 else values[0]
+        return lambda: rng.uniform(low, high)
+    if kind == "normal":
+        mean, sigma = values[0], values[1] if len(values) > 1 else 0.0
+        return lambda: max(0.0, rng.gauss(mean, sigma))
+    if kind == "lognormal":
+        # ortalama ve log-sigma: mu = ln(mean) - sigma²/2 → dağılımın ortalaması `mean` olur
+        mean, sigma = values[0], values[1] if len(values) > 1 else 0.3
+        mu = math.log(max(mean, 1e-6)) - sigma * sigma / 2
+        return lambda: rng.lognormvariate(mu, sigma)
+    return lambda: values[0]
+
+
+def _girdi(prompt: str) -> Any:
+    """Prompt'taki 'GİRDİ VERİSİ:' JSON'u (yoksa None)."""
+    _, sep, body = prompt.partition("GİRDİ VERİSİ:\n")
+    if not sep:
+        return None
+    try:
+        return json.loads(body)
+    except json.JSONDecodeError:
+        return None
+
+
+def _baslik(veri: Any) -> str:
+    if isinstance(veri, dict):
+        for anahtar in ("Urun_Basligi", "Başlık", "TITLE__TR_TR", "orijinal_baslik"):
+            if veri.get(anahtar):
+                return str(veri[anahtar])
+    return "Mock ürün"
+
+
+def _from_schema(sema: Dict[str, Any], veri: Any) -> Any:
+    """Şemaya uyan, girdiyi yansıtan sahte yanıt (temiz_baslik = girdideki başlık, _id aynen)."""
+    tip = str(sema.get("type", "")).upper()
+    if tip == "ARRAY":
+        items = sema.get("items", {})
+        if isinstance(veri, dict) and isinstance(veri.get("varyantlar"), list):
+            veri = veri["varyantlar"]
+        if isinstance(veri, list) and "_id" in items.get("properties", {}):
+            return [_from_schema(items, eleman) for eleman in veri]
+        return []
+    if tip == "OBJECT":
+        sonuc = {}
+        for ad, alt in sema.get("properties", {}).items():
+            if ad == "_id":
+                sonuc[ad] = str(veri.get("_id", "")) if isinstance(veri, dict) else ""
+            elif ad == "temiz_baslik":
+                sonuc[ad] = _baslik(veri)
+            elif alt.get("nullable"):
+                sonuc[ad] = None
+            elif ad in sema.get("required", []) or str(alt.get("type", "")).upper() == "ARRAY":
+                sonuc[ad] = _from_schema(alt, veri)
+        return sonuc
+    return ""
+
+
+class _MockModel:
+    def __init__(self, backend: "MockBackend", kind: str) -> None:
+        self.backend = backend
+        self.kind = kind
+        self.model_name = f"mock:{backend.model_name}"
+
+    def generate_content(self, contents: str, generation_config: Optional[Dict[str, Any]] = None, **_: Any):
+        delay, error = self.backend._plan()
+        time.sleep(delay)
+        if error:
+            raise error
+        return self.backend._respond(self.kind, contents, generation_config)
+
+    async def generate_content_async(self, contents: str, generation_config: Optional[Dict[str, Any]] = None, **_: Any):
+        delay, error = self.backend._plan()
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return self.backend._respond(self.kind, contents, generation_config)
+
+
+class MockBackend:
+    """In-process sahte Gemini: ayarlanabilir gecikme, 429 enjeksiyonu, canned JSON."""
+
+    name = "mock"
+
+    def __init__(
+        self,
+        latency: str = "lognormal:0.8,0.3",
+        rate_429: float = 0.0,
+        rpm: int = 0,
+        responses: Optional[Dict[str, Any]] = None,
+        seed: Optional[int] = None,
+        model_name: str = "gemini-flash-latest",
+    ) -> None:
+        self.rng = random.Random(seed)
+        self._sample = _latency_sampler(latency, self.rng)
+        self.rate_429 = rate_429
+        self.rpm = rpm
+        self.responses = responses or {}
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._window: deque = deque()
+        self.calls = 0
+        self.errors_429 = 0
+
+    @classmethod
+    def from_env(cls) -> "MockBackend":
+        responses: Dict[str, Any] = {}
+        path = os.getenv("MOCK_LLM_RESPONSES")
+        if path:
+            with open(path, encoding="utf-8") as f:
+                responses = json.load(f)
+        seed = os.getenv("MOCK_LLM_SEED")
+        return cls(
+            latency=os.getenv("MOCK_LLM_LATENCY", "lognormal:0.8,0.3"),
+            rate_429=float(os.getenv("MOCK_LLM_429_RATE", "0")),
+            rpm=int(os.getenv("MOCK_LLM_RPM", "0")),
+            responses=responses,
+            seed=int(seed) if seed else None,
+            model_name=os.getenv("GEMINI_MODEL", "gemini-flash-latest"),
+        )
+
+    def model(self, kind: str) -> _MockModel:
+        return _MockModel(self, kind)
+
+    def _plan(self) -> Tuple[float, Optional[Exception]]:
+        """(gecikme, fırlatılacak hata) - kota penceresi ve rastgele 429."""
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            while self._window and now - self._window[0] > 60:
+                self._window.popleft()
+            throttled = bool(self.rpm) and len(self._window) >= self.rpm
+            if not throttled:
+                self._window.append(now)
+            if throttled or (self.rate_429 and self.rng.random() < self.rate_429):
+                self.errors_429 += 1
+                retry = 60 - (now - self._window[0]) if throttled and self._window else 2
+                # Gerçek API mesajına benzer: main._rate_limit_bekleme "retry in Ns" değerini okur
+                return 0.05, Exception(f"429 Resource has been exhausted (e.g. check quota). Please retry in {max(retry, 1):.0f}s.")
+            return self._sample(), None
+
+    def _respond(self, kind: str, contents: str, generation_config: Optional[Dict[str, Any]]) -> BackendResponse:
+        text = None
+        for parca, yanit in self.responses.items():
+            if parca in contents:
+                text = yanit if isinstance(yanit, str) else json.dumps(yanit, ensure_ascii=False)
+                break
+        if text is None:
+            veri = _girdi(contents)
+            sema = (generation_config or {}).get("response_schema")
+            if sema:
+                text = json.dumps(_from_schema(sema, veri), ensure_ascii=False)
+            elif kind == "json":
+                if isinstance(veri, list):
+                    text = json.dumps([{"_id": v.get("_id"), "temiz_baslik": _baslik(v), "duzenlenmis_ozellikler": {}} for v in veri], ensure_ascii=False)
+                else:
+                    text = json.dumps({"temiz_baslik": _baslik(veri), "duzenlenmis_ozellikler": {}, "uyari": None}, ensure_ascii=False)
+            else:
+                text = "{}" if "JSON" in contents else "bilinmiyor"
+        return BackendResponse(text, total_tokens=(len(contents) + len(text)) // 4)
+
+
+_backend: Optional[Any] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> Any:
+    """Process-wide backend (LLM_BACKEND)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                import llm_replay
+
+                kind = os.getenv("LLM_BACKEND", "gemini").strip().lower()
+                backend = MockBackend.from_env() if kind == "mock" else GeminiBackend()
+                # LLM_RECORD / LLM_REPLAY → kayıt / oynatma sarmalayıcısı (llm_replay.py)
+                _backend = llm_replay.wrap_backend(backend)
+    return _backend
+
+
+def set_backend(backend: Optional[Any]) -> None:
+    """Backend'i değiştir (benchmark / test); None → bir sonraki çağrıda env'den yeniden kurulur."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+class LazyModel:
+    """main.model / main.chat_model: çağrı anında get_backend().model(kind)'a yönlenir."""
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+
+    @property
+    def model_name(self) -> str:
+        # Cache anahtarına girer; gemini için genai.GenerativeModel.model_name ile aynı biçim
+        backend = get_backend()
+        name = getattr(backend, "model_name", "")
+        if backend.name != "gemini":
+            return f"{backend.name}:{name}"
+        return name if "/" in name else f"models/{name}"
+
+    def generate_content(self, contents: Any, **kwargs: Any):
+        return get_backend().model(self.kind).generate_content(contents, **kwargs)
+
+    async def generate_content_async(self, contents: Any, **kwargs: Any):
+        return await get_backend().model(self.kind).generate_content_async(contents, **kwargs)
@@ -0,0 +1,417 @@
+"""
+Record/replay harness for Gemini traffic and the web-search helpers.
+
+Kayıt modu her LLM isteğini (urun_isle, gemini_eksik_sutunlar_toplu_sor, gemini_celiskic_coz, ...)
+ve arama yardımcılarının (ean_ara_internet, urun_boyutu_ara_internet) sonuçlarını gecikmeleri ve
+hatalarıyla (429 dahil) birlikte JSONL arşivine yazar (.gz uzantılıysa çalışma başına tek gzip akışı,
+her kayıttan sonra flush edilir; process kayıt ortasında ölse de önceki kayıtlar okunabilir kalır).
+Sistem talimatları (register_instruction) arşive çalışma başına bir kez, instruction_version
+anahtarıyla yazılır; istek kayıtları talimatı bu anahtarla anar. Oynatma modu aynı istekler için
+kayıtlı yanıtları orijinal veya ölçeklenmiş gecikmeyle döndürür; böylece bir production job'u
+(jobs/<id>/input.arrow) kota harcamadan, deterministik olarak yeniden çalıştırılabilir.
+
+Ayarlar (env):
+- LLM_RECORD=<arşiv.jsonl.gz>   → kayıt (gerçek backend'in önüne sarılır). Birden çok Celery
+                                   worker process'i için yolda {pid} kullan: jobs/rec/{pid}.jsonl.gz
+- LLM_REPLAY=<arşiv veya klasör> → oynatma (klasörse içindeki tüm *.jsonl / *.jsonl.gz okunur)
+- REPLAY_LATENCY_SCALE           → kayıtlı gecikme çarpanı (varsayılan 1.0; 0 = beklemeden)
+- REPLAY_FALLBACK=mock           → arşivde olmayan LLM istekleri mock backend'e gider (varsayılan: hata)
+
+Not: gemini_cache'ten dönen yanıtlar backend'e ulaşmaz; kayıt ve oynatmada GEMINI_CACHE=0 kullan.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+import job_metrics
+from gemini_cache import instruction_version
+
+
+def request_key(kind: str, *parts: Any) -> str:
+    h = hashlib.sha256(kind.encode("utf-8"))
+    for part in parts:
+        h.update(b"\x00")
+        h.update(json.dumps(part, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+class ReplayMiss(Exception):
+    """Arşivde karşılığı olmayan istek."""
+
+
+_instructions: Dict[str, str] = {}
+
+
+def register_instruction(text: str) -> None:
+    """
+    Sistem talimatını bildir (main._gemini_adimlari): kayıtta istek metni bu talimatla başlıyorsa
+    talimat bir kez yazılır, istekte sadece sürüm anahtarı kalır. Kayıt kapalıyken bir şey yapmaz.
+    """
+    if text and text not in _instructions.values() and recorder() is not None:
+        with _state_lock:
+            _instructions[instruction_version(text)] = text
+
+
+class Recorder:
+    """
+    Append-only JSONL arşivi; thread-safe. .gz yolunda çalışma başına tek gzip üyesi açılır ve her
+    kayıttan sonra flush edilir (sync flush: kayıt sınırına kadar her şey açılabilir); close()
+    üyeyi kapatır. Öldürülen çalışmanın üyesi trailer'sız kalır, sonraki çalışma yeni üye ekler.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path.replace("{pid}", str(os.getpid())))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        if self.path.suffix == ".gz":
+            self._fh = gzip.GzipFile(self.path, "ab", mtime=0)
+        else:
+            self._fh = open(self.path, "ab")
+        self._written: Set[str] = set()
+        self._start = time.time()
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        data = (json.dumps(entry, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        self._fh.write(data)
+        self._fh.flush()
+
+    def compact(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """LLM isteği: contents bilinen bir talimatla başlıyorsa talimat yerine sürüm anahtarı."""
+        contents = request.get("contents")
+        if not isinstance(contents, str):
+            return request
+        found = max(
+            (v for v, text in list(_instructions.items()) if contents.startswith(text)),
+            key=lambda v: len(_instructions[v]),
+            default=None,
+        )
+        if found is None:
+            return request
+        with self._lock:
+            if found not in self._written:
+                self._written.add(found)
+                self._append({"kind": "instruction", "key": found, "text": _instructions[found]})
+        return {**request, "instruction": found, "contents": contents[len(_instructions[found]):]}
+
+    def write(self, kind: str, key: str, request: Any, response: Any = None,
+              error: Optional[str] = None, latency: float = 0.0) -> None:
+        entry = {
+            "kind": kind,
+            "key": key,
+            "t": round(time.time() - self._start, 3),
+            "latency": round(latency, 4),
+            "request": request,
+            "response": response,
+            "error": error,
+        }
+        with self._lock:
+            self._append(entry)
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+
+
+class Archive:
+    """
+    Kayıtlı istekler: key → sırayla oynatılacak kayıtlar (aynı istek tekrar gelirse sonraki kayıt).
+    instructions: sürüm anahtarı → sistem talimatı (kayıtlardaki "instruction" alanı için).
+    """
+
+    def __init__(self, path: str, latency_scale: float = 1.0) -> None:
+        self.latency_scale = latency_scale
+        self.instructions: Dict[str, str] = {}
+        self._entries: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        for file in self._files(Path(path)):
+            for line in _lines(file):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # yarım kalmış satır
+                if not isinstance(entry, dict) or "key" not in entry:
+                    continue
+                if entry.get("kind") == "instruction":
+                    self.instructions[entry["key"]] = entry.get("text", "")
+                else:
+                    self._entries[entry["key"]].append(entry)
+
+    @staticmethod
+    def _files(path: Path) -> List[Path]:
+        if path.is_dir():
+            return sorted([*path.glob("*.jsonl.gz"), *path.glob("*.jsonl")])
+        return [path] if path.exists() else []
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._entries.values())
+
+    def take(self, key: str) -> Dict[str, Any]:
+        with self._lock:
+            queue = self._entries.get(key)
+            if queue:
+                entry = queue.popleft()
+                self._last[key] = entry
+                return entry
+            if key in self._last:
+                return self._last[key]
+        job_metrics.incr("replay_misses")
+        raise ReplayMiss(f"Kayıtta yok: {key[:12]}")
+
+    def delay(self, entry: Dict[str, Any]) -> float:
+        return float(entry.get("latency") or 0.0) * self.latency_scale
+
+
+_GZIP_MAGIC = b"\x1f\x8b\x08"
+_GZIP_BLOCK = 1 << 16
+
+
+def _gzip_members(data: bytes) -> Iterator[bytes]:
+    """
+    Çok üyeli gzip verisini üye üye açar. Öldürülen çalışmanın üyesi trailer'sızdır ve ardından
+    sonraki çalışmanın üyesi gelir; açma hatasında üye sınırı _next_member ile bulunur, o ana
+    kadarki içerik verilir ve okuma sınırdan sürer.
+    """
+    pos = 0
+    while pos < len(data):
+        d = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        parts: List[bytes] = []
+        for i in range(pos, len(data), _GZIP_BLOCK):
+            try:
+                parts.append(d.decompress(data[i:i + _GZIP_BLOCK]))
+            except zlib.error:
+                member, pos = _next_member(data, pos, i + _GZIP_BLOCK)
+                yield member
+                break
+            if d.eof:
+                yield b"".join(parts)
+                pos = len(data) - len(d.unused_data)
+                break
+        else:
+            yield b"".join(parts)  # son üye trailer'sız (kayıt sürüyor veya process öldü)
+            return
+
+
+def _next_member(data: bytes, start: int, failed_at: int) -> Tuple[bytes, int]:
+    """
+    (start'taki kesik üyenin açılabilen içeriği, sonraki üyenin başı). Aday sınırlar hatalı bloğa
+    kadarki gzip başlıklarıdır; öncesi hatasız açılan ve kendisi geçerli üye başı olan ilk aday seçilir.
+    """
+    nxt = data.find(_GZIP_MAGIC, start + 1, failed_at)
+    while nxt >= 0:
+        try:
+            head = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            head.decompress(data[nxt:nxt + 1024])
+            return zlib.decompressobj(zlib.MAX_WBITS | 16).decompress(data[start:nxt]), nxt
+        except zlib.error:
+            nxt = data.find(_GZIP_MAGIC, nxt + 1, failed_at)
+    # Sınır bulunamadı (bozuk veri): bu üye atlanır
+    nxt = data.find(_GZIP_MAGIC, failed_at)
+    return b"", nxt if nxt >= 0 else len(data)
+
+
+def _lines(file: Path) -> Iterator[bytes]:
+    """Arşiv satırları (.gz ise üye üye; her üye kendi satırlarıyla, kesik son satır dahil)."""
+    data = file.read_bytes()
+    if file.suffix != ".gz":
+        yield from data.splitlines()
+        return
+    for member in _gzip_members(data):
+        yield from member.splitlines()
+
+
+# ---------------- LLM backend sarmalayıcıları ----------------
+
+def _llm_request(kind: str, contents: Any, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    # Anahtar model adını içermez: mock ile kaydedilen trafik gemini adıyla da oynatılabilir
+    return {"model": kind, "contents": contents, "generation_config": kwargs.get("generation_config")}
+
+
+class _RecordingModel:
+    def __init__(self, inner: Any, kind: str, recorder: Recorder) -> None:
+        self.inner = inner
+        self.kind = kind
+        self.recorder = recorder
+
+    def _save(self, request: Dict[str, Any], started: float, response: Any = None, error: Any = None) -> None:
+        # Anahtar tam istekten (oynatma aynı şekilde hesaplar); arşive talimatsız biçim yazılır
+        key = request_key("llm", request)
+        usage = getattr(response, "usage_metadata", None)
+        payload = None
+        if response is not None:
+            payload = {"text": response.text, "total_tokens": getattr(usage, "total_token_count", None)}
+        self.recorder.write("llm", key, self.recorder.compact(request), payload,
+                            str(error) if error is not None else None, time.monotonic() - started)
+
+    def generate_content(self, contents: Any, **kwargs: Any):
+        request = _llm_request(self.kind, contents, kwargs)
+        started = time.monotonic()
+        try:
+            response = self.inner.generate_content(contents, **kwargs)
+        except Exception as e:
+            self._save(request, started, error=e)
+            raise
+        self._save(request, started, response=response)
+        return response
+
+    async def generate_content_async(self, contents: Any, **kwargs: Any):
+        request = _llm_request(self.kind, contents, kwargs)
+        started = time.monotonic()
+        try:
+            response = await self.inner.generate_content_async(contents, **kwargs)
+        except Exception as e:
+            self._save(request, started, error=e)
+            raise
+        self._save(request, started, response=response)
+        return response
+
+
+class RecordingBackend:
+    """Gerçek (veya mock) backend'in önüne geçer, her çağrıyı arşive yazar."""
+
+    def __init__(self, inner: Any, recorder: Recorder) -> None:
+        self.inner = inner
+        self.recorder = recorder
+        self.name = inner.name
+        self.model_name = getattr(inner, "model_name", "")
+
+    def model(self, kind: str) -> _RecordingModel:
+        return _RecordingModel(self.inner.model(kind), kind, self.recorder)
+
+
+class _ReplayModel:
+    def __init__(self, backend: "ReplayBackend", kind: str) -> None:
+        self.backend = backend
+        self.kind = kind
+
+    def _lookup(self, contents: Any, kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        try:
+            return self.backend.archive.take(request_key("llm", _llm_request(self.kind, contents, kwargs)))
+        except ReplayMiss:
+            if self.backend.fallback is None:
+                raise
+            return None
+
+    @staticmethod
+    def _result(entry: Dict[str, Any]):
+        from llm_backend import BackendResponse
+
+        if entry.get("error"):
+            raise Exception(entry["error"])
+        payload = entry.get("response") or {}
+        return BackendResponse(payload.get("text", ""), payload.get("total_tokens"))
+
+    def generate_content(self, contents: Any, **kwargs: Any):
+        entry = self._lookup(contents, kwargs)
+        if entry is None:
+            return self.backend.fallback.model(self.kind).generate_content(contents, **kwargs)
+        time.sleep(self.backend.archive.delay(entry))
+        return self._result(entry)
+
+    async def generate_content_async(self, contents: Any, **kwargs: Any):
+        entry = self._lookup(contents, kwargs)
+        if entry is None:
+            return await self.backend.fallback.model(self.kind).generate_content_async(contents, **kwargs)
+        await asyncio.sleep(self.backend.archive.delay(entry))
+        return self._result(entry)
+
+
+class ReplayBackend:
+    """Arşivden yanıt veren backend (ağ çağrısı yok)."""
+
+    name = "replay"
+
+    def __init__(self, archive: Archive, fallback: Optional[Any] = None) -> None:
+        self.archive = archive
+        self.fallback = fallback
+        self.model_name = os.getenv("GEMINI_MODEL", "gemini-flash-latest")
+
+    def model(self, kind: str) -> _ReplayModel:
+        return _ReplayModel(self, kind)
+
+
+# ---------------- Arama yardımcıları ----------------
+
+_recorder: Optional[Recorder] = None
+_archive: Optional[Archive] = None
+_state_lock = threading.Lock()
+
+
+def recorder() -> Optional[Recorder]:
+    global _recorder
+    path = os.getenv("LLM_RECORD")
+    if not path or os.getenv("LLM_REPLAY"):
+        return None
+    if _recorder is None:
+        with _state_lock:
+            if _recorder is None:
+                _recorder = Recorder(path)
+    return _recorder
+
+
+def archive() -> Optional[Archive]:
+    global _archive
+    path = os.getenv("LLM_REPLAY")
+    if not path:
+        return None
+    if _archive is None:
+        with _state_lock:
+            if _archive is None:
+                _archive = Archive(path, latency_scale=float(os.getenv("REPLAY_LATENCY_SCALE", "1.0")))
+    return _archive
+
+
+def wrap_backend(backend: Any) -> Any:
+    """llm_backend.get_backend için: LLM_REPLAY / LLM_RECORD ayarlıysa backend'i sarar."""
+    arsiv = archive()
+    if arsiv is not None:
+        fallback = backend if os.getenv("REPLAY_FALLBACK", "").strip().lower() == "mock" else None
+        return ReplayBackend(arsiv, fallback)
+    kayit = recorder()
+    if kayit is not None:
+        return RecordingBackend(backend, kayit)
+    return backend
+
+
+def recorded(name: str, bos: Optional[Callable[[], Any]] = None) -> Callable:
+    """
+    Arama yardımcıları için dekoratör: kayıt modunda sonucu arşive yazar, oynatma modunda
+    arşivden döndürür (internet'e çıkmadan).
+    bos: oynatmada arşivde olmayan çağrı için yardımcının "bulunamadı" değeri (ör. dict);
+    verilmezse ReplayMiss yükselir. Kaçan çağrılar replay_misses sayacına yazılır.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            arsiv = archive()
+            kayit = recorder() if arsiv is None else None
+            if arsiv is None and kayit is None:
+                return func(*args, **kwargs)
+            request = {"args": list(args), "kwargs": kwargs}
+            key = request_key(name, request)
+            if arsiv is not None:
+                try:
+                    entry = arsiv.take(key)
+                except ReplayMiss:
+                    if bos is None:
+                        raise ReplayMiss(f"{name}: arşivde kaydı yok (args={request['args']!r})") from None
+                    return bos()
+                time.sleep(arsiv.delay(entry))
+                return entry.get("response")
+            started = time.monotonic()
+            result = func(*args, **kwargs)
+            kayit.write(name, key, request, result, None, time.monotonic() - started)
+            return result
+        return wrapper
+    return decorator
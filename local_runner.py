@@ -0,0 +1,114 @@
+"""
+Long-lived in-process job runner for dashboard.py (instead of spawning main.py).
+
+Dashboard "Başlat" isteğini bu process'te yaşayan tek bir worker thread'ine verir; thread
+cli.clean_file'ı çalıştırır (tasks.process_catalog_job motoru, Celery yoluyla aynı). Böylece:
+- başlatmada yorumlayıcı / pandas / genai importu ve Gemini istemcisi yeniden kurulmaz; thread'e bağlı
+  SQLite bağlantıları (Gemini cache, checkpoint, job state) ve rate limiter çalışmalar arasında sıcak kalır,
+- giriş dosyası değişmediyse Excel yeniden okunmaz (job'un kayıtlı Arrow girdisi kullanılır),
+- durdurma pause bayrağını koyup hemen döner: uçuştaki istekler tamamlanıp checkpoint'e yazılır,
+  process öldürülmez ve iş kaybolmaz,
+- devam aynı job'u (çıktı yoluna bağlı sabit kimlik) checkpoint'ten sürdürür; durdurma sürerken
+  başlatılırsa boşalma biter bitmez kaldığı yerden devam eder.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import job_state
+from cli import clean_file, local_job_id
+from job_state import PAUSE
+
+_Request = Tuple[str, str, Dict[str, Any]]
+
+
+class LocalRunner:
+    """Tek worker thread; start / stop dashboard'un istek thread'lerinden çağrılır."""
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._next: Optional[_Request] = None  # başlamayı bekleyen istek
+        self._current: Optional[str] = None  # çalışan job_id
+        self._stop: Optional[threading.Event] = None
+        self.last_status: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while self._next is None:
+                    self._cond.wait()
+                input_file, output_file, options = self._next
+                self._next = None
+                self._current = local_job_id(output_file)
+                self._stop = stop = threading.Event()
+            try:
+                self.last_status = clean_file(input_file, output_file, stop=stop, **options)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ Yerel çalıştırma hatası: {str(e)[:200]}", flush=True)
+            finally:
+                with self._cond:
+                    self._current = None
+                    self._stop = None
+
+    @property
+    def running(self) -> bool:
+        """Çalışıyor, durduruluyor veya başlamak üzere."""
+        return self._current is not None or self._next is not None
+
+    @property
+    def stopping(self) -> bool:
+        """Durdurma istendi, uçuştaki istekler tamamlanıyor (ardından devam sırada değil)."""
+        stop = self._stop
+        return stop is not None and stop.is_set() and self._next is None
+
+    def start(self, input_file: str, output_file: str, **options: Any) -> bool:
+        """
+        İşi başlat (options: cli.clean_file argümanları). Zaten çalışıyorsa False.
+        Durdurulurken çağrılırsa boşalma bittiğinde aynı yerden devam eder.
+        """
+        with self._cond:
+            busy = self._current is not None and not (self._stop is not None and self._stop.is_set())
+            if self._next is not None or busy:
+                return False
+            self._next = (input_file, output_file, options)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="local-runner", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return True
+
+    def stop(self) -> bool:
+        """Durdur: yeni batch başlamaz, uçuştakiler checkpoint'e yazılır. Hemen döner; çalışmıyorsa False."""
+        with self._cond:
+            if self._next is not None:
+                # Henüz başlamamış (ör. durdurma sırasında verilmiş devam) istek iptal
+                self._next = None
+                return True
+            if self._current is None or self._stop is None or self._stop.is_set():
+                return False
+            self._stop.set()
+            job_id = self._current
+        try:
+            job_state.get_store().set_control(job_id, PAUSE)
+        except KeyError:
+            pass  # job henüz kaydedilmedi: clean_file kayıttan sonra stop olayını görür
+        return True
+
+
+_runner: Optional[LocalRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> LocalRunner:
+    """Process-wide runner (dashboard.py)."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = LocalRunner()
+    return _runner
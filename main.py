@@ -1,10 +1,22 @@
-import google.generativeai as genai
 import pandas as pd
+import asyncio
 import json
+import re
 import time
 import os
 from dotenv import load_dotenv
 
+import job_metrics
+import gemini_schema
+from gemini_cache import get_cache, cache_key, instruction_version
+from llm_backend import LazyModel
+from llm_replay import recorded, register_instruction
+from gemini_schema import (
+    URUN_SEMASI, TOPLU_SEMASI, VARYANT_SEMASI, EKSIK_SUTUN_SEMASI, CELISKI_SEMASI,
+    urun_yanitini_ayristir, toplu_yaniti_ayristir, eksik_sutun_yanitini_ayristir,
+)
+from rate_limiter import get_limiter, estimate_tokens
+
 # .env dosyasından environment variable'ları yükle
 load_dotenv()
 
@@ -13,13 +25,8 @@ load_dotenv()
 
 # ---------------- AYARLAR ----------------
 # API Key'i environment variable'dan al (güvenlik için)
+# Eksikse ilk Gemini çağrısında hata verilir (llm_backend.GeminiBackend); import sırasında değil
 API_KEY = os.getenv("GEMINI_API_KEY")  # Environment variable'dan alınır (.env dosyasından)
-if not API_KEY:
-    raise ValueError(
-        "GEMINI_API_KEY environment variable bulunamadı!\n"
-        "Lütfen .env dosyası oluşturun ve şu satırı ekleyin:\n"
-        "GEMINI_API_KEY=your_api_key_here"
-    )
 
 GIRIS_DOSYASI = "Copy of KLİMAAA.xlsx"      # Excel dosyanızın tam adı
 CIKIS_DOSYASI = "temizlenmis_katalog.xlsx"
@@ -118,20 +125,201 @@ def template_bul(kategori_adi):
     
     return None
 
-genai.configure(api_key=API_KEY)
-
 # Gemini Flash - GEMINI_MODEL env ile değiştirilebilir
+# model (JSON yanıt) / chat_model (serbest metin, temperature 0.1): backend ilk çağrıda kurulur
+# (LLM_BACKEND=gemini varsayılan, LLM_BACKEND=mock offline benchmark için; bkz. llm_backend.py)
 _model_name = os.getenv("GEMINI_MODEL", "gemini-flash-latest")
-model = genai.GenerativeModel(
-    model_name=_model_name,
-    generation_config={"response_mime_type": "application/json"}
-)
-chat_model = genai.GenerativeModel(
-    _model_name,
-    generation_config={"temperature": 0.1}
-)
+model = LazyModel("json")
+chat_model = LazyModel("chat")
+
+
+# ---------------- Ortak gövde: senkron ve asyncio kabukları ----------------
+# Gemini çağıran fonksiyonların mantığı (prompt, cache, retry kararı, ayrıştırma, metrikler) tek bir
+# generator'da yazılır; G/Ç adımlarını yield eder: ("acquire", limiter, token), ("generate", model,
+# içerik, ayarlar), ("sleep", saniye), ("hepsi", [alt generator'lar]). _calistir adımları bu thread'de,
+# _calistir_async event loop'ta (await) yürütür. Alt çağrılar "yield from" ile iç içe geçer; API
+# hatası adımın yield edildiği yere fırlatılır, retry mantığı generator'da yakalar.
+
+def _adim_calistir(adim):
+    tur, *args = adim
+    if tur == "acquire":
+        limiter, tahmin = args
+        return limiter.acquire(tahmin)
+    if tur == "generate":
+        gemini_model, icerik, ayarlar = args
+        return gemini_model.generate_content(icerik, **ayarlar)
+    if tur == "sleep":
+        time.sleep(args[0])
+        return None
+    if tur == "hepsi":
+        # Thread motorunda sırayla (paralellik batch'ler arasında)
+        return [_calistir(alt) for alt in args[0]]
+    raise ValueError(f"Bilinmeyen adım: {tur}")
+
+
+async def _adim_calistir_async(adim):
+    tur, *args = adim
+    if tur == "acquire":
+        limiter, tahmin = args
+        return await limiter.acquire_async(tahmin)
+    if tur == "generate":
+        gemini_model, icerik, ayarlar = args
+        return await gemini_model.generate_content_async(icerik, **ayarlar)
+    if tur == "sleep":
+        await asyncio.sleep(args[0])
+        return None
+    if tur == "hepsi":
+        return list(await asyncio.gather(*(_calistir_async(alt) for alt in args[0])))
+    raise ValueError(f"Bilinmeyen adım: {tur}")
+
+
+def _calistir(adimlar):
+    """Ortak gövdeyi (generator) bu thread'de sonuna kadar yürütür; dönüş değerini döner."""
+    try:
+        adim = next(adimlar)
+        while True:
+            try:
+                sonuc = _adim_calistir(adim)
+            except Exception as e:
+                adim = adimlar.throw(e)
+            else:
+                adim = adimlar.send(sonuc)
+    except StopIteration as bitis:
+        return bitis.value
+
+
+async def _calistir_async(adimlar):
+    """_calistir'ın asyncio sürümü: bekleme ve API çağrıları event loop'u bloklamaz."""
+    try:
+        adim = next(adimlar)
+        while True:
+            try:
+                sonuc = await _adim_calistir_async(adim)
+            except Exception as e:
+                adim = adimlar.throw(e)
+            else:
+                adim = adimlar.send(sonuc)
+    except StopIteration as bitis:
+        return bitis.value
+
+
+def _gemini_uret(gemini_model, prompt, sistem_talimati="", output_lang="tr", tur="", dogrula=None, sema=None):
+    """
+    Tüm Gemini çağrılarının geçtiği tek nokta: önce kalıcı cache'e bakar (gemini_cache), yoksa
+    cluster genelindeki token kovasından (rate_limiter) pay alıp API'yi çağırır.
+
+    Args:
+        gemini_model: model veya chat_model
+        prompt: Değişken kısım (ürün verisi / soru)
+        sistem_talimati: Sabit talimat; prompt'un önüne eklenir, cache anahtarına sürüm hash'i olarak girer
+        tur: Çağrı türü (urun_isle, celiski, ...) - cache anahtarı ve istatistik için
+        dogrula: dogrula(text) True dönerse yanıt cache'e yazılır; geçersiz yanıtlar cache'lenmez
+        sema: gemini_schema şeması; verilirse (ve GEMINI_SCHEMA=1 ise) response_schema ile istenir
+
+    Returns:
+        Yanıt metni
+    """
+    return _calistir(_gemini_adimlari(gemini_model, prompt, sistem_talimati, output_lang, tur, dogrula, sema))
+
+
+async def _gemini_uret_async(gemini_model, prompt, sistem_talimati="", output_lang="tr", tur="", dogrula=None, sema=None):
+    """_gemini_uret'in asyncio sürümü (generate_content_async); thread bloklamaz."""
+    return await _calistir_async(_gemini_adimlari(gemini_model, prompt, sistem_talimati, output_lang, tur, dogrula, sema))
 
 
+def _gemini_adimlari(gemini_model, prompt, sistem_talimati="", output_lang="tr", tur="", dogrula=None, sema=None,
+                     onbellek=True):
+    """
+    _gemini_uret gövdesi (ortak generator).
+    onbellek=False: yanıt bütün olarak cache'lenmez (toplu mod ürün başına kendisi cache'ler).
+    """
+    sistem_talimati, tur, ayarlar = _sema_ayarlari(sema, sistem_talimati, tur)
+    register_instruction(sistem_talimati)
+    cache, key, cached = _cache_oku(gemini_model, prompt, sistem_talimati, output_lang, tur) if onbellek else (None, None, None)
+    if cached is not None:
+        return cached
+
+    limiter = get_limiter()
+    tahmin = estimate_tokens(sistem_talimati + prompt)
+    if limiter is not None:
+        yield ("acquire", limiter, tahmin)
+    job_metrics.incr("api_calls")
+    baslangic = time.monotonic()
+    try:
+        response = yield ("generate", gemini_model, sistem_talimati + prompt, ayarlar)
+    except Exception as e:
+        job_metrics.incr("api_errors")
+        _kota_hatasi_bildir(limiter, e)
+        raise
+    finally:
+        job_metrics.incr("api_latency_s", time.monotonic() - baslangic)
+    if limiter is not None:
+        limiter.settle(tahmin, _kullanilan_token(response))
+    text = response.text
+
+    _cache_yaz(cache, key, text, tur, dogrula)
+    return text
+
+
+def _sema_ayarlari(sema, sistem_talimati, tur):
+    """
+    Şema modunda (sistem talimatı + şema notu, şema sürümlü tür, generate_content ayarları) döner.
+    Şema kapalıysa girdiler aynen döner; cache anahtarı şema değişince kendiliğinden değişir.
+    """
+    if sema is None or not gemini_schema.schema_enabled():
+        return sistem_talimati, tur, {}
+    sema_surumu = instruction_version(json.dumps(sema, sort_keys=True))
+    return (
+        sistem_talimati + gemini_schema.SEMA_NOTU,
+        f"{tur}:sema-{sema_surumu}",
+        {"generation_config": gemini_schema.generation_config(sema)},
+    )
+
+
+def _sema_modeli():
+    """Şema modunda serbest metin çağrıları da JSON modeliyle yapılır; kapalıysa chat_model."""
+    return model if gemini_schema.schema_enabled() else chat_model
+
+
+def _kullanilan_token(response):
+    """Yanıttaki gerçek toplam token sayısı (usage_metadata), yoksa None."""
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) if usage is not None else None
+
+
+def _kota_hatasi_bildir(limiter, hata):
+    """429/kota hatasında tüm worker'ları (paylaşılan kova üzerinden) bekleme süresi kadar durdur."""
+    wait_time = _rate_limit_bekleme(hata, 0)
+    if wait_time is None:
+        return
+    job_metrics.incr("rate_limit_429")
+    if limiter is not None:
+        limiter.block_for(min(wait_time, 60))
+
+
+def _cache_oku(gemini_model, prompt, sistem_talimati, output_lang, tur):
+    """(cache, key, cached_text) döner; cache kapalıysa (None, None, None)."""
+    cache = get_cache()
+    if cache is None:
+        return None, None, None
+    model_adi = getattr(gemini_model, "model_name", _model_name)
+    key = cache_key(prompt, model_adi, output_lang, f"{tur}:{instruction_version(sistem_talimati)}")
+    return cache, key, cache.get(key)
+
+
+def _cache_yaz(cache, key, text, tur, dogrula):
+    """Yanıt geçerliyse cache'e yazar."""
+    if cache is None:
+        return
+    try:
+        gecerli = dogrula(text) if dogrula else bool(text and text.strip())
+    except Exception:
+        gecerli = False
+    if gecerli:
+        cache.set(key, text, kind=tur)
+
+
+@recorded("ean_ara_internet", bos=lambda: None)
 def ean_ara_internet(marka: str, urun_adi: str, num_results: int = 8):
     """
     EAN/barkod bilgisini internet araması ile daha hedefli şekilde bulmaya çalışır.
@@ -280,6 +468,7 @@ def _ean13_checksum_ok(digits: str) -> bool:
     return check == int(digits[12])
 
 
+@recorded("urun_boyutu_ara_internet", bos=dict)
 def urun_boyutu_ara_internet(marka: str, urun_adi: str, num_results: int = 10):
     """
     Ürün boyutları (en x boy x yükseklik cm) ve ağırlık (kg) bilgisini internet araması ile bulmaya çalışır.
@@ -474,8 +663,7 @@ Cevap:"""
         print(f"  🤖 Gemini'ye soruluyor: '{urun_adi}' için '{eksik_sutun_basligi}'")
         
         # Hatalı araç tanımı (tools) kaldırıldı, doğrudan içerik üretiliyor
-        response = chat_model.generate_content(soru)
-        cevap = response.text.strip()
+        cevap = _gemini_uret(chat_model, soru, tur="eksik_sutun").strip()
         
         # "Bilinmiyor" kontrolü
         if "bilinmiyor" in cevap.lower() or "bilmiyorum" in cevap.lower() or not cevap or len(cevap) < 1:
@@ -490,6 +678,50 @@ Cevap:"""
         return None
 
 
+def _eksik_sutunlar_sorusu(urun_adi, eksik_sutunlar, marka=None, model_adi=None, output_lang="tr"):
+    """gemini_eksik_sutunlar_toplu_sor için soru metnini oluşturur."""
+    import re
+    lang_name = OUTPUT_LANG_NAMES.get((output_lang or "tr").lower(), "Türkçe")
+    soru_parts = [f"Ürün adı: {urun_adi}"]
+    if marka:
+        soru_parts.append(f"Marka: {marka}")
+    if model_adi:
+        soru_parts.append(f"Model: {model_adi}")
+    if not model_adi:
+        model_match = re.search(r'[A-Z0-9]{4,}[-]?[A-Z0-9]{0,}', str(urun_adi))
+        if model_match and len(model_match.group(0)) >= 4:
+            soru_parts.append(f"Model Kodu: {model_match.group(0)}")
+
+    sutun_listesi = "\n".join(f"- {s}" for s in eksik_sutunlar)
+    ean_notu = ""
+    if any("ean" in str(s).lower() or "barkod" in str(s).lower() for s in eksik_sutunlar):
+        ean_notu = "\n- EAN / BARKOD: EAN = ürünün barkodudur (13 rakam). Bu alanın doldurulması çok önemli; marka/model/ürün adından bilinen EAN-13 kodunu yaz."
+    return "\n".join(soru_parts) + f"""
+
+Aşağıdaki eksik özellikleri bu ürün için doldur. Her özellik için SADECE değeri ver (açıklama yok).
+
+Eksik özellikler:
+{sutun_listesi}
+
+KURALLAR:
+- Sadece JSON formatında cevap ver: {{"Özellik Adı": "değer", ...}}
+- Bilinmeyenler için "bilinmiyor" yaz veya o sütunu dahil etme
+- Birimler: W (güç), bar, kg, GB (depolama), inç (ekran) - bu formatlarda yaz
+- Tüm değerleri {lang_name} dilinde yaz.
+- Mümkün olduğunca çok sütunu doldur; ürün adı/model/marka bilgisinden çıkarabildiğini yaz.{ean_notu}
+
+Cevap:"""
+
+
+def _eksik_sutunlar_yanitini_ayristir(text, eksik_sutunlar):
+    """Toplu eksik sütun yanıtını {"Sütun Adı": "değer"} sözlüğüne çevirir (ortak ayrıştırıcı); onarılamazsa {}."""
+    try:
+        return eksik_sutun_yanitini_ayristir(text, eksik_sutunlar)
+    except ValueError as e:
+        print(f"  ⚠️ Eksik sütun yanıtı ayrıştırılamadı: {str(e)[:80]}", flush=True)
+        return {}
+
+
 def gemini_eksik_sutunlar_toplu_sor(urun_adi, eksik_sutunlar: list, marka=None, model_adi=None, output_lang="tr") -> dict:
     """
     Birden fazla eksik sütun için TEK API çağrısıyla tüm değerleri alır (performans).
@@ -503,63 +735,25 @@ def gemini_eksik_sutunlar_toplu_sor(urun_adi, eksik_sutunlar: list, marka=None,
     Returns:
         {"Sütun Adı": "değer", ...} - sadece bulunanlar
     """
-    if not eksik_sutunlar:
-        return {}
-    try:
-        import re
-        lang_name = OUTPUT_LANG_NAMES.get((output_lang or "tr").lower(), "Türkçe")
-        soru_parts = [f"Ürün adı: {urun_adi}"]
-        if marka:
-            soru_parts.append(f"Marka: {marka}")
-        if model_adi:
-            soru_parts.append(f"Model: {model_adi}")
-        if not model_adi:
-            model_match = re.search(r'[A-Z0-9]{4,}[-]?[A-Z0-9]{0,}', str(urun_adi))
-            if model_match and len(model_match.group(0)) >= 4:
-                soru_parts.append(f"Model Kodu: {model_match.group(0)}")
-
-        sutun_listesi = "\n".join(f"- {s}" for s in eksik_sutunlar)
-        ean_notu = ""
-        if any("ean" in str(s).lower() or "barkod" in str(s).lower() for s in eksik_sutunlar):
-            ean_notu = "\n- EAN / BARKOD: EAN = ürünün barkodudur (13 rakam). Bu alanın doldurulması çok önemli; marka/model/ürün adından bilinen EAN-13 kodunu yaz."
-        soru = "\n".join(soru_parts) + f"""
+    return _calistir(_eksik_sutunlar_adimlari(urun_adi, eksik_sutunlar, marka, model_adi, output_lang))
 
-Aşağıdaki eksik özellikleri bu ürün için doldur. Her özellik için SADECE değeri ver (açıklama yok).
 
-Eksik özellikler:
-{sutun_listesi}
+async def gemini_eksik_sutunlar_toplu_sor_async(urun_adi, eksik_sutunlar: list, marka=None, model_adi=None, output_lang="tr") -> dict:
+    """gemini_eksik_sutunlar_toplu_sor'un asyncio sürümü."""
+    return await _calistir_async(_eksik_sutunlar_adimlari(urun_adi, eksik_sutunlar, marka, model_adi, output_lang))
 
-KURALLAR:
-- Sadece JSON formatında cevap ver: {{"Özellik Adı": "değer", ...}}
-- Bilinmeyenler için "bilinmiyor" yaz veya o sütunu dahil etme
-- Birimler: W (güç), bar, kg, GB (depolama), inç (ekran) - bu formatlarda yaz
-- Tüm değerleri {lang_name} dilinde yaz.
-- Mümkün olduğunca çok sütunu doldur; ürün adı/model/marka bilgisinden çıkarabildiğini yaz.{ean_notu}
-
-Cevap:"""
 
+def _eksik_sutunlar_adimlari(urun_adi, eksik_sutunlar, marka, model_adi, output_lang):
+    """gemini_eksik_sutunlar_toplu_sor gövdesi (ortak generator)."""
+    if not eksik_sutunlar:
+        return {}
+    try:
+        soru = _eksik_sutunlar_sorusu(urun_adi, eksik_sutunlar, marka, model_adi, output_lang)
         print(f"  🤖 Gemini toplu soru: {len(eksik_sutunlar)} eksik sütun", flush=True)
-        response = chat_model.generate_content(soru)
-        text = response.text.strip()
-
-        # JSON parse (```json``` veya direkt JSON)
-        if "```" in text:
-            start = text.find("```") + 3
-            if "json" in text[:20].lower():
-                start = text.find("```json") + 7 if "```json" in text else start
-            end = text.find("```", start)
-            text = text[start:end] if end > start else text[start:].strip()
-        try:
-            sonuc = json.loads(text)
-            # Sadece eksik_sutunlar listesindekileri al, "bilinmiyor" olanları çıkar
-            cevap = {}
-            for sutun in eksik_sutunlar:
-                val = sonuc.get(sutun, "")
-                if val and isinstance(val, str) and "bilinmiyor" not in val.lower() and val.strip():
-                    cevap[sutun] = val.strip()
-            return cevap
-        except json.JSONDecodeError:
-            return {}
+        text = yield from _gemini_adimlari(
+            _sema_modeli(), soru, output_lang=output_lang, tur="eksik_sutunlar_toplu", sema=EKSIK_SUTUN_SEMASI,
+        )
+        return _eksik_sutunlar_yanitini_ayristir(text, eksik_sutunlar)
     except Exception as e:
         print(f"  ⚠️ Toplu soru hatası: {str(e)[:80]}", flush=True)
         return {}
@@ -613,36 +807,15 @@ Eğer çelişki çözülemiyorsa: {{"ozellik_adi": "", "dogru_deger": "", "kayna
         
         print(f"  🔍 Çelişki tespit edildi - Gemini'ye soruluyor...")
         
-        response = chat_model.generate_content(soru)
-        cevap_text = response.text.strip()
-        
-        # JSON parse et
+        cevap_text = _gemini_uret(_sema_modeli(), soru, tur="celiski", sema=CELISKI_SEMASI).strip()
+
+        # Ortak ayrıştırıcı (``` çitleri / bozuk JSON yerelde onarılır)
         try:
-            # JSON kısmını bul (```json``` veya direkt JSON)
-            if "```json" in cevap_text:
-                json_start = cevap_text.find("```json") + 7
-                json_end = cevap_text.find("```", json_start)
-                cevap_text = cevap_text[json_start:json_end].strip()
-            elif "```" in cevap_text:
-                json_start = cevap_text.find("```") + 3
-                json_end = cevap_text.find("```", json_start)
-                if json_end > json_start:
-                    cevap_text = cevap_text[json_start:json_end].strip()
-            
-            sonuc = json.loads(cevap_text)
-            ozellik_adi = sonuc.get("ozellik_adi", "").strip()
-            dogru_deger = sonuc.get("dogru_deger", "").strip()
-            kaynak = sonuc.get("kaynak", "").strip().lower()
-            
-            if ozellik_adi and dogru_deger and kaynak and kaynak != "cozulemedi":
-                print(f"  ✅ Çelişki çözüldü: {ozellik_adi} = '{dogru_deger}' (kaynak: {kaynak})")
-                return {
-                    "ozellik_adi": ozellik_adi,
-                    "dogru_deger": dogru_deger,
-                    "kaynak": kaynak
-                }
-        except (json.JSONDecodeError, KeyError) as e:
-            # JSON parse edilemedi veya eksik alan var
+            sonuc = gemini_schema.celiski_ciktisi(gemini_schema.json_yukle(cevap_text))
+            if sonuc and sonuc["kaynak"].lower() != "cozulemedi":
+                print(f"  ✅ Çelişki çözüldü: {sonuc['ozellik_adi']} = '{sonuc['dogru_deger']}' (kaynak: {sonuc['kaynak']})")
+                return sonuc
+        except ValueError as e:
             print(f"  ⚠️ JSON parse hatası: {str(e)[:100]}")
         
         print(f"  ❌ Çelişki çözülemedi")
@@ -797,6 +970,7 @@ GENEL ÇALIŞMA PRENSİBİ (TÜM KATEGORİLER İÇİN):
    - "eksik_sutun_degerleri"nde Excel sütun adıyla ver. Format: W, bar, kg, GB, inç kuralına uy
    - Dayanağı olmayan tahmin yapma; ama ürün bilgisi bir değere işaret ediyorsa (örn. model kodu, başlık) doldur
    - Hiçbir ipucu yoksa boş bırak
+   - Ürün için geçerli olduğu halde dolduramadığın sütunları "cozulemeyen_sutunlar" listesine yaz (sadece bunlar ayrıca araştırılır)
 
 12. **ÇELİŞKİ ÇÖZÜMÜ (uyari ile birlikte):**
    - Çelişki tespit ettiğinde sadece uyari verme; aynı yanıtta "celiski_cozum" ile doğru değeri belirt
@@ -817,13 +991,14 @@ GENEL ÇALIŞMA PRENSİBİ (TÜM KATEGORİLER İÇİN):
   },
   "uyari": "null veya çelişki/uyuşmazlık açıklaması",
   "eksik_sutun_degerleri": {"Sütun_Adı": "değer", ...} veya {} (_Eksik_Sutunlar yoksa boş),
-  "celiski_cozum": {"ozellik_adi": "...", "dogru_deger": "...", "kaynak": "baslik|ozellik"} veya null
+  "celiski_cozum": {"ozellik_adi": "...", "dogru_deger": "...", "kaynak": "baslik|ozellik"} veya null,
+  "cozulemeyen_sutunlar": ["bu ürün için geçerli ama dolduramadığın _Eksik_Sutunlar", ...] veya []
 }
 """
 
 # Kısa prompt: daha hızlı yanıt (varsayılan); GEMINI_FAST=0 ile tam prompt kullanılır
 system_instruction_compact = """Ürün katalog yöneticisi. (1) Sütun başlıklarına dokunma; sadece hücre değerlerini doldur, yapıyı bozma. (2) Başlıktan özellikleri çıkar, boş sütunlara yaz; dolu sütunlara dokunma. (3) Marka ve template'deki özellikleri başlıktan sil, model/kod kalsın. (4) Bu ürünün sütunlarında zaten dolu olan her bilgiyi başlıktan mutlaka sil. (5) Ürün Tipi: GENEL tut; Ürün Tipi=Kutu İçeriği, Renk (temel)=Renk (Üreticiye Göre) aynen kopyala. (6) Birimler: W, bar, kg, GB, inç formatında yaz. (7) Aralık/çoklu değerde tek değer seç. (8) _Eksik_Sutunlar: Mümkün olduğunca çok sütunu doldur; EAN/barkod sütunu varsa mutlaka doldurmaya çalış (EAN=ürün barkodu, 13 rakam). (9) Çelişki varsa celiski_cozum ekle.
-Çıktı JSON: {"temiz_baslik": "...", "duzenlenmis_ozellikler": {...}, "uyari": "...", "eksik_sutun_degerleri": {"Sütun_Adı": "değer"}, "celiski_cozum": {...} veya null}
+Çıktı JSON: {"temiz_baslik": "...", "duzenlenmis_ozellikler": {...}, "uyari": "...", "eksik_sutun_degerleri": {"Sütun_Adı": "değer"}, "celiski_cozum": {...} veya null, "cozulemeyen_sutunlar": ["Sütun_Adı", ...]}
 """
 
 # Çıktı dili eşlemesi (tr, en, de, it -> dil adı)
@@ -834,14 +1009,10 @@ def _get_system_instruction():
     return system_instruction_compact if os.getenv("GEMINI_FAST", "1") == "1" else system_instruction
 
 
-def urun_isle(row_dict, eksik_sutunlar=None, output_lang="tr", max_retries=3):
+def _urun_girdisi_hazirla(row_dict, eksik_sutunlar=None, output_lang="tr"):
     """
-    Ürün işleme: başlık temizleme, özellik çıkarma, eksik sütun doldurma ve çelişki çözümü TEK API çağrısında.
-    
-    Args:
-        row_dict: Ürün verisi (Excel satırı)
-        eksik_sutunlar: Boş Excel sütun adları listesi (örn. ["RAM Bellek Boyutu", "Renk (temel)"])
-        max_retries: API retry sayısı
+    Excel satırını Gemini'nin anlayacağı girdi sözlüğüne çevirir (teknik kod → anlaşılır isim,
+    kategori/template notları, eksik sütunlar ve çıktı dili).
     """
     # 1. Excel'deki Türkçe sütun isimlerini teknik kodlara çevir
     teknik_veri = {}
@@ -876,341 +1047,352 @@ def urun_isle(row_dict, eksik_sutunlar=None, output_lang="tr", max_retries=3):
     if eksik_sutunlar:
         anlasilir_veri['_Eksik_Sutunlar'] = eksik_sutunlar
         anlasilir_veri['_Eksik_Notu'] = "Bu sütunlar boş. Mümkün olduğunca çok sütunu doldur; ürün adı/model/marka bilgisinden çıkarabildiğini yaz. Dayanağı olmayan tahmin yapma."
+        anlasilir_veri['_Cozulemeyen_Notu'] = "Bu ürün için geçerli olan ama verilen bilgiden dolduramadığın sütunları 'cozulemeyen_sutunlar' listesine aynen yaz; ürüne uygulanamayan sütunları listeye koyma."
 
     # 3c. Çıktı dili
     lang_name = OUTPUT_LANG_NAMES.get((output_lang or "tr").lower(), "Türkçe")
     anlasilir_veri['_Cikti_Dili'] = lang_name
     anlasilir_veri['_Cikti_Dili_Notu'] = f"TÜM çıktıları ({lang_name}) dilinde ver: temiz_baslik, duzenlenmis_ozellikler, eksik_sutun_degerleri. Başlık, özellik değerleri, eksik sütun cevapları hep {lang_name} olmalı."
 
+    return anlasilir_veri
+
+
+_KOTA_HATASI = re.compile(r"\b429\b|resource[ _]?(has been )?exhausted", re.IGNORECASE)
+
+
+def _kota_hatasi_mi(hata):
+    """
+    Gerçek kota hatası mı: HTTP 429 / ResourceExhausted (istisna veya metni). "quota" / "rate" gibi
+    gevşek alt metinler sayılmaz ("generate_content ..." hatası tüm cluster'ı durdurmasın).
+    """
+    if not isinstance(hata, str):
+        if type(hata).__name__ == "ResourceExhausted" or getattr(hata, "code", None) == 429:
+            return True
+        hata = str(hata)
+    return bool(_KOTA_HATASI.search(hata))
+
+
+def _kota_beklemesi(wait_time):
+    """
+    Kota hatasından sonra yeniden denemeden önce bu thread'in kendi beklemesi. Limiter açıksa 0:
+    _kota_hatasi_bildir paylaşılan kovayı zaten durdurdu, yeniden deneme acquire'da bekler.
+    """
+    return 0.0 if get_limiter() is not None else wait_time
+
+
+def _rate_limit_bekleme(hata, attempt):
+    """
+    Hata (istisna veya metni) kota hatasıysa (_kota_hatasi_mi) beklenecek saniyeyi döner, değilse None.
+    Hata mesajındaki "retry in Ns" değeri varsa onu kullanır; yoksa (ör. mesajsız ResourceExhausted) 40, 50, 60 saniye.
+    """
+    if not _kota_hatasi_mi(hata):
+        return None
+    wait_match = re.search(r'retry in (\d+\.?\d*)s', str(hata), re.IGNORECASE)
+    if wait_match:
+        return float(wait_match.group(1)) + 2  # Biraz ekstra bekle
+    return 40 + (attempt * 10)  # Varsayılan: 40, 50, 60 saniye
+
+
+def _yanit_dolu_mu(data):
+    """Boş/eksik yanıt kontrolü: temiz_baslik veya duzenlenmis_ozellikler dolu olmalı."""
+    return isinstance(data, dict) and bool(data.get("temiz_baslik") or data.get("duzenlenmis_ozellikler"))
+
+
+def urun_isle(row_dict, eksik_sutunlar=None, output_lang="tr", max_retries=3):
+    """
+    Ürün işleme: başlık temizleme, özellik çıkarma, eksik sütun doldurma ve çelişki çözümü TEK API çağrısında.
+    
+    Args:
+        row_dict: Ürün verisi (Excel satırı)
+        eksik_sutunlar: Boş Excel sütun adları listesi (örn. ["RAM Bellek Boyutu", "Renk (temel)"])
+        max_retries: API retry sayısı
+    """
+    return _calistir(_urun_isle_adimlari(row_dict, eksik_sutunlar, output_lang, max_retries))
+
+
+async def urun_isle_async(row_dict, eksik_sutunlar=None, output_lang="tr", max_retries=3):
+    """urun_isle'nin asyncio sürümü (rate limit beklemesi event loop'u bloklamaz)."""
+    return await _calistir_async(_urun_isle_adimlari(row_dict, eksik_sutunlar, output_lang, max_retries))
+
+
+def _urun_isle_adimlari(row_dict, eksik_sutunlar=None, output_lang="tr", max_retries=3):
+    """urun_isle gövdesi (ortak generator)."""
+    anlasilir_veri = _urun_girdisi_hazirla(row_dict, eksik_sutunlar, output_lang)
+
     # 4. Prompt oluştur
     prompt = f"GİRDİ VERİSİ:\n{json.dumps(anlasilir_veri, ensure_ascii=False)}"
     
-    # 5. API İsteği - Retry mekanizması ile (ana thread'de; tam yanıt için)
+    # 5. API İsteği - Retry mekanizması ile
     sys_instr = _get_system_instruction()
     for attempt in range(max_retries):
         try:
-            response = model.generate_content(sys_instr + prompt)
-            data = json.loads(response.text)
-            # Boş/eksik yanıt kontrolü: temiz_baslik veya duzenlenmis_ozellikler dolu olmalı
-            if not data.get("temiz_baslik") and not data.get("duzenlenmis_ozellikler"):
+            text = yield from _gemini_adimlari(
+                model, prompt, sys_instr, output_lang, tur="urun_isle",
+                dogrula=gemini_schema.cache_dogrulayici(urun_yanitini_ayristir, _yanit_dolu_mu), sema=URUN_SEMASI,
+            )
+            data = urun_yanitini_ayristir(text)
+            if not _yanit_dolu_mu(data):
                 raise ValueError("Gemini boş yanıt döndü")
             return data
-        except (ValueError, json.JSONDecodeError) as e:
+        except ValueError as e:
             if attempt < max_retries - 1:
-                print(f"  ⏳ Boş/geçersiz yanıt, yeniden denenecek... ({attempt + 1}/{max_retries})", flush=True)
-                time.sleep(3)
+                print(f"  ⏳ Boş/onarılamayan yanıt, yeniden denenecek... ({attempt + 1}/{max_retries})", flush=True)
                 continue
             return {"uyari": "API boş yanıt döndü", "temiz_baslik": row_dict.get("Başlık", row_dict.get("TITLE__TR_TR", "")), "duzenlenmis_ozellikler": {}}
         except Exception as e:
             error_str = str(e)
             
             # Rate limit hatası kontrolü
-            if "429" in error_str or "quota" in error_str.lower() or "rate" in error_str.lower():
+            wait_time = _rate_limit_bekleme(e, attempt)
+            if wait_time is not None:
                 if attempt < max_retries - 1:
-                    # Hata mesajından bekleme süresini çıkarmaya çalış
-                    import re
-                    wait_match = re.search(r'retry in (\d+\.?\d*)s', error_str, re.IGNORECASE)
-                    if wait_match:
-                        wait_time = float(wait_match.group(1)) + 2  # Biraz ekstra bekle
-                    else:
-                        wait_time = 40 + (attempt * 10)  # Varsayılan: 40, 50, 60 saniye
-                    
-                    print(f"  ⏳ Rate limit hatası, {wait_time:.1f} saniye bekleniyor... (Deneme {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
+                    print(f"  ⏳ Rate limit hatası, {wait_time:.1f} saniye bekleniyor... (Deneme {attempt + 1}/{max_retries})", flush=True)
+                    yield ("sleep", _kota_beklemesi(wait_time))
                     continue
                 else:
-                    print(f"  ❌ Rate limit hatası devam ediyor, maksimum deneme sayısına ulaşıldı.")
+                    print(f"  ❌ Rate limit hatası devam ediyor, maksimum deneme sayısına ulaşıldı.", flush=True)
                     return {"uyari": f"Rate Limit Hatası: API kotası aşıldı", "temiz_baslik": row_dict.get('Başlık', row_dict.get('TITLE__TR_TR', 'HATA'))}
             else:
                 # Diğer hatalar
-                print(f"  ❌ Hata oluştu: {error_str[:100]}")
+                print(f"  ❌ Hata oluştu: {error_str[:100]}", flush=True)
                 return {"uyari": f"API Hatası: {error_str[:200]}", "temiz_baslik": row_dict.get('Başlık', row_dict.get('TITLE__TR_TR', 'HATA'))}
     
     # Tüm denemeler başarısız
     return {"uyari": "Tüm denemeler başarısız oldu", "temiz_baslik": row_dict.get('Başlık', row_dict.get('TITLE__TR_TR', 'HATA'))}
 
-def main():
-    print(f"📂 Excel okunuyor: {GIRIS_DOSYASI}")
-    print(f"📁 Çalışma dizini: {os.getcwd()}")
-    if not os.path.exists(GIRIS_DOSYASI):
-        print(f"❌ Dosya bulunamadı: {GIRIS_DOSYASI}")
-        print(f"📋 Klasördeki Excel dosyaları: {[f for f in os.listdir('.') if f.endswith('.xlsx')]}")
-        return
+
+# Toplu (batch) mod: N ürün tek istekte; sistem talimatı her ürün için değil, her batch için bir kez gönderilir
+BATCH_TALIMATI = """
+TOPLU MOD: GİRDİ VERİSİ bir JSON dizisidir; her eleman ayrı bir üründür ve "_id" alanı taşır.
+Her ürünü yukarıdaki kurallara göre BAĞIMSIZ olarak işle (ürünler arasında bilgi taşıma).
+Çıktıyı JSON DİZİSİ olarak ver; her ürün için yukarıdaki çıktı formatında bir nesne olsun ve girdideki "_id" değerini AYNEN "_id" alanına yaz.
+Örnek: [{"_id": "0", "temiz_baslik": "...", "duzenlenmis_ozellikler": {...}, "uyari": "...", "eksik_sutun_degerleri": {...}, "celiski_cozum": null}, ...]
+"""
+
+
+def _batch_boyutu(varsayilan=None):
+    """Batch başına ürün sayısı (GEMINI_BATCH_SIZE, varsayılan 1 = batch kapalı)."""
     try:
-        df = pd.read_excel(GIRIS_DOSYASI)
-        print(f"✅ Dosya okundu: {len(df)} satır bulundu")
-    except Exception as e:
-        print(f"❌ Dosya okunurken hata oluştu: {str(e)}")
-        return
-    
-    # İlk satır teknik kodlar içeriyorsa atla (gerçek veriler index 1'den başlıyor)
-    if len(df) > 0 and df.iloc[0].get('Başlık', '').startswith('TITLE'):
-        print("⚠️  İlk satır teknik kodlar içeriyor, atlanıyor...")
-        df = df.iloc[1:].reset_index(drop=True)
-    
-    # TEST İÇİN: Tüm satırları işle (limit yok)
-    # TEST_LIMIT = 5
-    # if len(df) > TEST_LIMIT:
-    #     print(f"🧪 TEST MODU: Sadece ilk {TEST_LIMIT} satır işlenecek (toplam {len(df)} satır var)")
-    #     df = df.head(TEST_LIMIT).copy()
-    # Eğer çıktı dosyası varsa, işlenmiş ürünleri yükle
-    islenmis_sku = set()
-    sonuclar = []
-    
+        deger = int(varsayilan if varsayilan else os.getenv("GEMINI_BATCH_SIZE", "1"))
+    except (TypeError, ValueError):
+        deger = 1
+    return max(1, min(deger, 50))
+
+
+def urun_isle_toplu(urunler, output_lang="tr", max_retries=3):
+    """
+    Birden fazla ürünü TEK API çağrısında işler (JSON dizi prompt → _id ile anahtarlı JSON dizi yanıt).
+
+    Args:
+        urunler: [(anahtar, row_dict, eksik_sutunlar), ...] - anahtar genelde satır index'i
+        output_lang: Gemini çıktı dili (tr, en, de, it)
+        max_retries: Batch isteği için retry sayısı
+
+    Returns:
+        {anahtar: gemini_cikti, ...} - her ürün için urun_isle ile aynı formatta çıktı.
+        Batch yanıtında eksik/boş gelen ürünler tek tek urun_isle ile yeniden sorulur
+        (asyncio sürümünde eşzamanlı). Cache ürün başınadır (girdiye göre, satır index'inden
+        bağımsız): istek sadece cache'te olmayan ürünlerle kurulur.
+    """
+    return _calistir(_urun_isle_toplu_adimlari(urunler, output_lang, max_retries))
+
+
+async def urun_isle_toplu_async(urunler, output_lang="tr", max_retries=3):
+    """urun_isle_toplu'nun asyncio sürümü; batch'ten eksik dönen ürünler eşzamanlı olarak tek tek sorulur."""
+    return await _calistir_async(_urun_isle_toplu_adimlari(urunler, output_lang, max_retries))
+
+
+def _toplu_cache_oku(veri, sys_instr, output_lang):
+    """
+    Toplu modda ürün başına cache: anahtar ürünün normalize girdisi (_id ve batch'teki yeri hariç),
+    böylece satır ekleme / batch boyutu değişse de önceki yanıtlar kullanılır. (cache, key, cikti) döner.
+    """
+    sistem_talimati, tur, _ = _sema_ayarlari(TOPLU_SEMASI, sys_instr, "urun_isle_toplu")
+    girdi = json.dumps(veri, ensure_ascii=False, default=str, sort_keys=True)
+    cache, key, cached = _cache_oku(model, girdi, sistem_talimati, output_lang, tur)
+    if cached is None:
+        return cache, key, None
     try:
-        if os.path.exists(CIKIS_DOSYASI):
-            df_mevcut = pd.read_excel(CIKIS_DOSYASI)
-            # Sadece geçerli SHOP_SKU'ya sahip satırları say
-            if 'SHOP_SKU' in df_mevcut.columns:
-                # Boş olmayan SKU'lara sahip satırları filtrele
-                gecerli_satirlar = df_mevcut[df_mevcut['SHOP_SKU'].notna() & (df_mevcut['SHOP_SKU'].astype(str).str.strip() != '')]
-                islenmis_sku = set(gecerli_satirlar['SHOP_SKU'].astype(str))
-                sonuclar = gecerli_satirlar.to_dict('records')
-                islenmis_sayisi = len(gecerli_satirlar)
-            else:
-                # SHOP_SKU sütunu yoksa, tüm satırları kullan ama uyarı ver
-                print("⚠️  UYARI: Çıktı dosyasında 'SHOP_SKU' sütunu bulunamadı!")
-                islenmis_sku = set()
-                sonuclar = []
-                islenmis_sayisi = 0
-            
-            print(f"✅ Mevcut dosya bulundu: {islenmis_sayisi} ürün zaten işlenmiş.")
-            kalan = len(df) - islenmis_sayisi
-            print(f"🔄 Kalan {kalan} ürün işlenecek...")
-    except Exception as e:
-        print(f"ℹ️  Yeni dosya oluşturulacak: {str(e)}")
-    
-    print("🚀 İşlem başlıyor...")
-    
-    # Sadece işlenmemiş satırları işle
-    islenen_sayisi = 0
-    for index, row in df.iterrows():
-        row_dict = row.to_dict()
-        sku = str(row_dict.get('SHOP_SKU', ''))
-        
-        # Eğer bu ürün zaten işlenmişse atla
-        if sku in islenmis_sku:
-            continue
-        
-        # İlerleme göster
-        islenen_sayisi += 1
-        if islenen_sayisi % 1 == 0:
-            print(f"İşleniyor: {islenen_sayisi}/{len(df) - len(sonuclar)} (Toplam: {index + 1}/{len(df)})")
-        
+        cikti = json.loads(cached)
+    except ValueError:
+        return cache, key, None
+    return cache, key, cikti if _yanit_dolu_mu(cikti) else None
+
+
+def _urun_isle_toplu_adimlari(urunler, output_lang="tr", max_retries=3):
+    """urun_isle_toplu gövdesi (ortak generator)."""
+    if not urunler:
+        return {}
+    if len(urunler) == 1:
+        anahtar, row_dict, eksik = urunler[0]
+        return {anahtar: (yield from _urun_isle_adimlari(row_dict, eksik or None, output_lang))}
+
+    # Cache'te olan ürünler ayrılır; istek sadece kalanlarla kurulur
+    sys_instr = _get_system_instruction() + BATCH_TALIMATI
+    sonuclar = {}
+    sorulacak = []
+    for anahtar, row_dict, eksik in urunler:
+        veri = _urun_girdisi_hazirla(row_dict, eksik or None, output_lang)
+        cache, key, cikti = _toplu_cache_oku(veri, sys_instr, output_lang)
+        if cikti is not None:
+            sonuclar[anahtar] = cikti
+        else:
+            sorulacak.append((anahtar, row_dict, eksik, veri, cache, key))
+    if not sorulacak:
+        return {anahtar: sonuclar[anahtar] for anahtar, _, _ in urunler}
+    if len(sorulacak) == 1:
+        anahtar, row_dict, eksik = sorulacak[0][:3]
+        sonuclar[anahtar] = yield from _urun_isle_adimlari(row_dict, eksik or None, output_lang)
+        return {anahtar: sonuclar[anahtar] for anahtar, _, _ in urunler}
+
+    # _id: batch içindeki sıra (satır index'i değil) - aynı ürünler aynı prompt'u üretir
+    girdiler = [{"_id": str(i), **veri} for i, (_, _, _, veri, _, _) in enumerate(sorulacak)]
+    prompt = f"GİRDİ VERİSİ:\n{json.dumps(girdiler, ensure_ascii=False, default=str)}"
+
+    toplu_cikti = {}
+    cachelenebilir = False
+    for attempt in range(max_retries):
         try:
-            # Eksik sütunları hesapla (urun_isle tek çağrıda dolduracak)
-            atlanacak_sutunlar = {'Başlık', 'SHOP_SKU', 'Uyari', 'Kategori'}
-            eksik_sutunlar = []
-            if os.getenv("GEMINI_EKSIK_SUTUN", "1") == "1":
-                for sutun_adi in row_dict.keys():
-                    if sutun_adi in atlanacak_sutunlar:
-                        continue
-                    mevcut = row_dict.get(sutun_adi, None)
-                    if pd.notna(mevcut) and (not isinstance(mevcut, str) or str(mevcut).strip() != ''):
-                        continue
-                    eksik_sutunlar.append(sutun_adi)
-
-            # Kategori bilgisini ekle (varsa)
-            row_for_api = row_dict.copy()
-            if 'Kategori' in row_dict:
-                kategori = row_dict.get('Kategori', '')
-                if pd.notna(kategori) and kategori:
-                    row_for_api['_Kategori_Bilgisi'] = str(kategori)
-            gemini_cikti = urun_isle(row_for_api, eksik_sutunlar=eksik_sutunlar if eksik_sutunlar else None)
-            
-            # Orijinal Excel yapısını koru, sadece güncellemeler yap
-            # Orijinal satırı kopyala
-            flat_result = row_dict.copy()
-            
-            # Başlığı güncelle
-            flat_result['Başlık'] = gemini_cikti.get("temiz_baslik", row_dict.get('Başlık', ''))
-            
-            # Özellikleri güncelle (sadece boş olanları veya işlemci)
-            ozellikler = gemini_cikti.get("duzenlenmis_ozellikler", {})
-            
-            # İşlemci her zaman güncellenir
-            if "Islemci" in ozellikler:
-                flat_result['İşlemci (tr_TR)'] = ozellikler.get("Islemci", row_dict.get('İşlemci (tr_TR)', ''))
-            
-            # Diğer özellikler sadece boşsa doldurulur
-            if "Renk" in ozellikler and pd.isna(row_dict.get('Renk (temel)', None)):
-                flat_result['Renk (temel)'] = ozellikler.get("Renk", '')
-            
-            if "Isletim_Sistemi" in ozellikler and pd.isna(row_dict.get('İşletim Sistemi', None)):
-                isletim_sistemi = ozellikler.get("Isletim_Sistemi", '')
-                # Full HD ifadelerini FHD'ye çevir
-                if isletim_sistemi:
-                    isletim_sistemi = isletim_sistemi.replace("Full HD", "FHD").replace("FullHD", "FHD").replace("Full High Definition", "FHD")
-                flat_result['İşletim Sistemi'] = isletim_sistemi
-            
-            if "RAM" in ozellikler and pd.isna(row_dict.get('RAM Bellek Boyutu', None)):
-                flat_result['RAM Bellek Boyutu'] = ozellikler.get("RAM", '')
-            
-            if "Disk" in ozellikler and pd.isna(row_dict.get('Sabit disk kapasitesi', None)):
-                flat_result['Sabit disk kapasitesi'] = ozellikler.get("Disk", '')
-            
-            if "Ekran" in ozellikler and pd.isna(row_dict.get('Ekran Boyutu (inç)', None)):
-                flat_result['Ekran Boyutu (inç)'] = ozellikler.get("Ekran", '')
-            
-            if "Grafik_Karti" in ozellikler and pd.isna(row_dict.get('Grafik Kartı', None)):
-                grafik_karti = ozellikler.get("Grafik_Karti", '')
-                # Full HD ifadelerini FHD'ye çevir
-                if grafik_karti:
-                    grafik_karti = grafik_karti.replace("Full HD", "FHD").replace("FullHD", "FHD").replace("Full High Definition", "FHD")
-                flat_result['Grafik Kartı'] = grafik_karti
-            
-            # KETTLE/SU ISITICISI için özel sütunlar (aralık/çoklu değer varsa güncelle)
-            if "Kapasite" in ozellikler:
-                # Boşsa doldur, doluysa ama aralık/çoklu değer içeriyorsa güncelle
-                mevcut_kapasite = str(row_dict.get('Hacimsel kapasite', '')).strip()
-                if pd.isna(row_dict.get('Hacimsel kapasite', None)) or not mevcut_kapasite:
-                    flat_result['Hacimsel kapasite'] = ozellikler.get("Kapasite", '')
-                elif '-' in mevcut_kapasite or '/' in mevcut_kapasite:  # Aralık/çoklu değer varsa güncelle
-                    flat_result['Hacimsel kapasite'] = ozellikler.get("Kapasite", mevcut_kapasite)
-            
-            if "Guc" in ozellikler or "Güç" in ozellikler:
-                guc = ozellikler.get("Guc", ozellikler.get("Güç", ''))
-                if guc:
-                    mevcut_guc = str(row_dict.get('Maksimum güç', '')).strip()
-                    if pd.isna(row_dict.get('Maksimum güç', None)) or not mevcut_guc:
-                        flat_result['Maksimum güç'] = guc
-                    elif 've altı' in mevcut_guc.lower() or 've üstü' in mevcut_guc.lower() or '-' in mevcut_guc or '/' in mevcut_guc:  # Aralık/çoklu değer varsa güncelle
-                        flat_result['Maksimum güç'] = guc
-            
-            if "Frekans" in ozellikler:
-                mevcut_frekans = str(row_dict.get('Frekans', '')).strip()
-                if pd.isna(row_dict.get('Frekans', None)) or not mevcut_frekans:
-                    flat_result['Frekans'] = ozellikler.get("Frekans", '')
-                elif '/' in mevcut_frekans:  # Çoklu değer varsa güncelle
-                    flat_result['Frekans'] = ozellikler.get("Frekans", mevcut_frekans)
-            
-            if "Voltaj" in ozellikler:
-                mevcut_voltaj = str(row_dict.get('Giriş Voltajı', '')).strip()
-                if pd.isna(row_dict.get('Giriş Voltajı', None)) or not mevcut_voltaj:
-                    flat_result['Giriş Voltajı'] = ozellikler.get("Voltaj", '')
-                elif '-' in mevcut_voltaj:  # Aralık varsa güncelle
-                    flat_result['Giriş Voltajı'] = ozellikler.get("Voltaj", mevcut_voltaj)
-            
-            # Ürün Tipi: Her zaman oluştur (sütun yoksa veya boşsa)
-            # Önce Gemini'den gelen değeri kontrol et
-            if "Urun_Tipi" in ozellikler:
-                flat_result['Ürün Tipi (tr_TR)'] = ozellikler.get("Urun_Tipi", '')
-            # Eğer Gemini'den gelmediyse ve sütun boşsa, kategoriye göre belirle
-            elif pd.isna(row_dict.get('Ürün Tipi (tr_TR)', None)) or str(row_dict.get('Ürün Tipi (tr_TR)', '')).strip() == '':
-                kategori = str(row_dict.get('Kategori', '')).upper()
-                baslik = str(row_dict.get('Başlık', '')).lower()
-                
-                if "KETTLE" in kategori or "SU ISITICISI" in kategori:
-                    flat_result['Ürün Tipi (tr_TR)'] = "Su Isıtıcısı"
-                elif "LAPTOP" in kategori or "DIZUSTU" in kategori or "BILGISAYAR" in kategori:
-                    if "gaming" in baslik:
-                        flat_result['Ürün Tipi (tr_TR)'] = "Gaming Laptop"
-                    else:
-                        flat_result['Ürün Tipi (tr_TR)'] = "Laptop"
-                else:
-                    # Diğer kategoriler için kategorinin kendisini kullan (genel isim)
-                    kategori_adi = str(row_dict.get('Kategori', '')).strip()
-                    if kategori_adi and kategori_adi != 'CATEGORY':
-                        flat_result['Ürün Tipi (tr_TR)'] = kategori_adi
-                    else:
-                        flat_result['Ürün Tipi (tr_TR)'] = "Diğer"
-            
-            # Uyarı sütunu ekle - çelişki çözümü urun_isle tek çağrıda döndürüyor (celiski_cozum)
-            yeni_uyari = gemini_cikti.get("uyari", '')
-            celiski_cozum = gemini_cikti.get("celiski_cozum")
-            if celiski_cozum and isinstance(celiski_cozum, dict):
-                ozellik_adi = celiski_cozum.get("ozellik_adi", "")
-                dogru_deger = celiski_cozum.get("dogru_deger", "")
-                kaynak = celiski_cozum.get("kaynak", "")
-                ters_harita = {
-                    "Isletim_Sistemi": "İşletim Sistemi",
-                    "Renk_Temel": "Renk (temel)",
-                    "Renk_Uretici": "Renk (Üreticiye Göre) (tr_TR)",
-                    "RAM_Boyutu": "RAM Bellek Boyutu",
-                    "Disk_Kapasitesi": "Sabit disk kapasitesi",
-                    "Ekran_Boyutu_Inc": "Ekran Boyutu (inç)",
-                    "Grafik_Karti": "Grafik Kartı",
-                    "Islemci_Modeli": "İşlemci (tr_TR)",
-                    "Urun_Tipi": "Ürün Tipi (tr_TR)"
-                }
-                excel_sutun_ismi = ters_harita.get(ozellik_adi)
-                if excel_sutun_ismi and excel_sutun_ismi in flat_result and dogru_deger:
-                    flat_result[excel_sutun_ismi] = dogru_deger
-                    print(f"  ✅ {excel_sutun_ismi} güncellendi: '{dogru_deger}'")
-                    yeni_uyari = f"Çözüldü: {ozellik_adi} = {dogru_deger} (kaynak: {kaynak})"
-
-            # Uyarıyı ekle
-            if 'Uyari' not in flat_result:
-                flat_result['Uyari'] = yeni_uyari if yeni_uyari and yeni_uyari != 'null' else ''
-            else:
-                mevcut_uyari = flat_result.get('Uyari', '')
-                if pd.notna(yeni_uyari) and yeni_uyari and yeni_uyari != 'null':
-                    flat_result['Uyari'] = f"{mevcut_uyari}; {yeni_uyari}" if mevcut_uyari else yeni_uyari
-
-            # Eksik sütun değerleri - urun_isle tek çağrıda doldurdu (eksik_sutun_degerleri)
-            eksik_degerler = gemini_cikti.get("eksik_sutun_degerleri") or {}
-            if isinstance(eksik_degerler, dict):
-                for sutun_adi, bulunan_deger in eksik_degerler.items():
-                    if sutun_adi in flat_result and bulunan_deger and (not isinstance(bulunan_deger, str) or "bilinmiyor" not in str(bulunan_deger).lower()):
-                        flat_result[sutun_adi] = str(bulunan_deger).strip() if isinstance(bulunan_deger, str) else bulunan_deger
-                        print(f"  ✅ {sutun_adi} Gemini'den bulundu: {bulunan_deger}")
-            
-            sonuclar.append(flat_result)
-            
-            # Her 5 üründe bir ara kayıt yap (güvenlik için)
-            if len(sonuclar) % 5 == 0:
-                df_ara = pd.DataFrame(sonuclar)
-                orijinal_sutunlar = list(df.columns)
-                if 'Uyari' not in orijinal_sutunlar:
-                    orijinal_sutunlar.append('Uyari')
-                df_ara = df_ara.reindex(columns=orijinal_sutunlar)
-                df_ara.to_excel(CIKIS_DOSYASI, index=False)
-                print(f"  💾 Ara kayıt yapıldı: {len(sonuclar)} ürün kaydedildi")
-            
-        except KeyboardInterrupt:
-            print("\n⚠️  İşlem kullanıcı tarafından durduruldu!")
-            df_ara = pd.DataFrame(sonuclar)
-            orijinal_sutunlar = list(df.columns)
-            if 'Uyari' not in orijinal_sutunlar:
-                orijinal_sutunlar.append('Uyari')
-            df_ara = df_ara.reindex(columns=orijinal_sutunlar)
-            df_ara.to_excel(CIKIS_DOSYASI, index=False)
-            print(f"💾 Mevcut ilerleme kaydedildi: {len(sonuclar)} ürün")
-            return
+            text = yield from _gemini_adimlari(
+                model, prompt, sys_instr, output_lang, tur="urun_isle_toplu", sema=TOPLU_SEMASI, onbellek=False,
+            )
+            # Kesik (onarım gerektiren) yanıttaki ürünler cache'e yazılmaz
+            cachelenebilir = gemini_schema.cache_dogrulayici(toplu_yaniti_ayristir)(text)
+            toplu_cikti = toplu_yaniti_ayristir(text)
+            if not toplu_cikti:
+                raise ValueError("Gemini boş batch yanıtı döndü")
+            break
+        except ValueError:
+            if attempt < max_retries - 1:
+                print(f"  ⏳ Boş/onarılamayan batch yanıtı, yeniden denenecek... ({attempt + 1}/{max_retries})", flush=True)
+                continue
         except Exception as e:
-            print(f"  ❌ Hata: {str(e)[:100]}")
-            # Hata olsa bile sonucu ekle (uyarı ile)
-            flat_result = {
-                "Orijinal_Baslik": row_dict.get('Başlık', row_dict.get('TITLE__TR_TR', '')),
-                "SHOP_SKU": sku,
-                "Temiz_Baslik": row_dict.get('Başlık', row_dict.get('TITLE__TR_TR', '')),
-                "Uyari": f"İşleme hatası: {str(e)[:200]}",
-            }
-            sonuclar.append(flat_result)
-        
-        # Rate limit için bekleme (GEMINI_DELAY ile ayarlanabilir, varsayılan 0.5s)
-        time.sleep(float(os.getenv("GEMINI_DELAY", "0.5")))
-    
-    # Final kayıt - Sadece işlenmiş ürünleri kaydet, orijinal Excel yapısını koru
-    if len(sonuclar) > 0:
-        df_sonuc = pd.DataFrame(sonuclar)
-        
-        # Orijinal sütun sırasını koru
-        orijinal_sutunlar = list(df.columns)
-        # Uyarı sütunu yoksa ekle
-        if 'Uyari' not in orijinal_sutunlar:
-            orijinal_sutunlar.append('Uyari')
-        
-        # Sadece mevcut sütunları al (eksik sütunlar için boş değer)
-        df_sonuc = df_sonuc.reindex(columns=orijinal_sutunlar)
-        
-        # Sadece işlenmiş ürünleri kaydet (tüm orijinal sütunları koru)
-        df_sonuc.to_excel(CIKIS_DOSYASI, index=False)
-        print(f"\n✅ Bitti! Toplam {len(sonuclar)} ürün işlendi. Dosya: '{CIKIS_DOSYASI}'")
-        print(f"📋 Orijinal Excel yapısı korundu: {len(orijinal_sutunlar)} sütun")
-        print(f"📊 Çıktı dosyasında sadece işlenmiş {len(sonuclar)} ürün var.")
-    else:
-        print("\n⚠️  İşlenecek yeni ürün bulunamadı!")
+            error_str = str(e)
+            wait_time = _rate_limit_bekleme(e, attempt)
+            if wait_time is not None and attempt < max_retries - 1:
+                print(f"  ⏳ Rate limit hatası (batch), {wait_time:.1f} saniye bekleniyor... (Deneme {attempt + 1}/{max_retries})", flush=True)
+                yield ("sleep", _kota_beklemesi(wait_time))
+                continue
+            print(f"  ❌ Batch hatası, ürünler tek tek işlenecek: {error_str[:100]}", flush=True)
+            break
+
+    # Kısmi hataları tek tek ürünlere böl: yanıtta olmayan veya boş gelenler ayrıca sorulur
+    tekrar = []
+    for i, (anahtar, row_dict, eksik, _, cache, key) in enumerate(sorulacak):
+        cikti = toplu_cikti.get(str(i))
+        if _yanit_dolu_mu(cikti):
+            sonuclar[anahtar] = cikti
+            if cache is not None and cachelenebilir:
+                cache.set(key, json.dumps(cikti, ensure_ascii=False, default=str), kind="urun_isle_toplu")
+        else:
+            tekrar.append((anahtar, row_dict, eksik))
+    if tekrar:
+        tekil = yield ("hepsi", [_urun_isle_adimlari(row_dict, eksik or None, output_lang) for _, row_dict, eksik in tekrar])
+        for (anahtar, _, _), cikti in zip(tekrar, tekil):
+            sonuclar[anahtar] = cikti
+        print(f"  ↩️ Batch: {len(sorulacak) - len(tekrar)}/{len(sorulacak)} ürün tek çağrıda, {len(tekrar)} ürün tek tek işlendi", flush=True)
+    return {anahtar: sonuclar[anahtar] for anahtar, _, _ in urunler}
+
+
+# Varyant modu: aynı modelin (marka + model kodu) varyantları için temsilci ürünün sonucu paylaşılır,
+# sadece farklı olan alanlar (başlık + farklı sütunlar) tek istekte tüm varyantlar için sorulur
+VARYANT_TALIMATI = """
+Sen bir e-ticaret katalog editörüsün. Aynı modelin (aynı marka + model kodu) varyantları veriliyor.
+"temsilci" ürün zaten işlendi: orijinal başlığı, temiz başlığı ve sütun değerleri aşağıda.
+Her varyant için SADECE farklı olan alanları değerlendir:
+- temiz_baslik: temsilcinin temiz başlığını bu varyantın orijinal başlığına göre uyarla (ör. renk, kapasite farkı). Aynı biçimi koru.
+- duzenlenmis_ozellikler: yalnızca varyantın "_Farkli_Sutunlar" listesindeki sütunlar için bu varyantın doğru değeri (anahtar = sütun adı aynen).
+  Varyantın kendi verisinde değer varsa onu temsilcinin biçimine getir; yoksa başlıktan çıkar; dayanak yoksa sütunu yazma.
+- uyari: yalnızca bu varyantın kendi verisindeki bir sorun için kısa uyarı (ör. başlık ile sütun çelişkisi); yoksa boş bırak.
+Her varyant için girdideki "_id" değerini AYNEN "_id" alanına yaz.
+SADECE JSON dizisi döndür: [{"_id": "...", "temiz_baslik": "...", "duzenlenmis_ozellikler": {"Sütun": "değer"}, "uyari": ""}]
+"""
+
+
+def _varyant_sorusu(temsilci_row, temsilci_sonuc, kardesler, output_lang="tr"):
+    """Temsilci sonucu + varyantların farklı alanları → prompt metni."""
+    temsilci = {
+        "orijinal_baslik": temsilci_row.get("Başlık", ""),
+        "temiz_baslik": temsilci_sonuc.get("Başlık", ""),
+        "degerler": {
+            k: v for k, v in temsilci_sonuc.items()
+            if k not in ("Başlık", "Warning") and pd.notna(v) and str(v).strip() != ""
+        },
+    }
+    varyantlar = []
+    for anahtar, row_dict, farkli_sutunlar in kardesler:
+        varyantlar.append({
+            "_id": str(anahtar),
+            "Başlık": row_dict.get("Başlık", ""),
+            "_Farkli_Sutunlar": farkli_sutunlar,
+            "_Varyant_Degerleri": {
+                s: row_dict.get(s) for s in farkli_sutunlar
+                if pd.notna(row_dict.get(s)) and str(row_dict.get(s)).strip() != ""
+            },
+        })
+    lang_name = OUTPUT_LANG_NAMES.get((output_lang or "tr").lower(), "Türkçe")
+    veri = {"temsilci": temsilci, "varyantlar": varyantlar, "_Cikti_Dili": lang_name}
+    return f"GİRDİ VERİSİ:\n{json.dumps(veri, ensure_ascii=False, default=str)}"
+
+
+def varyant_farklarini_sor(temsilci_row, temsilci_sonuc, kardesler, output_lang="tr", max_retries=3):
+    """
+    Varyantlar için sadece farklı olan alanları TEK API çağrısında sorar.
+
+    Args:
+        temsilci_row: Temsilci ürünün orijinal satırı
+        temsilci_sonuc: Temsilci ürünün işlenmiş satırı (flat_result)
+        kardesler: [(anahtar, row_dict, farkli_sutunlar), ...]
+
+    Returns:
+        {anahtar: {"temiz_baslik": ..., "duzenlenmis_ozellikler": {...}}, ...}
+        Yanıtta olmayan varyantlar dönmez (çağıran normal işleme düşer).
+    """
+    return _calistir(_varyant_adimlari(temsilci_row, temsilci_sonuc, kardesler, output_lang, max_retries))
+
+
+async def varyant_farklarini_sor_async(temsilci_row, temsilci_sonuc, kardesler, output_lang="tr", max_retries=3):
+    """varyant_farklarini_sor'un asyncio sürümü."""
+    return await _calistir_async(_varyant_adimlari(temsilci_row, temsilci_sonuc, kardesler, output_lang, max_retries))
+
+
+def _varyant_adimlari(temsilci_row, temsilci_sonuc, kardesler, output_lang="tr", max_retries=3):
+    """varyant_farklarini_sor gövdesi (ortak generator)."""
+    if not kardesler:
+        return {}
+    prompt = _varyant_sorusu(temsilci_row, temsilci_sonuc, kardesler, output_lang)
+    for attempt in range(max_retries):
+        try:
+            text = yield from _gemini_adimlari(
+                model, prompt, VARYANT_TALIMATI, output_lang, tur="varyant",
+                dogrula=gemini_schema.cache_dogrulayici(toplu_yaniti_ayristir), sema=VARYANT_SEMASI,
+            )
+            cikti = toplu_yaniti_ayristir(text)
+            if not cikti:
+                raise ValueError("Gemini boş varyant yanıtı döndü")
+            return {a: cikti[str(a)] for a, _, _ in kardesler if isinstance(cikti.get(str(a)), dict)}
+        except ValueError:
+            if attempt < max_retries - 1:
+                continue
+        except Exception as e:
+            error_str = str(e)
+            wait_time = _rate_limit_bekleme(e, attempt)
+            if wait_time is not None and attempt < max_retries - 1:
+                print(f"  ⏳ Rate limit hatası (varyant), {wait_time:.1f} saniye bekleniyor... (Deneme {attempt + 1}/{max_retries})", flush=True)
+                yield ("sleep", _kota_beklemesi(wait_time))
+                continue
+            print(f"  ❌ Varyant hatası, varyantlar tek tek işlenecek: {error_str[:100]}", flush=True)
+            break
+    return {}
+
+
+def main():
+    """
+    Yerel çalıştırma: GIRIS_DOSYASI → CIKIS_DOSYASI. Servisle aynı motor, checkpoint ve cache
+    (cli.clean_file; komut satırından: python -m cli clean girdi.xlsx cikti.xlsx --workers N --batch M).
+    """
+    from cli import clean_file
+    clean_file(GIRIS_DOSYASI, CIKIS_DOSYASI)
 
 if __name__ == "__main__":
     main()
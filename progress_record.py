@@ -0,0 +1,103 @@
+"""
+Tiny progress record for the local runner (cli.py / main.py) and dashboard.py.
+
+cli.clean_file çalışırken (en fazla yarım saniyede bir) <çıktı>.progress.json dosyasına küçük bir
+kayıt yazar: sayaçlar, son N başlık, verim (ürün/sn) ve tahmini kalan süre. dashboard.py
+/api/progress'te sadece bu dosyayı okur (sabit boyut); giriş / çıkış Excel'lerini yeniden ayrıştırmaz.
+
+Kayıt atomik yazılır (geçici dosya + replace); okuyan yarım JSON görmez.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+# Yazımlar arası en kısa süre (sn); bitiş / durdurma her zaman yazılır
+_MIN_INTERVAL = 0.5
+
+RUNNING = "running"
+COMPLETE = "complete"
+STOPPED = "stopped"
+
+
+def progress_path(output_file: str) -> Path:
+    return Path(str(output_file) + ".progress.json")
+
+
+class ProgressRecord:
+    """Çalışan işin ilerleme kaydı; update() sayaçlar değiştikçe çağrılır."""
+
+    def __init__(self, path: Path, input_file: str, total: int, processed: int = 0, last_n: int = 5) -> None:
+        self.path = Path(path)
+        self.input_file = str(input_file)
+        self.total = int(total)
+        self.processed = int(processed)
+        self.failed = 0
+        self.session = 0
+        self.state = RUNNING
+        self.started = time.time()
+        self._initial = int(processed)
+        self._last: Deque[Dict[str, Any]] = deque(maxlen=last_n)
+        self._written = 0.0
+        self.write()
+
+    def update(self, processed: int, failed: int = 0, last_products: Optional[List[Dict[str, Any]]] = None) -> None:
+        """Sayaçları güncelle (bu çalışmada işlenenler = processed - başlangıçtaki)."""
+        self.processed = int(processed)
+        self.failed = int(failed)
+        self.session = max(0, self.processed - self._initial)
+        if last_products is not None:
+            self._last.clear()
+            self._last.extend(last_products)
+        if time.time() - self._written >= _MIN_INTERVAL or self.processed >= self.total:
+            self.write()
+
+    def finish(self, state: str = COMPLETE) -> None:
+        self.state = state
+        self.write()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        elapsed = now - self.started
+        rate = self.session / elapsed if elapsed > 0 and self.session else 0.0
+        remaining = max(0, self.total - self.processed)
+        try:
+            input_mtime = os.path.getmtime(self.input_file)
+        except OSError:
+            input_mtime = None
+        return {
+            "input": os.path.abspath(self.input_file),
+            "input_mtime": input_mtime,
+            "state": self.state,
+            "pid": os.getpid(),
+            "total": self.total,
+            "processed": self.processed,
+            "failed": self.failed,
+            "session_processed": self.session,
+            "rows_per_s": round(rate, 3),
+            "eta_s": round(remaining / rate) if rate else None,
+            "started": self.started,
+            "updated": now,
+            "last_products": list(self._last),
+        }
+
+    def write(self) -> None:
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, default=str)
+        tmp.replace(self.path)
+        self._written = time.time()
+
+
+def read(path: Path) -> Optional[Dict[str, Any]]:
+    """Kaydı oku; yoksa / okunamazsa None."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else None
+    except (OSError, ValueError):
+        return None
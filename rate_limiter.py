@@ -0,0 +1,257 @@
+"""
+Cluster-wide token-bucket rate limiter for Gemini calls.
+
+Two buckets are consumed atomically per request: requests/min (GEMINI_RPM) and
+tokens/min (GEMINI_TPM). State lives in Redis (the Celery broker we already run),
+so every worker process shares one quota and the cluster stays just under it
+instead of discovering the limit through 429s.
+
+Ayarlar (env):
+- GEMINI_RATE_LIMIT           → redis (varsayılan) | memory | off
+- GEMINI_RATE_LIMIT_REDIS_URL → varsayılan CELERY_BROKER_URL (redis://localhost:6379/0)
+- GEMINI_RPM / GEMINI_TPM     → dakikalık istek / token kotası (varsayılan 1000 / 1000000)
+- GEMINI_RATE_HEADROOM        → kotanın kullanılacak oranı (varsayılan 0.9)
+- GEMINI_RATE_BURST_SECONDS   → kova kapasitesi = bu kadar saniyelik kota (varsayılan 10)
+
+MemoryBucketStore is the local stand-in (single process, same semantics) used when
+Redis is unreachable or GEMINI_RATE_LIMIT=memory; RedisBucketStore also accepts a
+fakeredis client with Lua support for tests.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Optional
+
+import job_metrics
+
+
+# KEYS: istek kovası, token kovası, blok anahtarı
+# ARGV: req_cap, req_rate, tok_cap, tok_rate, req_n, tok_n
+# Dönüş: beklenecek saniye (string); "0" ise kovalardan düşüldü
+_ACQUIRE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local blocked = tonumber(redis.call('GET', KEYS[3]) or '0')
+if blocked > now then return tostring(blocked - now) end
+local function level(key, cap, rate)
+  local v = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(v[1])
+  local ts = tonumber(v[2])
+  if tokens == nil or ts == nil then return cap end
+  return math.min(cap, tokens + (now - ts) * rate)
+end
+local req_cap, req_rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+local tok_cap, tok_rate = tonumber(ARGV[3]), tonumber(ARGV[4])
+local req_n, tok_n = tonumber(ARGV[5]), tonumber(ARGV[6])
+local rt = level(KEYS[1], req_cap, req_rate)
+local tt = level(KEYS[2], tok_cap, tok_rate)
+local wait = 0
+if rt < req_n then wait = math.max(wait, (req_n - rt) / req_rate) end
+if tt < tok_n then wait = math.max(wait, (tok_n - tt) / tok_rate) end
+if wait > 0 then return tostring(wait) end
+redis.call('HSET', KEYS[1], 'tokens', rt - req_n, 'ts', now)
+redis.call('HSET', KEYS[2], 'tokens', tt - tok_n, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 600)
+redis.call('EXPIRE', KEYS[2], 600)
+return '0'
+"""
+
+# Gerçek token kullanımı tahminden farklıysa token kovasını düzelt (negatife düşebilir)
+_SETTLE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local cap, rate, delta = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local v = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(v[1])
+local ts = tonumber(v[2])
+if tokens == nil or ts == nil then tokens = cap else tokens = math.min(cap, tokens + (now - ts) * rate) end
+redis.call('HSET', KEYS[1], 'tokens', tokens - delta, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 600)
+return '0'
+"""
+
+
+class RedisBucketStore:
+    """Bucket state in Redis; all Celery workers pointing at the same Redis share the quota."""
+
+    def __init__(self, client: Any, namespace: str) -> None:
+        self.client = client
+        self.keys = [f"{namespace}:req", f"{namespace}:tok", f"{namespace}:block"]
+        self._acquire = client.register_script(_ACQUIRE_LUA)
+        self._settle = client.register_script(_SETTLE_LUA)
+
+    def try_acquire(self, req_cap: float, req_rate: float, tok_cap: float, tok_rate: float,
+                    req_n: float, tok_n: float) -> float:
+        wait = self._acquire(keys=self.keys, args=[req_cap, req_rate, tok_cap, tok_rate, req_n, tok_n])
+        return float(wait)
+
+    def settle(self, tok_cap: float, tok_rate: float, delta: float) -> None:
+        self._settle(keys=[self.keys[1]], args=[tok_cap, tok_rate, delta])
+
+    def block_for(self, seconds: float) -> None:
+        # Sunucu saatine göre "şu ana kadar blokla" değeri
+        sec, usec = self.client.time()
+        until = sec + usec / 1_000_000 + seconds
+        current = self.client.get(self.keys[2])
+        if current is None or float(current) < until:
+            self.client.set(self.keys[2], str(until), ex=max(1, int(seconds) + 1))
+
+
+class MemoryBucketStore:
+    """In-process stand-in with the same semantics as RedisBucketStore (tek process / yerel test)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: dict = {}
+        self._blocked_until = 0.0
+
+    def _level(self, name: str, cap: float, rate: float, now: float) -> float:
+        tokens, ts = self._buckets.get(name, (cap, now))
+        return min(cap, tokens + (now - ts) * rate)
+
+    def try_acquire(self, req_cap: float, req_rate: float, tok_cap: float, tok_rate: float,
+                    req_n: float, tok_n: float) -> float:
+        with self._lock:
+            now = time.time()
+            if self._blocked_until > now:
+                return self._blocked_until - now
+            rt = self._level("req", req_cap, req_rate, now)
+            tt = self._level("tok", tok_cap, tok_rate, now)
+            wait = 0.0
+            if rt < req_n:
+                wait = max(wait, (req_n - rt) / req_rate)
+            if tt < tok_n:
+                wait = max(wait, (tok_n - tt) / tok_rate)
+            if wait > 0:
+                return wait
+            self._buckets["req"] = (rt - req_n, now)
+            self._buckets["tok"] = (tt - tok_n, now)
+            return 0.0
+
+    def settle(self, tok_cap: float, tok_rate: float, delta: float) -> None:
+        with self._lock:
+            now = time.time()
+            self._buckets["tok"] = (self._level("tok", tok_cap, tok_rate, now) - delta, now)
+
+    def block_for(self, seconds: float) -> None:
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.time() + seconds)
+
+
+class RateLimiter:
+    """Requests/min + tokens/min token bucket on top of a bucket store."""
+
+    def __init__(self, store: Any, rpm: float, tpm: float, headroom: float = 0.9, burst_seconds: float = 10) -> None:
+        self.store = store
+        self.req_rate = max(rpm * headroom, 1e-6) / 60.0
+        self.tok_rate = max(tpm * headroom, 1e-6) / 60.0
+        self.req_cap = max(1.0, self.req_rate * burst_seconds)
+        self.tok_cap = max(1.0, self.tok_rate * burst_seconds)
+
+    def _try(self, tokens: float) -> float:
+        # Tek istek kova kapasitesinden büyükse kapasiteye kırp (yoksa hiç geçemez)
+        try:
+            return self.store.try_acquire(
+                self.req_cap, self.req_rate, self.tok_cap, self.tok_rate, 1, min(tokens, self.tok_cap)
+            )
+        except Exception as e:
+            # Redis geçici olarak erişilemezse çağrıyı engelleme; 429 yedeği devrede
+            print(f"  ⚠️ Rate limiter hatası, beklemeden devam: {str(e)[:80]}", flush=True)
+            return 0.0
+
+    def acquire(self, tokens: float = 0) -> float:
+        """Kota açılana kadar bekler (time.sleep). Toplam bekleme süresini döner."""
+        waited = 0.0
+        while True:
+            wait = self._try(tokens)
+            if wait <= 0:
+                break
+            wait = min(wait, 5.0)
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            job_metrics.incr("rate_limit_wait_s", waited)
+        return waited
+
+    async def acquire_async(self, tokens: float = 0) -> float:
+        """acquire'ın asyncio sürümü (asyncio.sleep; event loop bloklanmaz)."""
+        waited = 0.0
+        while True:
+            wait = self._try(tokens)
+            if wait <= 0:
+                break
+            wait = min(wait, 5.0)
+            await asyncio.sleep(wait)
+            waited += wait
+        if waited:
+            job_metrics.incr("rate_limit_wait_s", waited)
+        return waited
+
+    def settle(self, estimated: float, actual: Optional[float]) -> None:
+        """Yanıttaki gerçek token sayısıyla tahmini düzelt."""
+        if actual is None:
+            return
+        delta = float(actual) - float(estimated)
+        if abs(delta) < 1:
+            return
+        try:
+            self.store.settle(self.tok_cap, self.tok_rate, delta)
+        except Exception:
+            pass
+
+    def block_for(self, seconds: float) -> None:
+        """429 alındığında tüm worker'ları seconds boyunca durdur."""
+        try:
+            self.store.block_for(seconds)
+        except Exception:
+            pass
+
+
+def estimate_tokens(text: str) -> int:
+    """Kaba token tahmini: ~4 karakter/token + beklenen çıktı (GEMINI_EST_OUTPUT_TOKENS, varsayılan 400)."""
+    return len(text or "") // 4 + int(os.getenv("GEMINI_EST_OUTPUT_TOKENS", "400"))
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def _build_store() -> Any:
+    mode = os.getenv("GEMINI_RATE_LIMIT", "redis").strip().lower()
+    if mode == "memory":
+        return MemoryBucketStore()
+    url = os.getenv("GEMINI_RATE_LIMIT_REDIS_URL") or os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+    try:
+        import redis
+
+        client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        client.ping()
+        model = os.getenv("GEMINI_MODEL", "gemini-flash-latest")
+        # Kota API key başına → namespace key hash'i + model
+        key_hash = hashlib.sha256((os.getenv("GEMINI_API_KEY") or "").encode("utf-8")).hexdigest()[:10]
+        return RedisBucketStore(client, f"gemini_rl:{key_hash}:{model}")
+    except Exception as e:
+        print(f"⚠️ Rate limiter Redis'e bağlanamadı, process içi kova kullanılıyor: {str(e)[:80]}", flush=True)
+        return MemoryBucketStore()
+
+
+def get_limiter() -> Optional[RateLimiter]:
+    """Process-wide limiter, or None when GEMINI_RATE_LIMIT=off."""
+    global _limiter
+    if os.getenv("GEMINI_RATE_LIMIT", "redis").strip().lower() == "off":
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(
+                    _build_store(),
+                    rpm=float(os.getenv("GEMINI_RPM", "1000")),
+                    tpm=float(os.getenv("GEMINI_TPM", "1000000")),
+                    headroom=float(os.getenv("GEMINI_RATE_HEADROOM", "0.9")),
+                    burst_seconds=float(os.getenv("GEMINI_RATE_BURST_SECONDS", "10")),
+                )
+    return _limiter
@@ -0,0 +1,219 @@
+"""
+Weighted fair-share scheduler across concurrently submitted jobs.
+
+Her job bir ağırlıkla (POST /jobs priority) kaydedilir ve bir sanal zaman (vtime) taşır: işlenen
+her satır vtime'ı 1 / ağırlık kadar ilerletir. Çalışan job, kuyrukta vtime'ı kendisinden küçük
+bir job beklerken yeni batch başlatmayı bırakır (uçuştakiler tamamlanır, checkpoint'e yazılır) ve
+Celery kuyruğuna geri döner; worker sıradaki job'a geçer. Böylece 20 satırlık bir job 5.000
+satırlık bir job'un bitmesini beklemez, yüksek öncelikli job'lar aynı sürede daha çok satır işler.
+
+Kuyruğa yeni giren job'un vtime'ı aktif job'ların en küçüğünden başlar (ne birikmiş kredi ne ceza).
+Durum jobs.sqlite'ta (job_state ile aynı dosya) tutulur; tüm worker process'leri paylaşır.
+
+Ayarlar (env):
+- JOB_SCHEDULER=0        → kapalı (job'lar eskisi gibi baştan sona çalışır)
+- SCHED_MIN_SLICE_S      → job kuyruğa dönmeden önce en az bu kadar çalışır (varsayılan 20, öncelik 5 için; öncelikle orantılı)
+- SCHED_STALE_S          → bu süredir güncellenmeyen kayıtlar (çökmüş worker) hesaba katılmaz (varsayılan 3600)
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+BASE_DIR = Path(__file__).resolve().parent
+
+WAITING = "waiting"
+RUNNING = "running"
+
+MIN_PRIORITY = 1
+MAX_PRIORITY = 10
+DEFAULT_PRIORITY = 5
+
+
+def clamp_priority(priority: Optional[int]) -> int:
+    if priority is None:
+        return DEFAULT_PRIORITY
+    return max(MIN_PRIORITY, min(MAX_PRIORITY, int(priority)))
+
+
+def celery_priority(priority: Optional[int]) -> int:
+    """API önceliği (1 düşük … 10 yüksek) → Celery/Redis önceliği (0 en yüksek … 9)."""
+    return MAX_PRIORITY - clamp_priority(priority)
+
+
+def scheduler_enabled() -> bool:
+    return os.getenv("JOB_SCHEDULER", "1") == "1"
+
+
+class FairScheduler:
+    """
+    sched tablosu: job_id → ağırlık, vtime, durum, toplam kuyruk bekleme süresi.
+    One connection per thread; WAL mode (API okur, worker'lar yazar).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._conn().execute(
+            """
+            CREATE TABLE IF NOT EXISTS sched (
+                job_id TEXT PRIMARY KEY,
+                weight REAL NOT NULL,
+                vtime REAL NOT NULL DEFAULT 0,
+                state TEXT NOT NULL,
+                enqueued REAL NOT NULL,
+                started REAL,
+                wait_s REAL NOT NULL DEFAULT 0,
+                slices INTEGER NOT NULL DEFAULT 0,
+                updated REAL NOT NULL
+            )
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            fn(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _stale_before(self, now: float) -> float:
+        return now - float(os.getenv("SCHED_STALE_S", "3600"))
+
+    def enqueue(self, job_id: str, priority: Optional[int] = None) -> None:
+        """Job'u kuyruğa al (yeni veya kuyruğa dönen). vtime en az aktif job'ların en küçüğü olur."""
+        now = time.time()
+
+        def _tx(conn: sqlite3.Connection) -> None:
+            floor = conn.execute(
+                "SELECT MIN(vtime) FROM sched WHERE job_id != ? AND updated >= ?",
+                (job_id, self._stale_before(now)),
+            ).fetchone()[0]
+            row = conn.execute("SELECT weight, vtime FROM sched WHERE job_id = ?", (job_id,)).fetchone()
+            weight = float(clamp_priority(priority)) if priority is not None or row is None else row[0]
+            vtime = max(row[1] if row else 0.0, floor or 0.0)
+            if row is None:
+                conn.execute(
+                    "INSERT INTO sched (job_id, weight, vtime, state, enqueued, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, weight, vtime, WAITING, now, now),
+                )
+            else:
+                conn.execute(
+                    "UPDATE sched SET weight = ?, vtime = ?, state = ?, enqueued = ?, started = NULL, updated = ? "
+                    "WHERE job_id = ?",
+                    (weight, vtime, WAITING, now, now, job_id),
+                )
+
+        self._write(_tx)
+
+    def start(self, job_id: str) -> float:
+        """Worker job'u (veya bir shard'ını) aldı: kuyrukta geçen süre eklenir. Dönen: bu bekleme (sn)."""
+        now = time.time()
+        waited = 0.0
+
+        def _tx(conn: sqlite3.Connection) -> None:
+            nonlocal waited
+            row = conn.execute("SELECT state, enqueued FROM sched WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO sched (job_id, weight, state, enqueued, started, slices, updated) "
+                    "VALUES (?, ?, ?, ?, ?, 1, ?)",
+                    (job_id, float(DEFAULT_PRIORITY), RUNNING, now, now, now),
+                )
+                return
+            if row[0] == WAITING:
+                waited = max(0.0, now - row[1])
+            conn.execute(
+                "UPDATE sched SET state = ?, started = COALESCE(started, ?), wait_s = wait_s + ?, "
+                "slices = slices + ?, updated = ? WHERE job_id = ?",
+                (RUNNING, now, waited, 1 if row[0] == WAITING else 0, now, job_id),
+            )
+
+        self._write(_tx)
+        return waited
+
+    def charge(self, job_id: str, rows: int) -> None:
+        """İşlenen satırlar: vtime += rows / ağırlık."""
+        if rows <= 0:
+            return
+        self._conn().execute(
+            "UPDATE sched SET vtime = vtime + ? / weight, updated = ? WHERE job_id = ?",
+            (float(rows), time.time(), job_id),
+        )
+
+    def should_yield(self, job_id: str) -> bool:
+        """
+        Kuyrukta bu job'dan daha az hizmet almış (vtime'ı küçük) bekleyen job var mı?
+        Job en az SCHED_MIN_SLICE_S × ağırlık / 5 saniye çalışmadan kuyruğa dönmez.
+        """
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT vtime, weight, started FROM sched WHERE job_id = ? AND state = ?", (job_id, RUNNING)
+        ).fetchone()
+        if row is None:
+            return False
+        vtime, weight, started = row
+        min_slice = float(os.getenv("SCHED_MIN_SLICE_S", "20")) * weight / DEFAULT_PRIORITY
+        if started is not None and now - started < min_slice:
+            return False
+        return conn.execute(
+            "SELECT 1 FROM sched WHERE state = ? AND job_id != ? AND vtime < ? AND updated >= ? LIMIT 1",
+            (WAITING, job_id, vtime, self._stale_before(now)),
+        ).fetchone() is not None
+
+    def info(self, job_id: str) -> Optional[Dict[str, float]]:
+        """{priority, state, queue_wait_s, slices} - beklemedeyse şu anki bekleme dahil."""
+        row = self._conn().execute(
+            "SELECT weight, state, enqueued, wait_s, slices FROM sched WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        weight, state, enqueued, wait_s, slices = row
+        if state == WAITING:
+            wait_s += max(0.0, time.time() - enqueued)
+        return {"priority": int(weight), "state": state, "queue_wait_s": round(wait_s, 1), "slices": slices}
+
+    def finish(self, job_id: str) -> Optional[Dict[str, float]]:
+        """Job bitti: kuyruktan çıkar. Dönen: son info (metrics.json'a yazılmak üzere)."""
+        info = self.info(job_id)
+        self._conn().execute("DELETE FROM sched WHERE job_id = ?", (job_id,))
+        return info
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_scheduler: Optional[FairScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> FairScheduler:
+    """Process-wide scheduler (job_state ile aynı SQLite dosyası: JOB_STATE_PATH)."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                jobs_dir = Path(os.getenv("JOBS_BASE_DIR", str(BASE_DIR / "jobs")))
+                _scheduler = FairScheduler(Path(os.getenv("JOB_STATE_PATH", str(jobs_dir / "jobs.sqlite"))))
+    return _scheduler
@@ -1,7 +1,6 @@
 import streamlit as st
 import pandas as pd
 import os
-import io
 import requests
 
 # --- ÇOK DİLLİ DESTEK ---
@@ -28,12 +27,23 @@ TRANSLATIONS = {
         "products": "ürün",
         "complete": "✅ İşlem tamamlandı.",
         "in_progress": "İşlem arka planda (Celery worker) yapılıyor. İlerleme için **Durumu yenile** butonuna bas.",
+        "parsing": "Dosya yüklendi, worker tarafından okunuyor...",
+        "parse_failed": "Dosya okunamadı",
         "progress_warning": "İlerleme hâlâ 0 mı? Celery worker terminalinde şunu çalıştır: `celery -A celery_app.celery_app worker --loglevel=info` — 'Task process_catalog_job received' görünmeli.",
         "refresh": "🔄 Durumu yenile",
         "refresh_error": "❌ Yenileme hatası",
+        "pause": "⏸️ Duraklat",
+        "resume": "▶️ Devam et",
+        "cancel": "⏹️ İptal et",
+        "pausing": "Duraklatılıyor: işlenmekte olan ürünler bitiriliyor...",
+        "paused": "⏸️ İşlem duraklatıldı. Kaldığı yerden devam etmek için **Devam et**'e bas.",
+        "cancelled": "⏹️ İşlem iptal edildi. O ana kadar işlenen ürünler indirilebilir.",
         "processed_data": "📊 İşlenen veri",
         "download": "📥 Temiz katalogu indir",
         "download_error": "❌ İndirme hatası",
+        "prepare_download": "📦 Excel dosyasını hazırla",
+        "only_changed": "Sadece değişen satırlar",
+        "page": "Sayfa",
     },
     "en": {
         "title": "📦 Product Catalog Cleaning Tool",
@@ -57,12 +67,23 @@ TRANSLATIONS = {
         "products": "products",
         "complete": "✅ Processing complete.",
         "in_progress": "Processing in background (Celery worker). Click **Refresh status** for progress.",
+        "parsing": "File uploaded, being parsed by the worker...",
+        "parse_failed": "Could not read file",
         "progress_warning": "Still 0 progress? Run in Celery worker terminal: `celery -A celery_app.celery_app worker --loglevel=info` — you should see 'Task process_catalog_job received'.",
         "refresh": "🔄 Refresh status",
         "refresh_error": "❌ Refresh error",
+        "pause": "⏸️ Pause",
+        "resume": "▶️ Resume",
+        "cancel": "⏹️ Cancel",
+        "pausing": "Pausing: finishing products in progress...",
+        "paused": "⏸️ Processing paused. Click **Resume** to continue where it stopped.",
+        "cancelled": "⏹️ Processing cancelled. Products processed so far can be downloaded.",
         "processed_data": "📊 Processed data",
         "download": "📥 Download cleaned catalog",
         "download_error": "❌ Download error",
+        "prepare_download": "📦 Prepare Excel file",
+        "only_changed": "Only changed rows",
+        "page": "Page",
     },
     "de": {
         "title": "📦 Produktkatalog-Bereinigungs-Tool",
@@ -86,12 +107,23 @@ TRANSLATIONS = {
         "products": "Produkte",
         "complete": "✅ Verarbeitung abgeschlossen.",
         "in_progress": "Verarbeitung läuft im Hintergrund (Celery worker). Klicken Sie auf **Status aktualisieren**.",
+        "parsing": "Datei hochgeladen, wird vom Worker eingelesen...",
+        "parse_failed": "Datei konnte nicht gelesen werden",
         "progress_warning": "Immer noch 0 Fortschritt? Im Celery-Terminal ausführen: `celery -A celery_app.celery_app worker --loglevel=info`",
         "refresh": "🔄 Status aktualisieren",
         "refresh_error": "❌ Aktualisierungsfehler",
+        "pause": "⏸️ Pausieren",
+        "resume": "▶️ Fortsetzen",
+        "cancel": "⏹️ Abbrechen",
+        "pausing": "Wird pausiert: laufende Produkte werden abgeschlossen...",
+        "paused": "⏸️ Verarbeitung pausiert. Klicken Sie auf **Fortsetzen**, um dort weiterzumachen.",
+        "cancelled": "⏹️ Verarbeitung abgebrochen. Bisher verarbeitete Produkte können heruntergeladen werden.",
         "processed_data": "📊 Verarbeitete Daten",
         "download": "📥 Bereinigten Katalog herunterladen",
         "download_error": "❌ Download-Fehler",
+        "prepare_download": "📦 Excel-Datei vorbereiten",
+        "only_changed": "Nur geänderte Zeilen",
+        "page": "Seite",
     },
     "it": {
         "title": "📦 Strumento per la pulizia del catalogo prodotti",
@@ -115,12 +147,23 @@ TRANSLATIONS = {
         "products": "prodotti",
         "complete": "✅ Elaborazione completata.",
         "in_progress": "Elaborazione in background (Celery worker). Clicca **Aggiorna stato** per il progresso.",
+        "parsing": "File caricato, lettura in corso nel worker...",
+        "parse_failed": "Impossibile leggere il file",
         "progress_warning": "Ancora 0 progresso? Eseguire: `celery -A celery_app.celery_app worker --loglevel=info`",
         "refresh": "🔄 Aggiorna stato",
         "refresh_error": "❌ Errore di aggiornamento",
+        "pause": "⏸️ Pausa",
+        "resume": "▶️ Riprendi",
+        "cancel": "⏹️ Annulla",
+        "pausing": "Messa in pausa: completamento dei prodotti in corso...",
+        "paused": "⏸️ Elaborazione in pausa. Clicca **Riprendi** per continuare da dove si è fermata.",
+        "cancelled": "⏹️ Elaborazione annullata. I prodotti elaborati finora possono essere scaricati.",
         "processed_data": "📊 Dati elaborati",
         "download": "📥 Scarica catalogo pulito",
         "download_error": "❌ Errore download",
+        "prepare_download": "📦 Prepara file Excel",
+        "only_changed": "Solo righe modificate",
+        "page": "Pagina",
     },
 }
 
@@ -157,6 +200,9 @@ except Exception:
     pass
 backend_url = (_backend or "http://localhost:8000").rstrip("/")
 
+# Önizleme sayfası başına satır (GET /jobs/{id}/rows)
+PREVIEW_PAGE_SIZE = 100
+
 # --- BACKEND CHECK ---
 def backend_reachable():
     try:
@@ -266,13 +312,46 @@ if job_id:
 
         st.progress(min(percentage / 100.0, 1.0))
 
-        if status.get("is_complete"):
+        if status.get("phase") == "failed":
+            st.error(f"❌ {t('parse_failed', lang)}: {status.get('error') or ''}")
+        elif status.get("phase") in ("uploaded", "parsing"):
+            st.caption(t("parsing", lang))
+        elif status.get("is_complete"):
             st.success(t("complete", lang))
+        elif status.get("phase") == "cancelled":
+            st.warning(t("cancelled", lang))
+        elif status.get("phase") == "paused":
+            st.info(t("paused", lang))
+        elif status.get("control") == "pause":
+            st.caption(t("pausing", lang))
         else:
             st.caption(t("in_progress", lang))
             if processed == 0 and total > 0:
                 st.warning(t("progress_warning", lang))
 
+    # Duraklat / devam / iptal (POST /jobs/{id}/pause|resume|cancel)
+    phase = status.get("phase")
+    if status and not status.get("is_complete") and phase not in ("failed", "cancelled"):
+        c_pause, c_cancel = st.columns(2)
+        action = None
+        with c_pause:
+            if phase == "paused" or status.get("control") == "pause":
+                if st.button(t("resume", lang), use_container_width=True):
+                    action = "resume"
+            elif st.button(t("pause", lang), use_container_width=True, disabled=phase in ("uploaded", "parsing")):
+                action = "pause"
+        with c_cancel:
+            if st.button(t("cancel", lang), use_container_width=True):
+                action = "cancel"
+        if action:
+            try:
+                resp = requests.post(f"{backend_url}/jobs/{job_id}/{action}", timeout=30)
+                resp.raise_for_status()
+                st.session_state.job_status = resp.json()
+                st.rerun()
+            except Exception as e:
+                st.error(f"❌ {t('error', lang)}: {e}")
+
     if st.button(t("refresh", lang)):
         try:
             resp = requests.get(f"{backend_url}/jobs/{job_id}", timeout=30)
@@ -283,25 +362,51 @@ if job_id:
             st.error(f"❌ {t('refresh_error', lang)}: {e}")
 
     if status.get("output_ready"):
+        # Önizleme: checkpoint'ten sayfa sayfa JSON (GET /jobs/{id}/rows); Excel sadece indirmek istenince
         try:
-            result_resp = requests.get(
-                f"{backend_url}/jobs/{job_id}/download",
-                timeout=120,
+            c_filter, c_page = st.columns([2, 1])
+            with c_filter:
+                only_changed = st.checkbox(t("only_changed", lang), key="preview_only_changed")
+            with c_page:
+                page_no = st.number_input(t("page", lang), min_value=1, value=1, step=1, key="preview_page")
+            rows_resp = requests.get(
+                f"{backend_url}/jobs/{job_id}/rows",
+                params={
+                    "offset": (int(page_no) - 1) * PREVIEW_PAGE_SIZE,
+                    "limit": PREVIEW_PAGE_SIZE,
+                    "only_changed": str(only_changed).lower(),
+                },
+                timeout=30,
             )
-            result_resp.raise_for_status()
-            buffer = io.BytesIO(result_resp.content)
-            res_df = pd.read_excel(buffer)
-
-            st.subheader(f"📊 {t('processed_data', lang)} ({len(res_df)} {t('products', lang)})")
+            rows_resp.raise_for_status()
+            page = rows_resp.json()
+            res_df = pd.DataFrame(
+                [r["values"] for r in page.get("rows", [])],
+                index=[r["index"] for r in page.get("rows", [])],
+                columns=page.get("columns") or None,
+            )
+            st.subheader(f"📊 {t('processed_data', lang)} ({page.get('total', 0)} {t('products', lang)})")
             st.dataframe(res_df, use_container_width=True)
+        except Exception as e:
+            st.error(f"❌ {t('error', lang)}: {e}")
+
+        if st.button(t("prepare_download", lang)):
+            try:
+                result_resp = requests.get(
+                    f"{backend_url}/jobs/{job_id}/download",
+                    timeout=120,
+                )
+                result_resp.raise_for_status()
+                st.session_state.download_bytes = (job_id, result_resp.content)
+            except Exception as e:
+                st.error(f"❌ {t('download_error', lang)}: {e}")
 
-            buffer.seek(0)
+        download = st.session_state.get("download_bytes")
+        if download and download[0] == job_id:
             st.download_button(
                 label=t("download", lang),
-                data=buffer,
+                data=download[1],
                 file_name=f"cleaned_catalog_{job_id}.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 type="primary",
             )
-        except Exception as e:
-            st.error(f"❌ {t('download_error', lang)}: {e}")
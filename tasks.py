@@ -3,16 +3,30 @@ from __future__ import annotations
 import json
 import os
 import uuid
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 
 import pandas as pd
 from dotenv import load_dotenv
 
 load_dotenv()  # Worker'ın .env okuması için (proje klasöründen çalıştır)
 
+import job_events
+import job_input
+import job_metrics
+import job_state
 from celery_app import celery_app
+from checkpoint import CheckpointStore, changed_columns, row_hash
+from coalesce import (
+    VariantGroup, coalesce_enabled, differing_columns, fan_out, group_items, missing_identity_columns,
+)
+from column_relevance import build_relevance_map
+from concurrency import ThreadGate, controller_from_env
+from job_metrics import JobMetrics, bind as bind_metrics
+from job_state import CANCEL, DONE, FAILED, IN_FLIGHT, PAUSE, PENDING, JobStateStore
+from scheduler import celery_priority, get_scheduler, scheduler_enabled
 
 
 # Job dosyaları: varsayılan proje içi; Railway'de Volume kullanmak için JOBS_BASE_DIR ile kalıcı yol ver
@@ -26,6 +40,7 @@ def _job_dir(job_id: str) -> Path:
 
 
 def _status_path(job_id: str) -> Path:
+    # Eski job'lar; job_state'e ilk erişimde aktarılır
     return _job_dir(job_id) / "status.csv"
 
 
@@ -34,82 +49,407 @@ def _output_path(job_id: str) -> Path:
 
 
 def _input_path(job_id: str) -> Path:
-    return _job_dir(job_id) / "input.xlsx"
+    # Arrow IPC (job_input.py); eski job'larda input.xlsx
+    return _job_dir(job_id) / job_input.ARROW_NAME
 
 
 def _config_path(job_id: str) -> Path:
     return _job_dir(job_id) / "config.json"
 
 
-def create_job_from_dataframe(df: pd.DataFrame, language: str = "tr") -> str:
+def _metrics_path(job_id: str) -> Path:
+    return _job_dir(job_id) / "metrics.json"
+
+
+def _checkpoint_path(job_id: str) -> Path:
+    return _job_dir(job_id) / "checkpoint.sqlite"
+
+
+Shard = Tuple[int, int]
+
+
+def _shard_dir(job_id: str) -> Path:
+    return _job_dir(job_id) / "shards"
+
+
+def _shard_name(shard: Shard) -> str:
+    return f"{shard[0]}-{shard[1]}"
+
+
+def _checkpoint(job_id: str) -> CheckpointStore:
+    return CheckpointStore(_checkpoint_path(job_id))
+
+
+def _job_state(job_id: str) -> JobStateStore:
+    """Job durum store'u; job status.csv ile oluşturulmuşsa önce aktarılır. Job yoksa FileNotFoundError."""
+    store = job_state.get_store()
+    if not store.exists(job_id):
+        status_file = _status_path(job_id)
+        if not status_file.exists():
+            raise FileNotFoundError(f"Status not found for job {job_id}")
+        store.migrate_status_csv(job_id, status_file)
+    return store
+
+
+def _is_technical_header(df: pd.DataFrame) -> bool:
+    """Mirakl export'larının ilk satırı teknik kodlar (TITLE__TR_TR, ...) olabilir; işlenmez."""
+    return len(df) > 0 and "Başlık" in df.columns and str(df.iloc[0].get("Başlık", "")).startswith("TITLE")
+
+
+def materialize_output(job_id: str) -> Path | None:
     """
-    Persist uploaded DataFrame as a new job and return job_id.
+    Checkpoint'teki satırlardan output.xlsx üret (indirme anında; yeni satır yoksa mevcut dosya).
+    Hiç sonuç yoksa None.
     """
-    job_id = uuid.uuid4().hex
-    job_path = _job_dir(job_id)
-    job_path.mkdir(parents=True, exist_ok=True)
+    output = _output_path(job_id)
+    if not _checkpoint_path(job_id).exists():
+        return output if output.exists() else None
+    store = _checkpoint(job_id)
+    try:
+        store.materialize(output)
+    finally:
+        store.close()
+    return output if output.exists() else None
 
-    # Save raw input
-    df.to_excel(_input_path(job_id), index=False)
 
-    # Initialize empty status file – one row = one product
-    status_df = pd.DataFrame(
+def read_job_rows(
+    job_id: str,
+    offset: int = 0,
+    limit: int = 100,
+    columns: List[str] | None = None,
+    only_changed: bool = False,
+) -> Dict[str, Any]:
+    """
+    Checkpoint'ten bir sayfa sonuç satırı (önizleme için; output.xlsx üretilmez / okunmaz).
+    columns: sadece bu sütunlar (istek sırasıyla); only_changed: sadece Gemini'nin değiştirdiği satırlar.
+    Shard'lı job'larda satırlar finalize_job birleştirdikten sonra görünür.
+    """
+    if not _job_dir(job_id).exists():
+        raise FileNotFoundError(f"Job {job_id} not found")
+    result: Dict[str, Any] = {"job_id": job_id, "offset": offset, "limit": limit, "total": 0, "columns": [], "rows": []}
+    if not _checkpoint_path(job_id).exists():
+        return result
+    store = _checkpoint(job_id)
+    try:
+        all_columns = store.result_columns()
+        total, page = store.page(offset, limit, only_changed)
+    finally:
+        store.close()
+    if columns:
+        wanted = set(all_columns)
+        all_columns = [c for c in columns if c in wanted]
+    result["total"] = total
+    result["columns"] = all_columns
+    result["rows"] = [
         {
-            "index": range(len(df)),
-            "processed": False,
-            "sku": df.get("SHOP_SKU", pd.Series([None] * len(df))).astype(str),
+            "index": idx,
+            "changed": [c for c in changed if c in all_columns] if changed is not None else None,
+            "values": {c: values.get(c) for c in all_columns},
         }
-    )
-    status_df.to_csv(_status_path(job_id), index=False)
+        for idx, values, changed in page
+    ]
+    return result
+
+
+# Job aşamaları (config.json "phase"): yükleme diske yazılır → prepare_job ayrıştırır → işlenir
+PHASE_UPLOADED = "uploaded"
+PHASE_PARSING = "parsing"
+PHASE_QUEUED = "queued"
+PHASE_PROCESSING = "processing"
+PHASE_COMPLETE = "complete"
+PHASE_FAILED = "failed"
+PHASE_PAUSED = "paused"
+PHASE_CANCELLED = "cancelled"
 
-    config_path = _config_path(job_id)
-    with open(config_path, "w", encoding="utf-8") as f:
-        json.dump({"language": language or "tr"}, f, ensure_ascii=False)
 
+def _new_job(language: str, batch_size: int | None, job_id: str | None = None, **extra: Any) -> str:
+    job_id = job_id or uuid.uuid4().hex
+    _job_dir(job_id).mkdir(parents=True, exist_ok=True)
+    config: Dict[str, Any] = {"language": language or "tr"}
+    if batch_size:
+        config["batch_size"] = int(batch_size)
+    config.update(extra)
+    _write_job_config(job_id, config)
     return job_id
 
 
-def _read_job_language(job_id: str) -> str:
-    """Job'un dil ayarını oku. Varsayılan: tr"""
+def _register_job_input(job_id: str, df: pd.DataFrame) -> int:
+    """Girdiyi kaydet; ürün satırı sayısını döner."""
+    # Parsed input once as Arrow IPC (workers load it without re-parsing the Excel file)
+    job_input.write_input(_job_dir(job_id), df)
+
+    # Register rows in the job-state store – one row = one product (technical header row excluded)
+    rows = df.iloc[1:] if _is_technical_header(df) else df
+    skus = rows.get("SHOP_SKU", pd.Series([None] * len(rows))).astype(str).tolist()
+    job_state.get_store().create_job(job_id, skus)
+    return len(rows)
+
+
+def create_job_from_dataframe(
+    df: pd.DataFrame,
+    language: str = "tr",
+    batch_size: int | None = None,
+    upload: bytes | None = None,
+    filename: str = "",
+    job_id: str | None = None,
+) -> str:
+    """
+    Persist uploaded DataFrame as a new job and return job_id.
+    batch_size: products per Gemini request (None → GEMINI_BATCH_SIZE env, default 1).
+    upload / filename: original upload bytes, kept next to the parsed input for fidelity.
+    job_id: reuse a fixed id (cli.py); the input and row states are replaced, the job's
+    checkpoint is kept so unchanged rows are not processed again (results for rows past
+    the end of a shorter input are dropped).
+    """
+    reused = job_id is not None and _checkpoint_path(job_id).exists()
+    job_id = _new_job(language, batch_size, job_id, phase=PHASE_QUEUED)
+    total = _register_job_input(job_id, df)
+    if reused:
+        store = _checkpoint(job_id)
+        try:
+            store.drop_from(total)
+        finally:
+            store.close()
+    if upload is not None:
+        job_input.save_upload(_job_dir(job_id), upload, filename)
+    return job_id
+
+
+def create_upload_job(
+    language: str = "tr",
+    batch_size: int | None = None,
+    filename: str = "",
+    shard_size: int | None = None,
+    priority: int | None = None,
+) -> Tuple[str, Path]:
+    """
+    Yükleme için boş job aç: (job_id, yüklemenin yazılacağı yol). Dosya diske yazıldıktan sonra
+    prepare_job.delay(job_id) ayrıştırıp işlemeyi başlatır.
+    shard_size: shard başına satır (None → JOB_SHARD_SIZE env; 0 = shard yok)
+    priority: 1 (düşük) … 10 (yüksek); eşzamanlı job'lar arasında satır payı (scheduler.py)
+    """
+    extra: Dict[str, Any] = {"shard_size": int(shard_size)} if shard_size is not None else {}
+    if priority is not None:
+        extra["priority"] = int(priority)
+    job_id = _new_job(language, batch_size, phase=PHASE_UPLOADED, filename=filename or "", **extra)
+    return job_id, job_input.upload_path(_job_dir(job_id), filename)
+
+
+@celery_app.task(name="prepare_job")
+def prepare_job(job_id: str) -> Dict[str, Any]:
+    """
+    Celery stage 1: parse the uploaded file into input.arrow, register rows, then queue
+    process_catalog_job. Parse / validation errors mark the job failed (visible in status).
+    """
+    upload = job_input.find_upload(_job_dir(job_id))
+    if upload is None:
+        raise FileNotFoundError(f"Upload not found for job {job_id}")
+    _update_job_config(job_id, phase=PHASE_PARSING)
+    try:
+        df = pd.read_excel(upload)
+        if df.empty or len(df.columns) == 0:
+            raise ValueError("Excel dosyasında ürün satırı yok")
+        _register_job_input(job_id, df)
+    except Exception as exc:
+        print(f"[Job {job_id}] Yükleme okunamadı: {str(exc)[:200]}", flush=True)
+        _update_job_config(job_id, phase=PHASE_FAILED, error=f"Failed to read Excel: {exc}")
+        return read_job_status(job_id)
+    if _read_job_config(job_id).get("phase") == PHASE_CANCELLED:
+        # Ayrıştırma sürerken iptal edildi: satırlar kayıtlı kalır, işleme başlamaz
+        job_state.get_store().set_control(job_id, CANCEL)
+        return read_job_status(job_id)
+    _update_job_config(job_id, phase=PHASE_QUEUED)
+    dispatch_job(job_id)
+    return read_job_status(job_id)
+
+
+def _read_job_config(job_id: str) -> Dict[str, Any]:
+    """Job'un config.json içeriğini oku. Okunamazsa boş dict."""
     cfg = _config_path(job_id)
     if not cfg.exists():
-        return "tr"
+        return {}
     try:
         with open(cfg, encoding="utf-8") as f:
             data = json.load(f)
-        return data.get("language", "tr") or "tr"
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def _write_job_config(job_id: str, config: Dict[str, Any]) -> None:
+    tmp = _config_path(job_id).with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False)
+    tmp.replace(_config_path(job_id))
+
+
+def _update_job_config(job_id: str, **values: Any) -> None:
+    config = _read_job_config(job_id)
+    changed_phase = "phase" in values and values["phase"] != config.get("phase")
+    config.update(values)
+    _write_job_config(job_id, config)
+    if changed_phase:
+        job_events.publish(job_id, "phase", phase=values["phase"], error=config.get("error"))
+
+
+def _read_job_language(job_id: str) -> str:
+    """Job'un dil ayarını oku. Varsayılan: tr"""
+    return _read_job_config(job_id).get("language", "tr") or "tr"
+
+
+def _read_job_batch_size(job_id: str) -> int:
+    """Job'un batch boyutunu oku (config.json → GEMINI_BATCH_SIZE → 1)."""
+    from main import _batch_boyutu
+    return _batch_boyutu(_read_job_config(job_id).get("batch_size"))
+
+
+def _read_metrics_file(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
     except Exception:
-        return "tr"
+        return {}
+
+
+def _read_job_metrics(job_id: str, shard: Shard | None = None) -> Dict[str, Any]:
+    """
+    Job sayaçlarını (cache hit/miss, API çağrıları, ...) oku. Yoksa boş dict.
+    shard verilmezse çalışan shard'ların sayaçları da toplanır (gauge'lar ana dosyadan).
+    """
+    if shard is not None:
+        return _read_metrics_file(_shard_dir(job_id) / f"{_shard_name(shard)}.metrics.json")
+    data = _read_metrics_file(_metrics_path(job_id))
+    shard_dir = _shard_dir(job_id)
+    if shard_dir.is_dir():
+        for path in sorted(shard_dir.glob("*.metrics.json")):
+            for name, value in _read_metrics_file(path).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    current = data.get(name, 0)
+                    data[name] = (current if isinstance(current, (int, float)) else 0) + value
+                else:
+                    data.setdefault(name, value)
+    return data
+
+
+def _write_job_metrics(job_id: str, metrics: JobMetrics, shard: Shard | None = None) -> None:
+    if shard is None:
+        path = _metrics_path(job_id)
+    else:
+        path = _shard_dir(job_id) / f"{_shard_name(shard)}.metrics.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(metrics.snapshot(), f)
+    tmp.replace(path)
 
 
 def read_job_status(job_id: str) -> Dict[str, Any]:
     """
     Return simple status information for the given job_id.
     """
-    status_file = _status_path(job_id)
-    if not status_file.exists():
-        raise FileNotFoundError(f"Status file not found for job {job_id}")
-
-    status_df = pd.read_csv(status_file)
-    total = len(status_df)
-    # CSV may store "True"/"False" as strings
-    proc = status_df["processed"]
-    is_done = (proc == True) | (proc.astype(str).str.lower() == "true")
-    processed = int(is_done.sum())
+    config = _read_job_config(job_id)
+    phase = config.get("phase")
+    try:
+        progress = _job_state(job_id).progress(job_id)
+    except (KeyError, FileNotFoundError):
+        if phase not in (PHASE_UPLOADED, PHASE_PARSING, PHASE_FAILED):
+            raise FileNotFoundError(f"Status not found for job {job_id}")
+        # Yükleme henüz ayrıştırılmadı (veya ayrıştırılamadı): satır sayısı bilinmiyor
+        return {
+            "job_id": job_id,
+            "phase": phase,
+            "error": config.get("error"),
+            "total": 0,
+            "processed": 0,
+            "remaining": 0,
+            "percentage": 0.0,
+            "is_complete": False,
+            "output_ready": False,
+        }
+    total = progress["total"]
+    processed = progress[DONE] + progress[FAILED]
+    # Shard'lı job: sonuçlar finalize_job birleştirene kadar shards/ altında
+    merging = _shard_dir(job_id).is_dir()
+    complete = processed >= total and not merging
 
     result: Dict[str, Any] = {
         "job_id": job_id,
+        "phase": PHASE_COMPLETE if total and complete else (phase or PHASE_PROCESSING),
         "total": total,
         "processed": processed,
         "remaining": total - processed,
         "percentage": round((processed / total * 100) if total > 0 else 0.0, 1),
-        "is_complete": processed >= total,
+        "is_complete": complete,
+        "rows": {state: progress[state] for state in (PENDING, IN_FLIGHT, DONE, FAILED)},
     }
+    # İşlenmeyi bekleyen duraklatma / iptal isteği (worker uçuştakileri bitirince aşama değişir)
+    control = _job_state(job_id).control(job_id)
+    if control is not None:
+        result["control"] = control
 
-    if _output_path(job_id).exists():
-        result["output_ready"] = True
-    else:
-        result["output_ready"] = False
+    # Excel indirme anında checkpoint'ten üretilir; en az bir sonuç satırı varsa hazır sayılır
+    result["output_ready"] = _output_path(job_id).exists() or (processed > 0 and not merging)
+
+    metrics = _read_job_metrics(job_id)
+    hits = int(metrics.get("cache_hits", 0))
+    misses = int(metrics.get("cache_misses", 0))
+    result["api_calls"] = int(metrics.get("api_calls", 0))
+    result["cache"] = {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 3) if (hits + misses) else 0.0,
+    }
+    result["calls_per_row"] = round(result["api_calls"] / processed, 2) if processed else 0.0
+    result["followup_calls"] = int(metrics.get("followup_calls", 0))
+    result["json_repaired"] = int(metrics.get("json_repaired", 0))
+    result["json_unrepairable"] = int(metrics.get("json_unrepairable", 0))
+    shards = config.get("shards")
+    if shards and total:
+        state_store = job_state.get_store()
+        result["shards"] = {
+            "total": len(shards),
+            "done": sum(
+                1 for start, end in shards
+                if state_store.count(job_id, [DONE, FAILED], start, end) >= end - start
+            ),
+            "size": shards[0][1] - shards[0][0],
+        }
+    # Adil paylaşım: öncelik ve toplam kuyruk bekleme süresi (ilk bekleyiş + yer verdikten sonrakiler)
+    sched_info = get_scheduler().info(job_id) if scheduler_enabled() else None
+    if sched_info is not None or "queue_wait_s" in metrics:
+        result["priority"] = sched_info["priority"] if sched_info else config.get("priority")
+        result["queue_wait_s"] = round(
+            float(metrics.get("queue_wait_s", 0)) + (sched_info["queue_wait_s"] if sched_info else 0.0), 1
+        )
+    if sched_info is not None:
+        result["scheduler"] = {"state": sched_info["state"], "slices": sched_info["slices"]}
+    if "replay_misses" in metrics:
+        result["replay_misses"] = int(metrics.get("replay_misses", 0))
+    if "concurrency_limit" in metrics:
+        result["concurrency"] = {
+            "limit": metrics.get("concurrency_limit"),
+            "history": metrics.get("concurrency_history", []),
+            "rate_limit_429": int(metrics.get("rate_limit_429", 0)),
+        }
+    if "coalesce_groups" in metrics:
+        result["coalesce"] = {
+            "groups": int(metrics.get("coalesce_groups", 0)),
+            "rows": int(metrics.get("coalesced_rows", 0)),
+            "calls_saved": int(metrics.get("coalesce_calls_saved", 0)),
+        }
+    if "prompt_chars_before" in metrics:
+        before = int(metrics.get("prompt_chars_before", 0))
+        after = int(metrics.get("prompt_chars_after", 0))
+        result["prompt_size"] = {
+            "before_chars": before,
+            "after_chars": after,
+            "reduction": round(1 - after / before, 3) if before else 0.0,
+            "missing_columns_before": int(metrics.get("missing_columns_before", 0)),
+            "missing_columns_after": int(metrics.get("missing_columns_after", 0)),
+        }
 
     return result
 
@@ -150,24 +490,8 @@ TERS_HARITA = {
 }
 
 
-def _process_single_product(
-    idx: int,
-    row_dict: Dict[str, Any],
-    eksik_sutunlar: List[str],
-    output_lang: str = "tr",
-) -> Tuple[int, Dict[str, Any]]:
-    """
-    Tek ürünü işler, (idx, flat_result) döner. ThreadPoolExecutor ile paralel çağrılabilir.
-    output_lang: Gemini çıktı dili (tr, en, de, it)
-    """
-    import time
-    from main import urun_isle, gemini_eksik_sutunlar_toplu_sor
-
-    gemini_output = urun_isle(
-        row_dict,
-        eksik_sutunlar=eksik_sutunlar if eksik_sutunlar else None,
-        output_lang=output_lang,
-    )
+def _apply_gemini_output(row_dict: Dict[str, Any], gemini_output: Dict[str, Any]) -> Dict[str, Any]:
+    """urun_isle çıktısını (başlık, özellikler, çelişki çözümü, eksik sütunlar) satıra uygular."""
     features = gemini_output.get("duzenlenmis_ozellikler") or {}
 
     flat_result = row_dict.copy()
@@ -202,70 +526,92 @@ def _process_single_product(
                 not isinstance(deger, str) or "bilinmiyor" not in str(deger).lower()
             ):
                 flat_result[sutun] = str(deger).strip() if isinstance(deger, str) else deger
+    return flat_result
 
-    # Hâlâ boş kalan sütunlar için ek odaklı çağrı (eskisi gibi daha çok doldurur)
-    if os.getenv("GEMINI_EKSIK_SUTUN", "1") == "1":
-        atla = {"Başlık", "SHOP_SKU", "Warning", "Uyari", "Kategori"}
-        kalan_eksik = []
-        for sutun_adi in flat_result.keys():
-            if sutun_adi in atla:
-                continue
-            mevcut = flat_result.get(sutun_adi, None)
-            if pd.notna(mevcut) and (not isinstance(mevcut, str) or str(mevcut).strip() != ""):
-                continue
-            kalan_eksik.append(sutun_adi)
-        # EAN/barkod: internet araması ile doldurmayı dene (çok önemli alan)
-        try:
-            from main import ean_ara_internet
-            for sutun_adi in list(kalan_eksik):
-                if "ean" in str(sutun_adi).lower() or "barkod" in str(sutun_adi).lower():
-                    ean_val = ean_ara_internet(
-                        marka=row_dict.get("Marka") or "",
-                        urun_adi=row_dict.get("Başlık") or flat_result.get("Başlık") or "",
-                    )
-                    if ean_val:
-                        flat_result[sutun_adi] = ean_val
-                        kalan_eksik.remove(sutun_adi)
-                    break  # en fazla bir EAN sütunu
-        except Exception:
-            pass
-
-        # Boyut / ağırlık: internet araması ile doldurmayı dene
-        try:
-            from main import urun_boyutu_ara_internet, _boyut_sutun_eslestir
-            boyut_sutunlari = [s for s in kalan_eksik if _boyut_sutun_eslestir(s) is not None]
-            if boyut_sutunlari:
-                boyut_degerleri = urun_boyutu_ara_internet(
+
+def _remaining_missing(flat_result: Dict[str, Any], eksik_sutunlar: List[str] | None = None) -> List[str]:
+    """İlk çağrıdan sonra hâlâ boş kalan sütunlar (eksik_sutunlar verilirse sadece onlar arasından)."""
+    atla = {"Başlık", "SHOP_SKU", "Warning", "Uyari", "Kategori"}
+    sorulabilir = set(eksik_sutunlar) if eksik_sutunlar is not None else None
+    kalan_eksik = []
+    for sutun_adi in flat_result.keys():
+        if sutun_adi in atla or (sorulabilir is not None and sutun_adi not in sorulabilir):
+            continue
+        mevcut = flat_result.get(sutun_adi, None)
+        if pd.notna(mevcut) and (not isinstance(mevcut, str) or str(mevcut).strip() != ""):
+            continue
+        kalan_eksik.append(sutun_adi)
+    return kalan_eksik
+
+
+def pipeline_mode() -> str:
+    """
+    GEMINI_PIPELINE=single (varsayılan): tek istek başlık + özellik + eksik sütun + çelişkiyi kapsar;
+    takip çağrısı sadece yanıtın cozulemeyen_sutunlar listesindeki alanlar için yapılır.
+    GEMINI_PIPELINE=two_pass: eski davranış, hâlâ boş kalan tüm sütunlar ikinci çağrıda sorulur.
+    """
+    return "two_pass" if os.getenv("GEMINI_PIPELINE", "single").strip().lower() == "two_pass" else "single"
+
+
+def _followup_columns(gemini_output: Dict[str, Any], kalan_eksik: List[str]) -> List[str]:
+    """Takip çağrısında sorulacak sütunlar (pipeline moduna göre)."""
+    if pipeline_mode() == "two_pass":
+        return kalan_eksik
+    cozulemeyen = set(gemini_output.get("cozulemeyen_sutunlar") or [])
+    return [s for s in kalan_eksik if s in cozulemeyen]
+
+
+def _fill_from_search(row_dict: Dict[str, Any], flat_result: Dict[str, Any], kalan_eksik: List[str]) -> None:
+    """EAN ve boyut/ağırlık sütunlarını internet aramasıyla doldurur; doldurulanlar kalan_eksik'ten çıkarılır."""
+    if os.getenv("WEB_SEARCH", "1") != "1":
+        return
+    # EAN/barkod: internet araması ile doldurmayı dene (çok önemli alan)
+    try:
+        from main import ean_ara_internet
+        for sutun_adi in list(kalan_eksik):
+            if "ean" in str(sutun_adi).lower() or "barkod" in str(sutun_adi).lower():
+                ean_val = ean_ara_internet(
                     marka=row_dict.get("Marka") or "",
                     urun_adi=row_dict.get("Başlık") or flat_result.get("Başlık") or "",
                 )
-                for sutun_adi in list(kalan_eksik):
-                    key = _boyut_sutun_eslestir(sutun_adi)
-                    if key and boyut_degerleri.get(key):
-                        flat_result[sutun_adi] = boyut_degerleri[key]
-                        kalan_eksik.remove(sutun_adi)
-        except Exception:
-            pass
+                if ean_val:
+                    flat_result[sutun_adi] = ean_val
+                    kalan_eksik.remove(sutun_adi)
+                break  # en fazla bir EAN sütunu
+    except Exception:
+        pass
 
-        if kalan_eksik:
-            try:
-                ek_doldurma = gemini_eksik_sutunlar_toplu_sor(
-                    urun_adi=row_dict.get("Başlık", ""),
-                    eksik_sutunlar=kalan_eksik,
-                    marka=row_dict.get("Marka"),
-                    output_lang=output_lang,
-                )
-                for sutun, deger in ek_doldurma.items():
-                    if sutun in flat_result and deger:
-                        flat_result[sutun] = str(deger).strip() if isinstance(deger, str) else deger
-                time.sleep(float(os.getenv("GEMINI_DELAY", "0.2")))
-            except Exception:
-                pass
+    # Boyut / ağırlık: internet araması ile doldurmayı dene
+    try:
+        from main import urun_boyutu_ara_internet, _boyut_sutun_eslestir
+        boyut_sutunlari = [s for s in kalan_eksik if _boyut_sutun_eslestir(s) is not None]
+        if boyut_sutunlari:
+            boyut_degerleri = urun_boyutu_ara_internet(
+                marka=row_dict.get("Marka") or "",
+                urun_adi=row_dict.get("Başlık") or flat_result.get("Başlık") or "",
+            )
+            for sutun_adi in list(kalan_eksik):
+                key = _boyut_sutun_eslestir(sutun_adi)
+                if key and boyut_degerleri.get(key):
+                    flat_result[sutun_adi] = boyut_degerleri[key]
+                    kalan_eksik.remove(sutun_adi)
+    except Exception:
+        pass
 
-    # Ürün Tipi değerini Kutu İçeriği'ne kopyala (ayrı doldurma gereksin)
+
+def _apply_fill(flat_result: Dict[str, Any], ek_doldurma: Dict[str, Any]) -> None:
+    """gemini_eksik_sutunlar_toplu_sor sonucunu satıra yazar."""
+    for sutun, deger in ek_doldurma.items():
+        if sutun in flat_result and deger:
+            flat_result[sutun] = str(deger).strip() if isinstance(deger, str) else deger
+
+
+def _copy_derived_columns(flat_result: Dict[str, Any]) -> None:
+    """Ürün Tipi → Kutu İçeriği ve Renk (temel) → Renk (Üreticiye Göre) kopyası."""
     def _dolu(v):
         return v is not None and (not isinstance(v, str) or str(v).strip() != "")
 
+    # Ürün Tipi değerini Kutu İçeriği'ne kopyala (ayrı doldurma gereksin)
     for urun_tipi_key in ("Ürün Tipi (tr_TR)", "Ürün Tipi"):
         if urun_tipi_key not in flat_result:
             continue
@@ -290,69 +636,569 @@ def _process_single_product(
             if renk_uretici_key in flat_result:
                 break
 
+
+def _process_single_product(
+    idx: int,
+    row_dict: Dict[str, Any],
+    eksik_sutunlar: List[str],
+    output_lang: str = "tr",
+    gemini_output: Dict[str, Any] | None = None,
+) -> Tuple[int, Dict[str, Any]]:
+    """
+    Tek ürünü işler, (idx, flat_result) döner. ThreadPoolExecutor ile paralel çağrılabilir.
+    output_lang: Gemini çıktı dili (tr, en, de, it)
+    gemini_output: urun_isle çıktısı önceden alındıysa (batch modu) tekrar sorulmaz.
+    """
+    from main import urun_isle, gemini_eksik_sutunlar_toplu_sor
+
+    if gemini_output is None:
+        gemini_output = urun_isle(
+            row_dict,
+            eksik_sutunlar=eksik_sutunlar if eksik_sutunlar else None,
+            output_lang=output_lang,
+        )
+    flat_result = _apply_gemini_output(row_dict, gemini_output)
+
+    # Hâlâ boş kalan sütunlar için ek odaklı çağrı (tek çağrı modunda sadece çözülemeyenler)
+    if os.getenv("GEMINI_EKSIK_SUTUN", "1") == "1":
+        kalan_eksik = _remaining_missing(flat_result, eksik_sutunlar)
+        _fill_from_search(row_dict, flat_result, kalan_eksik)
+        kalan_eksik = _followup_columns(gemini_output, kalan_eksik)
+
+        if kalan_eksik:
+            try:
+                job_metrics.incr("followup_calls")
+                ek_doldurma = gemini_eksik_sutunlar_toplu_sor(
+                    urun_adi=row_dict.get("Başlık", ""),
+                    eksik_sutunlar=kalan_eksik,
+                    marka=row_dict.get("Marka"),
+                    output_lang=output_lang,
+                )
+                _apply_fill(flat_result, ek_doldurma)
+            except Exception:
+                pass
+
+    _copy_derived_columns(flat_result)
     return (idx, flat_result)
 
 
+def _process_product_batch(
+    items: List[Tuple[int, Dict[str, Any], List[str]]],
+    output_lang: str = "tr",
+    metrics: JobMetrics | None = None,
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Birden fazla ürünü tek Gemini isteğiyle işler (urun_isle_toplu), sonra her satırı
+    _process_single_product ile tamamlar. Tek satırın hatası diğerlerini etkilemez.
+    metrics: job sayaçları bu thread'e bağlanır (cache hit/miss, API çağrıları).
+    """
+    from main import urun_isle_toplu
+
+    with bind_metrics(metrics):
+        toplu_cikti: Dict[int, Dict[str, Any]] = {}
+        if len(items) > 1:
+            toplu_cikti = urun_isle_toplu(
+                [(idx, row_dict, eksik) for idx, row_dict, eksik in items],
+                output_lang=output_lang,
+            )
+
+        results: List[Tuple[int, Dict[str, Any]]] = []
+        for idx, row_dict, eksik_sutunlar in items:
+            try:
+                results.append(
+                    _process_single_product(
+                        idx, row_dict, eksik_sutunlar, output_lang, gemini_output=toplu_cikti.get(idx)
+                    )
+                )
+            except Exception as e:
+                results.append((idx, _error_row(row_dict, e)))
+        return results
+
+
+def _variant_plan(
+    group: VariantGroup,
+    rep_result: Dict[str, Any] | None,
+) -> Tuple[List[Tuple[int, Dict[str, Any], List[str]]], Dict[int, List[str]]] | None:
+    """
+    Varyant grubu için (Gemini'ye sorulacak varyantlar, idx → farklı sütunlar) döner.
+    Temsilci işlenemediyse None (varyantlar normal işlenir).
+    """
+    if rep_result is None or str(rep_result.get("Warning") or "").startswith("İşleme hatası"):
+        return None
+    _, rep_row, _ = group.representative
+    sorulacak = []
+    farkli_by_idx: Dict[int, List[str]] = {}
+    for idx, row_dict, _ in group.siblings:
+        farkli = differing_columns(rep_row, row_dict)
+        farkli_by_idx[idx] = farkli
+        # Birebir kopya (aynı başlık, farklı alan yok) → hiç sorulmaz
+        if farkli or str(row_dict.get("Başlık") or "").strip() != str(rep_row.get("Başlık") or "").strip():
+            sorulacak.append((idx, row_dict, farkli))
+    return sorulacak, farkli_by_idx
+
+
+def _variant_results(
+    group: VariantGroup,
+    rep_result: Dict[str, Any],
+    farkli_by_idx: Dict[int, List[str]],
+    cevaplar: Dict[int, Dict[str, Any]],
+    sorulacak: List[Tuple[int, Dict[str, Any], List[str]]],
+) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Tuple[int, Dict[str, Any], List[str]]]]:
+    """Cevapları varyantlara uygular; (sonuçlar, cevabı gelmediği için normal işlenecekler) döner."""
+    soruldu = {idx for idx, _, _ in sorulacak}
+    results: List[Tuple[int, Dict[str, Any]]] = []
+    fallback: List[Tuple[int, Dict[str, Any], List[str]]] = []
+    for idx, row_dict, eksik in group.siblings:
+        if idx in soruldu and idx not in cevaplar:
+            fallback.append((idx, row_dict, eksik))
+            continue
+        flat_result = fan_out(rep_result, row_dict, farkli_by_idx[idx], cevaplar.get(idx, {}))
+        # EAN temsilciden gelmez: varyantın boş EAN'ı kendi başlığıyla aranır (_process_single_product gibi)
+        if os.getenv("GEMINI_EKSIK_SUTUN", "1") == "1":
+            _fill_from_search(row_dict, flat_result, missing_identity_columns(flat_result, eksik))
+        _copy_derived_columns(flat_result)
+        results.append((idx, flat_result))
+        job_metrics.incr("coalesced_rows")
+    return results, fallback
+
+
+def _process_variant_group(
+    group: VariantGroup,
+    rep_result: Dict[str, Any] | None,
+    output_lang: str = "tr",
+    metrics: JobMetrics | None = None,
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Temsilcisi işlenmiş bir varyant grubunu tamamlar: temsilci sonucu kopyalanır, farklı alanlar
+    grup başına tek istekte sorulur (main.varyant_farklarini_sor). Cevabı gelmeyenler normal işlenir.
+    """
+    from main import varyant_farklarini_sor
+
+    plan = _variant_plan(group, rep_result)
+    if plan is None:
+        return _process_product_batch(group.siblings, output_lang, metrics)
+    sorulacak, farkli_by_idx = plan
+
+    with bind_metrics(metrics):
+        cevaplar = varyant_farklarini_sor(group.representative[1], rep_result, sorulacak, output_lang) if sorulacak else {}
+        results, fallback = _variant_results(group, rep_result, farkli_by_idx, cevaplar, sorulacak)
+    if fallback:
+        results.extend(_process_product_batch(fallback, output_lang, metrics))
+    return results
+
+
+_HATA_ONEKI = "İşleme hatası:"
+
+
+def _error_row(row_dict: Dict[str, Any], exc: Exception) -> Dict[str, Any]:
+    """Hata olan ürün için orijinal veri + uyarı ile placeholder."""
+    fallback = row_dict.copy()
+    fallback["Warning"] = f"{_HATA_ONEKI} {str(exc)[:150]}"
+    return fallback
+
+
+def _is_error_row(flat_result: Dict[str, Any]) -> bool:
+    """Sonuç _error_row placeholder'ı mı (checkpoint'te failed bayrağı)."""
+    return str(flat_result.get("Warning", "")).startswith(_HATA_ONEKI)
+
+
+def _row_state(flat_result: Dict[str, Any]) -> str:
+    """_error_row placeholder'ı → failed, diğerleri → done."""
+    return FAILED if _is_error_row(flat_result) else DONE
+
+
+def _saved_rows(store: CheckpointStore) -> Tuple[Dict[int, Optional[str]], Dict[int, bool]]:
+    """Checkpoint'teki (index → girdi hash'i, index → hata bayrağı); bayrağı olmayan eski kayıtlar bir kez sınıflandırılır."""
+    store.failed_indices(_is_error_row)
+    return store.input_hashes(), store.failed_flags()
+
+
+def _row_event(idx: int, flat_result: Dict[str, Any]) -> Dict[str, Any]:
+    event: Dict[str, Any] = {"index": idx, "state": _row_state(flat_result), "sku": flat_result.get("SHOP_SKU")}
+    if event["state"] == FAILED:
+        event["error"] = str(flat_result.get("Warning", ""))[len(_HATA_ONEKI):].strip()
+    return event
+
+
+def _progress_event(progress: Dict[str, int]) -> Dict[str, Any]:
+    processed = progress[DONE] + progress[FAILED]
+    total = progress["total"]
+    return {
+        "total": total,
+        "processed": processed,
+        "percentage": round((processed / total * 100) if total > 0 else 0.0, 1),
+        "rows": {state: progress[state] for state in (PENDING, IN_FLIGHT, DONE, FAILED)},
+    }
+
+
+def _import_legacy_output(job_id: str, df: pd.DataFrame, done: set, store: CheckpointStore) -> int:
+    """
+    Checkpoint öncesi job'un output.xlsx satırlarını SHOP_SKU ile satır index'ine eşleyip
+    checkpoint'e bir kez aktar. Eşleşmeyen (SKU'su yok / tekrar eden) satırlar yeniden işlenir.
+    """
+    if "SHOP_SKU" not in df.columns:
+        return 0
+    existing = pd.read_excel(_output_path(job_id))
+    if "SHOP_SKU" not in existing.columns:
+        return 0
+    skus = df["SHOP_SKU"].astype(str)
+    tekil = skus[~skus.duplicated(keep=False)]
+    index_of = {sku: int(idx) for idx, sku in tekil.items() if int(idx) in done}
+    rows = [
+        (index_of[str(record["SHOP_SKU"])], record)
+        for record in existing.to_dict("records")
+        if str(record.get("SHOP_SKU")) in index_of
+    ]
+    hashes = {idx: row_hash(df.iloc[idx].to_dict()) for idx, _ in rows}
+    return store.put_many(rows, hashes, failed={idx: _is_error_row(record) for idx, record in rows})
+
+
+def _shard_size(job_id: str) -> int:
+    """Shard başına satır (config.json shard_size → JOB_SHARD_SIZE env → 0 = shard yok)."""
+    value = _read_job_config(job_id).get("shard_size")
+    if value is None:
+        value = os.getenv("JOB_SHARD_SIZE", "0")
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _load_job_frame(job_id: str) -> Tuple[pd.DataFrame, List[str]]:
+    """(işlenecek satırlar, orijinal sütunlar); teknik başlık satırı atlanır."""
+    df = job_input.read_input(_job_dir(job_id))
+    # Orijinal sütun başlıklarını ve sırasını koru; dosya yapısına dokunma
+    original_columns = list(df.columns)
+    if _is_technical_header(df):
+        df = df.iloc[1:].reset_index(drop=True)
+    return df, original_columns
+
+
+def _prepare_state(job_id: str, total_rows: int) -> JobStateStore:
+    state_store = _job_state(job_id)
+    # Eski (status.csv'den aktarılan) job'larda teknik satır kayıtlı olabilir: çıkar, yeniden numarala
+    if state_store.progress(job_id)["total"] > total_rows:
+        state_store.drop_first_row(job_id)
+    return state_store
+
+
+def dispatch_job(job_id: str) -> None:
+    """
+    İşlemeyi kuyruğa at: shard boyutu ayarlı ve job daha büyükse satır aralıkları Celery group
+    olarak dağıtılır, finalize_job (chord callback) shard checkpoint'lerini birleştirir.
+    Aksi halde tek process_catalog_job.
+    """
+    size = _shard_size(job_id)
+    total = job_state.get_store().progress(job_id)["total"] if size else 0
+    if not size or total <= size:
+        _enqueue(job_id)
+        return
+    from celery import chord, group
+
+    run_id = _new_run(job_id)
+
+    df, original_columns = _load_job_frame(job_id)
+    _prepare_state(job_id, len(df))
+    store = _checkpoint(job_id)
+    store.set_columns(original_columns)
+    store.close()
+    total = len(df)
+    shards = [(start, min(start + size, total)) for start in range(0, total, size)]
+    _update_job_config(job_id, shards=shards, phase=PHASE_QUEUED)
+    print(f"[Job {job_id}] {len(shards)} shard'a bölündü ({size} satır)", flush=True)
+    priority = _read_job_config(job_id).get("priority")
+    if scheduler_enabled():
+        get_scheduler().enqueue(job_id, priority)
+    chord(
+        group(
+            process_catalog_shard.s(job_id, start, end, run_id).set(priority=celery_priority(priority))
+            for start, end in shards
+        )
+    )(finalize_job.s(job_id, run_id))
+
+
+def _new_run(job_id: str) -> str:
+    """
+    Yeni çalıştırma kimliği (config.json run_id). Kuyrukta kalmış eski görev (ör. duraklatılıp
+    devam ettirilen job'un ilk mesajı) kimliği tutmazsa hiçbir şey yapmadan çıkar; job iki kez işlenmez.
+    """
+    run_id = uuid.uuid4().hex[:12]
+    _update_job_config(job_id, run_id=run_id)
+    return run_id
+
+
+def _stale_run(job_id: str, run_id: str | None) -> bool:
+    if run_id and _read_job_config(job_id).get("run_id") != run_id:
+        print(f"[Job {job_id}] Eski çalıştırma ({run_id}) atlandı", flush=True)
+        return True
+    return False
+
+
+def _enqueue(job_id: str) -> None:
+    """process_catalog_job'u kuyruğa at (ilk kez, scheduler'a yer verdikten veya devam ettirildikten sonra)."""
+    priority = _read_job_config(job_id).get("priority")
+    run_id = _new_run(job_id)
+    _update_job_config(job_id, phase=PHASE_QUEUED)
+    if scheduler_enabled():
+        get_scheduler().enqueue(job_id, priority)
+    process_catalog_job.apply_async((job_id, run_id), priority=celery_priority(priority))
+
+
+def _finish_schedule(job_id: str, metrics: JobMetrics) -> None:
+    """Job bitti / durdu: scheduler kaydını kaldır, kuyruk beklemesini metrics'e ekle."""
+    if not scheduler_enabled():
+        return
+    info = get_scheduler().finish(job_id)
+    if info is not None:
+        metrics.incr("queue_wait_s", info["queue_wait_s"])
+        metrics.incr("sched_slices", info["slices"])
+
+
+def _stop_job(job_id: str, control: str, metrics: JobMetrics | None = None) -> None:
+    """
+    Duraklatma / iptal isteği işlendi (uçuştakiler bitti, checkpoint yazıldı): job'u kuyruktan çıkar
+    ve aşamayı paused / cancelled yap. Bu arada devam ettirildiyse (bayrak temizlendi) yeniden kuyruğa alır.
+    """
+    metrics = metrics if metrics is not None else JobMetrics(_read_job_metrics(job_id))
+    _finish_schedule(job_id, metrics)
+    _write_job_metrics(job_id, metrics)
+    current = job_state.get_store().control(job_id)
+    if current is None and control == PAUSE:
+        _enqueue(job_id)
+        return
+    phase = PHASE_CANCELLED if CANCEL in (control, current) else PHASE_PAUSED
+    _update_job_config(job_id, phase=phase)
+    print(f"[Job {job_id}] {'İptal edildi' if phase == PHASE_CANCELLED else 'Duraklatıldı'}", flush=True)
+
+
+def pause_job(job_id: str) -> Dict[str, Any]:
+    """
+    Duraklat: worker batch aralarında bayrağı görür, yeni batch başlatmaz; uçuştakiler tamamlanıp
+    checkpoint'e yazılır (aşama processing → paused). Kuyrukta bekleyen job hemen paused olur.
+    """
+    phase = _read_job_config(job_id).get("phase")
+    if phase in (PHASE_COMPLETE, PHASE_FAILED, PHASE_CANCELLED):
+        raise ValueError(f"Job is {phase}")
+    if phase in (PHASE_UPLOADED, PHASE_PARSING):
+        raise ValueError("Job has not been parsed yet")
+    job_state.get_store().set_control(job_id, PAUSE)
+    if phase == PHASE_QUEUED:
+        _stop_job(job_id, PAUSE)
+    return read_job_status(job_id)
+
+
+def resume_job(job_id: str) -> Dict[str, Any]:
+    """Devam: bayrağı temizle; durmuş job yeniden kuyruğa alınır ve checkpoint'ten kaldığı yerden sürer."""
+    config = _read_job_config(job_id)
+    phase = config.get("phase")
+    if phase == PHASE_CANCELLED:
+        raise ValueError("Job is cancelled")
+    store = job_state.get_store()
+    if store.control(job_id) is None and phase != PHASE_PAUSED:
+        return read_job_status(job_id)
+    store.set_control(job_id, None)
+    # processing: worker henüz boşalmadıysa bayrağın kalktığını görüp devam eder (_stop_job)
+    if phase == PHASE_PAUSED:
+        dispatch_job(job_id)
+    return read_job_status(job_id)
+
+
+def cancel_job(job_id: str) -> Dict[str, Any]:
+    """
+    İptal: yeni batch başlamaz, uçuştakiler checkpoint'e yazılır; o ana kadarki sonuçlar indirilebilir.
+    İptal edilen job devam ettirilemez.
+    """
+    phase = _read_job_config(job_id).get("phase")
+    if phase in (PHASE_COMPLETE, PHASE_FAILED, PHASE_CANCELLED):
+        raise ValueError(f"Job is {phase}")
+    if phase in (PHASE_UPLOADED, PHASE_PARSING):
+        # Henüz satır yok: prepare_job ayrıştırma sonunda aşamayı görür, işlemeyi başlatmaz
+        _update_job_config(job_id, phase=PHASE_CANCELLED)
+        return read_job_status(job_id)
+    job_state.get_store().set_control(job_id, CANCEL)
+    if phase in (PHASE_QUEUED, PHASE_PAUSED):
+        _stop_job(job_id, CANCEL)
+    return read_job_status(job_id)
+
+
+def _merge_shards(job_id: str) -> int:
+    """
+    Shard checkpoint'lerini ve sayaçlarını ana checkpoint / metrics.json'a aktar, shard dosyalarını sil.
+    Aktarılan satır sayısını döner.
+    """
+    shard_dir = _shard_dir(job_id)
+    if not shard_dir.is_dir():
+        return 0
+    merged = 0
+    store = _checkpoint(job_id)
+    try:
+        for path in sorted(shard_dir.glob("*.sqlite")):
+            shard_store = CheckpointStore(path)
+            hashes = shard_store.input_hashes()
+            changes = shard_store.changes()
+            merged += store.put_many(
+                shard_store.items(),
+                {i: h for i, h in hashes.items() if h},
+                {i: c for i, c in changes.items() if c is not None},
+                shard_store.failed_flags(),
+            )
+            shard_store.close()
+    finally:
+        store.close()
+    # Sayaçlar: önce shard dosyaları silinir (okuyan aynı sayacı iki kez saymasın), sonra ana dosya yazılır
+    metrics = JobMetrics(_read_job_metrics(job_id))
+    for path in shard_dir.iterdir():
+        path.unlink()
+    shard_dir.rmdir()
+    _write_job_metrics(job_id, metrics)
+    return merged
+
+
+@celery_app.task(name="finalize_job")
+def finalize_job(shard_results: List[Dict[str, Any]], job_id: str, run_id: str | None = None) -> Dict[str, Any]:
+    """Chord callback: shard checkpoint'lerini birleştir, output.xlsx'i bir kez yaz."""
+    if _stale_run(job_id, run_id):
+        return read_job_status(job_id)
+    merged = _merge_shards(job_id)
+    print(f"[Job {job_id}] {len(shard_results or [])} shard birleştirildi ({merged} satır)", flush=True)
+    progress = job_state.get_store().progress(job_id)
+    if progress[DONE] + progress[FAILED] < progress["total"]:
+        # Shard'lar duraklatma / iptal isteğiyle erken döndü. Bayrak bu arada kalktıysa (shard'lar
+        # boşalırken devam ettirildi) _stop_job kalan satırları yeniden kuyruğa alır; job tamamlanmaz.
+        control = job_state.get_store().control(job_id)
+        _stop_job(job_id, PAUSE if control is None else control)
+        return read_job_status(job_id)
+    store = _checkpoint(job_id)
+    store.materialize(_output_path(job_id))
+    store.close()
+    job_state.get_store().set_control(job_id, None)
+    metrics = JobMetrics(_read_job_metrics(job_id))
+    _finish_schedule(job_id, metrics)
+    _write_job_metrics(job_id, metrics)
+    _update_job_config(job_id, phase=PHASE_COMPLETE)
+    return read_job_status(job_id)
+
+
+@celery_app.task(name="process_catalog_shard")
+def process_catalog_shard(job_id: str, start: int, end: int, run_id: str | None = None) -> Dict[str, Any]:
+    """Celery task for one row range [start, end) of a sharded job (see dispatch_job)."""
+    if _stale_run(job_id, run_id):
+        return {"job_id": job_id, "shard": [start, end], "processed": 0}
+    return _process_rows(job_id, (int(start), int(end)))
+
+
 @celery_app.task(name="process_catalog_job")
-def process_catalog_job(job_id: str) -> Dict[str, Any]:
+def process_catalog_job(
+    job_id: str,
+    run_id: str | None = None,
+    workers: int | None = None,
+    engine: str | None = None,
+) -> Dict[str, Any]:
     """
     Celery task that processes a single Excel upload job.
-    Progress is tracked via a per-row CSV; Streamlit/FastAPI poll for status.
-    Uses ThreadPoolExecutor for parallel product processing (GEMINI_PARALLEL_WORKERS, default 5).
+    Progress is tracked per row in the job-state store (job_state.py); Streamlit/FastAPI poll for status.
+    Row results are appended to checkpoint.sqlite; output.xlsx is written once at the end
+    (or on download via materialize_output).
+    Runs on the asyncio engine by default; GEMINI_ENGINE=thread falls back to ThreadPoolExecutor.
+    Concurrency is adaptive (concurrency.AIMDController), starting at GEMINI_PARALLEL_WORKERS.
+    Large jobs can instead be split into shards across workers (dispatch_job, JOB_SHARD_SIZE).
+    Pause / cancel requests (pause_job, cancel_job) are honoured between batches.
+    run_id: set by _enqueue; a stale queued message (job resumed meanwhile) exits without work.
+    workers / engine: per-call overrides of GEMINI_PARALLEL_WORKERS (start and ceiling) and
+    GEMINI_ENGINE, e.g. from the CLI, without touching the process environment.
+    """
+    if _stale_run(job_id, run_id):
+        return read_job_status(job_id)
+    # Yarım kalmış shard'lı çalışma varsa önce birleştir; kalan satırlar burada tamamlanır
+    _merge_shards(job_id)
+    return _process_rows(job_id, workers=workers, engine=engine)
+
+
+def _process_rows(
+    job_id: str,
+    shard: Shard | None = None,
+    workers: int | None = None,
+    engine: str | None = None,
+) -> Dict[str, Any]:
+    """
+    process_catalog_job / process_catalog_shard gövdesi. shard=(start, end) verilirse sadece bu
+    satırlar işlenir; sonuçlar ve sayaçlar shard'a özel dosyalara yazılır (finalize_job birleştirir).
+    workers / engine: verilirse env ayarlarının (GEMINI_PARALLEL_WORKERS, GEMINI_ENGINE) yerine geçer.
     """
     import sys
     _project_root = Path(__file__).resolve().parent
     if str(_project_root) not in sys.path:
         sys.path.insert(0, str(_project_root))
 
-    input_file = _input_path(job_id)
-    status_file = _status_path(job_id)
-
-    if not input_file.exists():
+    if not job_input.input_exists(_job_dir(job_id)):
         raise FileNotFoundError(f"Input file not found for job {job_id}")
 
     output_lang = _read_job_language(job_id)
-    df = pd.read_excel(input_file)
+    metrics = JobMetrics(_read_job_metrics(job_id, shard))
+    # Log etiketi: shard'lı çalışmada aynı job'un satırları birden çok worker'da
+    etiket = f"Job {job_id}" + (f" shard {_shard_name(shard)}" if shard else "")
+    control = job_state.get_store().control(job_id)
+    if control is not None:
+        # Kuyruktayken duraklatıldı / iptal edildi
+        if shard is None and _read_job_config(job_id).get("phase") not in (PHASE_PAUSED, PHASE_CANCELLED):
+            _stop_job(job_id, control, metrics)
+        return read_job_status(job_id) if shard is None else {"job_id": job_id, "shard": list(shard), "processed": 0}
+    _update_job_config(job_id, phase=PHASE_PROCESSING)
+    sched = get_scheduler() if scheduler_enabled() else None
+    if sched is not None:
+        waited = sched.start(job_id)
+        if waited >= 1:
+            print(f"[{etiket}] Kuyrukta {waited:.0f} sn bekledi", flush=True)
+    df, original_columns = _load_job_frame(job_id)
     total_rows = len(df)
-    # Orijinal sütun başlıklarını ve sırasını koru; dosya yapısına dokunma
-    original_columns = list(df.columns)
-    print(f"[Job {job_id}] Başladı: toplam {total_rows} ürün (paralel workers: {os.getenv('GEMINI_PARALLEL_WORKERS', '10')})", flush=True)
-
-    # Skip technical header row if present
-    if total_rows > 0 and "Başlık" in df.columns:
-        first_title = str(df.iloc[0].get("Başlık", ""))
-        if first_title.startswith("TITLE"):
-            df = df.iloc[1:].reset_index(drop=True)
-            total_rows = len(df)
-
-    status_df = pd.read_csv(status_file)
-    # Teknik satır atlandıysa status'tan da ilk satırı at, yeniden numarala (toplam 1 fazla görünmesin, %100 tamamlansın)
-    if len(status_df) > total_rows:
-        status_df = status_df.iloc[1:].reset_index(drop=True)
-        status_df["index"] = range(len(status_df))
-        status_df.to_csv(status_file, index=False)
-    proc = status_df["processed"]
-    is_done = (proc == True) | (proc.astype(str).str.lower() == "true")
-    processed_indices = set(int(x) for x in status_df.loc[is_done, "index"].tolist())
-
-    # results_by_idx: index -> flat_result (orijinal sırayı korumak için)
+
+    if shard is None:
+        state_store = _prepare_state(job_id, total_rows)
+        row_range = range(total_rows)
+    else:
+        state_store = _job_state(job_id)
+        row_range = range(shard[0], min(shard[1], total_rows))
+    print(f"[{etiket}] Başladı: toplam {len(row_range)} ürün", flush=True)
+    processed_indices = state_store.indices(job_id, [DONE, FAILED])
+
+    # Sonuçlar checkpoint.sqlite'a (shard'da shards/<start>-<end>.sqlite) satır satır eklenir
+    # (index → flat_result + girdi hash'i)
+    main_store = _checkpoint(job_id)
+    if shard is None:
+        store = main_store
+        store.set_columns(original_columns)
+        if store.count() == 0 and processed_indices and _output_path(job_id).exists():
+            _import_legacy_output(job_id, df, processed_indices, store)
+        saved_hashes, saved_failed = _saved_rows(store)
+    else:
+        store = CheckpointStore(_shard_dir(job_id) / f"{_shard_name(shard)}.sqlite")
+        # Önceki (shard'sız veya birleştirilmiş) çalışmanın sonuçları ana checkpoint'te
+        main_hashes, main_failed = _saved_rows(main_store)
+        shard_hashes, shard_failed = _saved_rows(store)
+        saved_hashes = {**main_hashes, **shard_hashes}
+        saved_failed = {**main_failed, **shard_failed}
+    # Devam: checkpoint'te başarılı kaydı olan ve girdisi değişmemiş satırlar atlanır (satır başına O(1)
+    # sözlük araması; önceki çıktı okunmaz). Kalanlar - in_flight'ta kalmışlar ve hata placeholder'ı
+    # kaydedilmişler (geçici 429 / zaman aşımı) dahil - yeniden işlenir.
+    input_hashes: Dict[int, str] = {}
+    processed_indices = set()
+    # Bu çalışmada işlenenler (varyant grupları temsilcinin sonucunu buradan okur)
     results_by_idx: Dict[int, Dict[str, Any]] = {}
-    if _output_path(job_id).exists():
-        existing = pd.read_excel(_output_path(job_id))
-        existing_records = existing.to_dict("records")
-        sorted_done = sorted(processed_indices)
-        for i, idx in enumerate(sorted_done):
-            if i < len(existing_records):
-                results_by_idx[idx] = existing_records[i]
 
     # İşlenecek ürünleri topla: (idx, row_dict, eksik_sutunlar)
     atlanacak_sutunlar = {"Başlık", "SHOP_SKU", "Warning", "Uyari", "Kategori"}
     to_process: List[Tuple[int, Dict[str, Any], List[str]]] = []
-    for idx, row in df.iterrows():
+    for idx, row in df.iloc[row_range.start:row_range.stop].iterrows():
         idx = int(idx)
-        if idx in processed_indices:
-            continue
         row_dict = row.to_dict()
+        input_hashes[idx] = row_hash(row_dict)
+        if (
+            idx in saved_hashes
+            and saved_hashes[idx] in (None, input_hashes[idx])
+            and not saved_failed.get(idx)
+        ):
+            processed_indices.add(idx)
+            continue
         eksik_sutunlar = []
         if os.getenv("GEMINI_EKSIK_SUTUN", "1") == "1":
             for sutun_adi in row_dict.keys():
@@ -364,48 +1210,206 @@ def process_catalog_job(job_id: str) -> Dict[str, Any]:
                 eksik_sutunlar.append(sutun_adi)
         to_process.append((idx, row_dict, eksik_sutunlar))
 
-    parallel_workers = int(os.getenv("GEMINI_PARALLEL_WORKERS", "10"))
-    parallel_workers = max(1, min(parallel_workers, 15))
+    in_range = set(row_range)
+    started = state_store.indices(job_id, [IN_FLIGHT, DONE, FAILED]) & in_range
+    state_store.set_state(job_id, started - processed_indices, PENDING)
+    state_store.set_state(job_id, processed_indices - state_store.indices(job_id, [DONE, FAILED]), DONE)
+    if processed_indices:
+        print(f"[{etiket}] Devam: {len(processed_indices)} ürün checkpoint'te, {len(to_process)} ürün işlenecek", flush=True)
+
+    # Kategori bazlı sütun budama: sadece satırın kategorisiyle ilgili boş sütunlar sorulur
+    relevance = build_relevance_map(df) if to_process else None
+    if relevance:
+        from main import _urun_girdisi_hazirla
+
+        def _prompt_chars(row_dict: Dict[str, Any], eksik: List[str]) -> int:
+            veri = _urun_girdisi_hazirla(row_dict, eksik or None, output_lang)
+            return len(json.dumps(veri, ensure_ascii=False, default=str))
+
+        pruned: List[Tuple[int, Dict[str, Any], List[str]]] = []
+        for idx, row_dict, eksik_sutunlar in to_process:
+            kalan = relevance.prune(row_dict, eksik_sutunlar)
+            metrics.incr("missing_columns_before", len(eksik_sutunlar))
+            metrics.incr("missing_columns_after", len(kalan))
+            metrics.incr("prompt_chars_before", _prompt_chars(row_dict, eksik_sutunlar))
+            metrics.incr("prompt_chars_after", _prompt_chars(row_dict, kalan))
+            pruned.append((idx, row_dict, kalan))
+        to_process = pruned
+        print(
+            f"[{etiket}] Sütun budama ({relevance.source}): prompt "
+            f"{int(metrics.get('prompt_chars_before')):,} → {int(metrics.get('prompt_chars_after')):,} karakter",
+            flush=True,
+        )
+
+    # Varyant gruplama: aynı marka + model kodu + normalize başlık → temsilci tam işlenir,
+    # varyantlar temsilcinin sonucundan uyarlanır (sadece farklı alanlar sorulur)
+    primary_items = to_process
+    groups: List[VariantGroup] = []
+    if coalesce_enabled():
+        primary_items, groups = group_items(to_process)
+        if groups:
+            print(
+                f"[{etiket}] Varyant gruplama: {len(groups)} grup, "
+                f"{sum(len(g.siblings) for g in groups)} ürün temsilciden uyarlanacak",
+                flush=True,
+            )
 
-    with ThreadPoolExecutor(max_workers=parallel_workers) as executor:
-        futures = {
-            executor.submit(_process_single_product, idx, row_dict, eksik_sutunlar, output_lang): idx
-            for idx, row_dict, eksik_sutunlar in to_process
+    # Batch modu: batch_size ürün tek Gemini isteğinde (config.json / GEMINI_BATCH_SIZE)
+    batch_size = _read_job_batch_size(job_id)
+    batches = [primary_items[i:i + batch_size] for i in range(0, len(primary_items), batch_size)]
+    if batch_size > 1:
+        print(f"[{etiket}] Batch modu: istek başına {batch_size} ürün ({len(batches)} istek)", flush=True)
+
+    batch_count = 0
+    last_flush = 0
+
+    def _on_batch(items: List[Tuple[int, Dict[str, Any], List[str]]], batch_results: List[Tuple[int, Dict[str, Any]]]) -> None:
+        nonlocal batch_count, last_flush
+        for idx, flat_result in batch_results:
+            results_by_idx[idx] = flat_result
+            processed_indices.add(idx)
+        row_by_idx = {idx: row_dict for idx, row_dict, _ in items}
+        changes = {
+            idx: changed_columns(row_by_idx[idx], flat_result)
+            for idx, flat_result in batch_results if idx in row_by_idx
         }
-        batch_count = 0
-        for future in as_completed(futures):
-            try:
-                idx, flat_result = future.result()
-                results_by_idx[idx] = flat_result
-                processed_indices.add(idx)
-                batch_count += 1
-                if batch_count % 10 == 0 or batch_count == len(to_process):
-                    print(f"[Job {job_id}] İşlendi: {len(results_by_idx)}/{total_rows}", flush=True)
-            except Exception as e:
-                orig_idx = futures[future]
-                print(f"[Job {job_id}] Hata (index={orig_idx}): {str(e)[:100]}", flush=True)
-                # Hata olan ürün için orijinal veri + uyarı ile placeholder ekle
-                for tidx, trow, _ in to_process:
-                    if tidx == orig_idx:
-                        fallback = trow.copy()
-                        fallback["Warning"] = f"İşleme hatası: {str(e)[:150]}"
-                        results_by_idx[orig_idx] = fallback
-                        break
-
-            # Her batch sonrası status ve Excel güncelle (her 10 üründe veya tamamlandığında)
-            if batch_count % 10 == 0 or batch_count == len(to_process):
-                status_df.loc[status_df["index"].isin(results_by_idx.keys()), "processed"] = True
-                status_df.to_csv(status_file, index=False)
-                ordered = [results_by_idx[i] for i in sorted(results_by_idx.keys())]
-                if ordered:
-                    out_df = pd.DataFrame(ordered).reindex(columns=original_columns)
-                    out_df.to_excel(_output_path(job_id), index=False)
-
-    # Son Excel yazımı (orijinal sütun başlıkları ve sırası korunur)
-    if results_by_idx:
-        ordered = [results_by_idx[i] for i in sorted(results_by_idx.keys())]
-        out_df = pd.DataFrame(ordered).reindex(columns=original_columns)
-        out_df.to_excel(_output_path(job_id), index=False)
+        by_state: Dict[str, List[int]] = {DONE: [], FAILED: []}
+        for idx, flat_result in batch_results:
+            by_state[_row_state(flat_result)].append(idx)
+        failed = {idx: row_state == FAILED for row_state, indices in by_state.items() for idx in indices}
+        store.put_many(batch_results, input_hashes, changes, failed)
+        for row_state, indices in by_state.items():
+            state_store.set_state(job_id, indices, row_state)
+        # SSE (GET /jobs/{id}/events): satır tamamlanmaları + hata mesajları, ardından sayaç özeti
+        job_events.publish(job_id, "rows", rows=[_row_event(idx, flat_result) for idx, flat_result in batch_results])
+        job_events.publish(job_id, "progress", **_progress_event(state_store.progress(job_id)))
+        if sched is not None:
+            sched.charge(job_id, len(batch_results))
+        batch_count += len(items)
+        if batch_count - last_flush >= 10 or batch_count == len(to_process):
+            print(f"[{etiket}] İşlendi: {len(processed_indices)}/{len(row_range)}", flush=True)
+
+        # Metrikleri yaz (her 10 üründe veya tamamlandığında); Excel sadece job sonunda yazılır
+        if batch_count - last_flush >= 10 or batch_count == len(to_process):
+            last_flush = batch_count
+            _write_job_metrics(job_id, metrics, shard)
+
+    def _on_start(items: List[Tuple[int, Dict[str, Any], List[str]]]) -> None:
+        state_store.set_state(job_id, [idx for idx, _, _ in items], IN_FLIGHT)
+
+    # Her batch başlamadan önce kontrol edilir (scheduler en fazla saniyede bir):
+    # - pause / cancel bayrağı (POST /jobs/{id}/pause|cancel) → yeni batch başlamaz, uçuştakiler yazılır
+    # - adil paylaşım: daha az hizmet almış bir job kuyrukta bekliyorsa yer ver. Shard'lar yer vermez
+    #   (chord, grubun tüm görevlerinin bitmesini bekler); zaten kısa iş birimleridir.
+    stop_reason: str | None = None
+    last_check = time.monotonic()
+
+    def _should_stop() -> bool:
+        nonlocal stop_reason, last_check
+        if stop_reason is None:
+            stop_reason = state_store.control(job_id)
+        if stop_reason is None and sched is not None and shard is None and time.monotonic() - last_check >= 1.0:
+            last_check = time.monotonic()
+            if sched.should_yield(job_id):
+                stop_reason = "yield"
+        return stop_reason is not None
+
+    # GEMINI_ENGINE=async (varsayılan): tek event loop, yüzlerce eşzamanlı istek.
+    # GEMINI_ENGINE=thread: eski ThreadPoolExecutor yolu.
+    # Her iki yolda da eşzamanlılık AIMD controller ile ayarlanır (GEMINI_PARALLEL_WORKERS = başlangıç).
+    engine = (engine or os.getenv("GEMINI_ENGINE", "async")).strip().lower()
+    if engine == "async":
+        from async_engine import run_batches, async_concurrency, process_variant_group_async
+
+        controller = controller_from_env(metrics, maximum=async_concurrency(), workers=workers)
+        print(f"[{etiket}] asyncio motoru (eşzamanlılık: {controller.limit}, üst sınır {controller.maximum})", flush=True)
+    else:
+        controller = controller_from_env(metrics, maximum=64, workers=workers)
+        gate = ThreadGate(controller)
+
+    def _run_engine(run_batches_list, process, process_async=None) -> None:
+        if engine == "async":
+            run_batches(
+                run_batches_list, output_lang, metrics, _on_batch, controller,
+                process=process_async, on_start=_on_start, should_stop=_should_stop,
+            )
+            return
+
+        def _gated_batch(items: List[Tuple[int, Dict[str, Any], List[str]]]) -> List[Tuple[int, Dict[str, Any]]] | None:
+            with gate:
+                if _should_stop():
+                    return None
+                _on_start(items)
+                return process(items)
+
+        with ThreadPoolExecutor(max_workers=controller.maximum) as executor:
+            futures = {executor.submit(_gated_batch, items): items for items in run_batches_list}
+            for future in as_completed(futures):
+                items = futures[future]
+                try:
+                    batch_results = future.result()
+                except Exception as e:
+                    print(f"[{etiket}] Hata (index={[i for i, _, _ in items]}): {str(e)[:100]}", flush=True)
+                    # Hata olan ürünler için orijinal veri + uyarı ile placeholder ekle
+                    batch_results = [(tidx, _error_row(trow, e)) for tidx, trow, _ in items]
+                if batch_results is not None:
+                    _on_batch(items, batch_results)
+
+    calls_before = metrics.get("api_calls")
+    _run_engine(batches, lambda items: _process_product_batch(items, output_lang, metrics))
+
+    if groups and stop_reason is None:
+        # Varyantlar: grup başına bir iş; temsilcinin sonucu results_by_idx'te hazır
+        calls_primary = metrics.get("api_calls") - calls_before
+        group_by_first = {g.siblings[0][0]: g for g in groups}
+
+        def _group_of(items):
+            group = group_by_first[items[0][0]]
+            rep_idx = group.representative[0]
+            return group, results_by_idx.get(rep_idx) or store.get(rep_idx) or main_store.get(rep_idx)
+
+        async def _variant_async(items):
+            return await process_variant_group_async(*_group_of(items), output_lang, metrics)
+
+        _run_engine(
+            [g.siblings for g in groups],
+            lambda items: _process_variant_group(*_group_of(items), output_lang, metrics),
+            _variant_async if engine == "async" else None,
+        )
+        # Tasarruf: varyantlar tek tek işlenseydi temsilci başına ortalama çağrı kadar tutacaktı
+        calls_variants = metrics.get("api_calls") - calls_before - calls_primary
+        siblings = sum(len(g.siblings) for g in groups)
+        per_row = calls_primary / len(primary_items) if primary_items else 1.0
+        saved = max(0, round(per_row * siblings - calls_variants))
+        metrics.incr("coalesce_groups", len(groups))
+        metrics.incr("coalesce_calls_saved", saved)
+        print(f"[{etiket}] Varyant gruplama: {siblings} ürün için {calls_variants} çağrı (~{saved} çağrı tasarruf)", flush=True)
+
+    if stop_reason is not None and shard is None:
+        # Kalan satırlar checkpoint'ten devam eder; Excel yazılmaz (indirme anında materialize edilir)
+        store.close()
+        if stop_reason == "yield":
+            _write_job_metrics(job_id, metrics)
+            print(f"[{etiket}] Sırasını bekleyen job'a yer verdi: {len(processed_indices)}/{total_rows} işlendi", flush=True)
+            _enqueue(job_id)
+        else:
+            _stop_job(job_id, stop_reason, metrics)
+        return read_job_status(job_id)
+
+    if shard is not None:
+        # Shard: birleştirme ve Excel yazımı finalize_job'da
+        store.close()
+        main_store.close()
+        _write_job_metrics(job_id, metrics, shard)
+        return {"job_id": job_id, "shard": list(shard), "processed": len(processed_indices)}
+
+    # Son Excel yazımı: checkpoint'ten bir kez (orijinal sütun başlıkları ve sırası korunur)
+    store.materialize(_output_path(job_id), original_columns)
+    store.close()
+    state_store.set_control(job_id, None)
+    _finish_schedule(job_id, metrics)
+    _update_job_config(job_id, phase=PHASE_COMPLETE)
+    _write_job_metrics(job_id, metrics)
 
     return read_job_status(job_id)
 
@@ -0,0 +1,25 @@
+"""
+Test ortamı: sahte LLM backend'i (llm_backend.py, LLM_BACKEND=mock), bellek içi rate limiter ve
+geçici bir jobs dizini. Değişkenler modüller import edilmeden önce ayarlanır (tasks JOBS_DIR'i import'ta okur).
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_JOBS_DIR = tempfile.mkdtemp(prefix="catalog-tests-")
+os.environ.update({
+    "LLM_BACKEND": "mock",
+    "MOCK_LLM_LATENCY": "0",
+    "MOCK_LLM_429_RATE": "0",
+    "GEMINI_CACHE": "0",
+    "WEB_SEARCH": "0",
+    "GEMINI_RATE_LIMIT": "memory",
+    "JOB_EVENTS": "off",
+    "JOB_SCHEDULER": "0",
+    "JOBS_BASE_DIR": _JOBS_DIR,
+    "JOB_STATE_PATH": os.path.join(_JOBS_DIR, "jobs.sqlite"),
+})
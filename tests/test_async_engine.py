@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import time
+
+from async_engine import run_batches
+
+
+def test_callbacks_do_not_block_the_event_loop():
+    started = []
+    finished = {}
+    callbacks = []
+
+    async def process(items):
+        idx = items[0][0]
+        started.append(time.monotonic())
+        await asyncio.sleep(0 if idx == 0 else 0.1)
+        finished[idx] = time.monotonic() - started[0]
+        return [(idx, {"i": idx})]
+
+    def on_batch(items, results):
+        callbacks.append((items[0][0], threading.current_thread().name))
+        if items[0][0] == 0:
+            time.sleep(0.5)  # yavaş checkpoint yazımı
+
+    batches = [[(i, {}, [])] for i in range(4)]
+    run_batches(batches, "tr", None, on_batch, process=process)
+    assert finished[1] < 0.4 and finished[3] < 0.4
+    assert sorted(i for i, _ in callbacks) == [0, 1, 2, 3]
+    assert all(name != threading.current_thread().name for _, name in callbacks)
+
+
+def test_on_start_runs_before_on_batch_and_stop_skips_rest():
+    events = []
+    stop = {"now": False}
+
+    async def process(items):
+        stop["now"] = True
+        return [(items[0][0], {})]
+
+    def should_stop():
+        return stop["now"]
+
+    from concurrency import AIMDController
+
+    run_batches(
+        [[(i, {}, [])] for i in range(3)], "tr", None,
+        lambda items, results: events.append(("batch", items[0][0])),
+        controller=AIMDController(initial=1, maximum=1, adaptive=False),
+        process=process,
+        on_start=lambda items: events.append(("start", items[0][0])),
+        should_stop=should_stop,
+    )
+    assert events == [("start", 0), ("batch", 0)]
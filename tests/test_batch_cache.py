@@ -0,0 +1,40 @@
+import benchmark
+import gemini_cache
+import main
+
+ROWS = [row.to_dict() for _, row in benchmark.synthetic_catalog(5).iterrows()]
+
+
+class _CountingModel:
+    """main.model sarmalayıcı: gönderilen prompt'ları kaydeder."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.model_name = getattr(inner, "model_name", main._model_name)
+        self.prompts = []
+
+    def generate_content(self, contents, **kwargs):
+        self.prompts.append(contents)
+        return self.inner.generate_content(contents, **kwargs)
+
+
+def test_batch_cache_is_per_product(monkeypatch, tmp_path):
+    monkeypatch.setenv("GEMINI_CACHE", "1")
+    monkeypatch.setenv("GEMINI_CACHE_PATH", str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(gemini_cache, "_cache", None)
+    counting = _CountingModel(main.model)
+    monkeypatch.setattr(main, "model", counting)
+
+    first = main.urun_isle_toplu([(i, row, []) for i, row in enumerate(ROWS[:3])])
+    assert len(counting.prompts) == 1
+
+    # Başa satır eklendi: index'ler ve batch'ler kaydı; önceki ürünler cache'ten gelir, istek sadece yeniyle kurulur
+    counting.prompts.clear()
+    shifted = main.urun_isle_toplu([(i + 1, row, []) for i, row in enumerate([ROWS[3], *ROWS[:3]])])
+    assert [shifted[i + 1] for i in range(1, 4)] == [first[i] for i in range(3)]
+    assert len(counting.prompts) == 1 and ROWS[0]["Başlık"] not in counting.prompts[0]
+
+    # Farklı batch bölümlemesi: hepsi cache'te, istek yok
+    counting.prompts.clear()
+    assert main.urun_isle_toplu([(9, ROWS[1], []), (7, ROWS[3], [])]) == {9: first[1], 7: shifted[1]}
+    assert counting.prompts == []
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from checkpoint import CheckpointStore, changed_columns, row_hash
+
+ROWS = [{"SHOP_SKU": f"SKU{i}", "Başlık": f"ürün {i}", "Fiyat": float(i), "Renk": None} for i in range(5)]
+
+
+def _store(tmp_path):
+    store = CheckpointStore(tmp_path / "checkpoint.sqlite")
+    results = [(i, {**row, "Renk": "Siyah"} if i % 2 else dict(row)) for i, row in enumerate(ROWS)]
+    store.put_many(
+        results,
+        {i: row_hash(row) for i, row in enumerate(ROWS)},
+        {i: changed_columns(ROWS[i], result) for i, result in results},
+    )
+    return store
+
+
+def test_put_page_drop_round_trip(tmp_path):
+    store = _store(tmp_path)
+    assert store.count() == 5 and store.get(3)["Renk"] == "Siyah"
+    assert store.input_hashes() == {i: row_hash(row) for i, row in enumerate(ROWS)}
+    # Hash sütun sırasından bağımsız
+    assert row_hash(dict(reversed(list(ROWS[0].items())))) == row_hash(ROWS[0])
+
+    total, page = store.page(offset=1, limit=2)
+    assert total == 5 and [idx for idx, _, _ in page] == [1, 2]
+    assert page[0][2] == ["Renk"] and page[1][2] == []
+    total, page = store.page(only_changed=True)
+    assert total == 2 and [idx for idx, _, _ in page] == [1, 3]
+
+    # Aynı index tekrar yazılırsa son sonuç geçerli
+    store.put_many([(1, {**ROWS[1], "Renk": "Beyaz"})])
+    assert store.get(1)["Renk"] == "Beyaz" and [idx for idx, _ in store.recent(1)] == [1]
+
+    assert store.drop_from(3) == 2
+    assert sorted(store.indices()) == [0, 1, 2] and store.get(4) is None
+    assert store.drop_from(3) == 0
+    store.close()
+
+
+@pytest.mark.parametrize("writer", ["stream", "pandas"])
+def test_materialize_writes_columns_in_order(tmp_path, writer):
+    store = _store(tmp_path)
+    store.set_columns(["SHOP_SKU", "Başlık", "Renk", "Fiyat"])
+    out = tmp_path / f"out-{writer}.xlsx"
+    assert store.materialize(out, writer=writer)
+    df = pd.read_excel(out)
+    assert list(df.columns) == ["SHOP_SKU", "Başlık", "Renk", "Fiyat"]
+    assert df["SHOP_SKU"].tolist() == [f"SKU{i}" for i in range(5)]
+    assert df["Renk"].isna().tolist() == [True, False, True, False, True]
+    assert df["Fiyat"].tolist() == [0, 1, 2, 3, 4]
+
+    # Yeni satır yoksa dosyaya dokunulmaz; yeni satırla yeniden yazılır
+    assert not store.materialize(out, writer=writer)
+    store.put_many([(5, {"SHOP_SKU": "SKU5", "Başlık": "yeni"})])
+    assert store.materialize(out, writer=writer)
+    assert len(pd.read_excel(out)) == 6
+    store.close()
+
+
+def test_materialize_empty_store_writes_nothing(tmp_path):
+    store = CheckpointStore(tmp_path / "checkpoint.sqlite")
+    assert not store.materialize(tmp_path / "out.xlsx")
+    assert not (tmp_path / "out.xlsx").exists()
+    store.close()
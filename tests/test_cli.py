@@ -0,0 +1,91 @@
+import pandas as pd
+
+import benchmark
+import cli
+import tasks
+
+
+def _clean(tmp_path, rows, name="in.xlsx"):
+    source = tmp_path / name
+    benchmark.synthetic_catalog(rows).to_excel(source, index=False)
+    return cli.clean_file(str(source), str(tmp_path / "out.xlsx"), workers=4, batch_size=2)
+
+
+def test_shorter_input_drops_stale_rows(tmp_path):
+    assert _clean(tmp_path, 8)["phase"] == tasks.PHASE_COMPLETE
+    assert len(pd.read_excel(tmp_path / "out.xlsx")) == 8
+
+    status = _clean(tmp_path, 3)
+    assert status["phase"] == tasks.PHASE_COMPLETE
+    assert len(pd.read_excel(tmp_path / "out.xlsx")) == 3
+    job_id = cli.local_job_id(str(tmp_path / "out.xlsx"))
+    assert tasks.read_job_rows(job_id)["total"] == 3
+
+
+def test_rerun_resumes_from_checkpoint(tmp_path):
+    _clean(tmp_path, 6)
+    job_id = cli.local_job_id(str(tmp_path / "out.xlsx"))
+    before = tasks._read_job_metrics(job_id).get("api_calls", 0)
+    assert _clean(tmp_path, 6)["phase"] == tasks.PHASE_COMPLETE
+    assert tasks._read_job_metrics(job_id).get("api_calls", 0) == before
+    assert len(pd.read_excel(tmp_path / "out.xlsx")) == 6
+
+
+def test_legacy_checkpoint_is_limited_to_input_rows(tmp_path):
+    from checkpoint import CheckpointStore
+
+    legacy = CheckpointStore(tmp_path / "out.xlsx.checkpoint.sqlite")
+    legacy.put_many([(i, {"SHOP_SKU": f"ESKI{i}"}) for i in range(5)])
+    legacy.close()
+    _clean(tmp_path, 3)
+    assert tasks.read_job_rows(cli.local_job_id(str(tmp_path / "out.xlsx")))["total"] == 3
+
+
+def test_stop_requested_before_start_pauses(tmp_path):
+    import threading
+
+    source = tmp_path / "in.xlsx"
+    benchmark.synthetic_catalog(4).to_excel(source, index=False)
+    stop = threading.Event()
+    stop.set()
+    status = cli.clean_file(str(source), str(tmp_path / "out.xlsx"), stop=stop)
+    assert status["phase"] == tasks.PHASE_PAUSED
+    assert stop.is_set()
+    assert cli.clean_file(str(source), str(tmp_path / "out.xlsx"))["phase"] == tasks.PHASE_COMPLETE
+
+
+def test_changed_rows_are_reprocessed(tmp_path):
+    _clean(tmp_path, 6)
+    job_id = cli.local_job_id(str(tmp_path / "out.xlsx"))
+    before = tasks._read_job_metrics(job_id).get("api_calls", 0)
+
+    df = benchmark.synthetic_catalog(6)
+    df.loc[4, "Başlık"] = "Philips KETTLE PH999X9 Beyaz"
+    df.to_excel(tmp_path / "in.xlsx", index=False)
+    status = cli.clean_file(str(tmp_path / "in.xlsx"), str(tmp_path / "out.xlsx"), batch_size=2)
+    assert status["phase"] == tasks.PHASE_COMPLETE
+    assert tasks._read_job_metrics(job_id).get("api_calls", 0) == before + 1
+    out = pd.read_excel(tmp_path / "out.xlsx")
+    assert len(out) == 6 and "PH999X9" in str(out.loc[4].to_dict())
+
+
+def test_engine_options_do_not_leak_into_environment(tmp_path, monkeypatch):
+    import concurrency
+    import os
+
+    monkeypatch.delenv("GEMINI_PARALLEL_WORKERS", raising=False)
+    monkeypatch.delenv("GEMINI_ENGINE", raising=False)
+    limits = []
+    original = concurrency.AIMDController.__init__
+
+    def init(self, *args, **kwargs):
+        original(self, *args, **kwargs)
+        limits.append((self.limit, self.maximum))
+
+    monkeypatch.setattr(concurrency.AIMDController, "__init__", init)
+    source = tmp_path / "in.xlsx"
+    benchmark.synthetic_catalog(3).to_excel(source, index=False)
+    status = cli.clean_file(str(source), str(tmp_path / "out.xlsx"), workers=3, engine="thread")
+    assert status["phase"] == tasks.PHASE_COMPLETE
+    assert limits == [(3, 3)]
+    assert "GEMINI_PARALLEL_WORKERS" not in os.environ and "GEMINI_ENGINE" not in os.environ
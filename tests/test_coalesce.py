@@ -0,0 +1,50 @@
+import main
+import tasks
+from coalesce import VariantGroup, differing_columns, fan_out
+
+REP = {
+    "Başlık": "Arzum AR1234 Kettle Siyah", "Marka": "Arzum", "SHOP_SKU": "A-1", "EAN": "8690000000011",
+    "Renk (temel)": "Siyah", "Renk (Üreticiye Göre)": None, "Ürün Tipi": "Kettle", "Ürün Ağırlığı": None,
+}
+SIB = {**REP, "Başlık": "Arzum AR1234 Kettle Beyaz", "SHOP_SKU": "A-2", "EAN": None, "Renk (temel)": "Beyaz"}
+REP_RESULT = {
+    **REP, "Başlık": "Arzum AR1234 Su Isıtıcı Siyah", "Renk (Üreticiye Göre)": "Siyah",
+    "Ürün Ağırlığı": "1 kg", "Warning": "Çözüldü: renk = Siyah",
+}
+
+
+def test_differing_columns_pulls_in_same_topic_empty_columns():
+    assert differing_columns(REP, SIB) == ["Renk (temel)", "Renk (Üreticiye Göre)"]
+    # Aynı ilk kelime aynı konu değildir: "Ürün Tipi" farkı "Ürün Ağırlığı"nı sordurmaz
+    assert differing_columns(REP, {**REP, "Ürün Tipi": "Çaydanlık"}) == ["Ürün Tipi"]
+    # Varyantta dolu olan aynı konulu sütun kendi değeriyle kalır
+    assert differing_columns(REP, {**SIB, "Renk (Üreticiye Göre)": "Kar Beyazı"}) == [
+        "Renk (temel)", "Renk (Üreticiye Göre)"
+    ]
+    assert differing_columns(REP, {**REP, "Renk (Üreticiye Göre)": "Siyah"}) == ["Renk (Üreticiye Göre)"]
+
+
+def test_fan_out_rebuilds_warning_and_identity():
+    farkli = differing_columns(REP, SIB)
+    cevap = {"temiz_baslik": "Arzum AR1234 Su Isıtıcı Beyaz", "duzenlenmis_ozellikler": {"Renk (Üreticiye Göre)": "Beyaz"}}
+    result = fan_out(REP_RESULT, SIB, farkli, cevap)
+    assert result["Warning"] == ""
+    assert (result["SHOP_SKU"], result["EAN"], result["Renk (Üreticiye Göre)"]) == ("A-2", None, "Beyaz")
+    assert result["Ürün Ağırlığı"] == "1 kg"
+    assert fan_out(REP_RESULT, SIB, farkli, {**cevap, "uyari": "Başlık ile renk çelişiyor"})["Warning"] == (
+        "Başlık ile renk çelişiyor"
+    )
+    # Sorulmayan birebir kopya: girdi aynı, temsilcinin uyarısı geçerli
+    assert fan_out(REP_RESULT, {**REP, "SHOP_SKU": "A-3"}, [], {})["Warning"] == REP_RESULT["Warning"]
+
+
+def test_sibling_ean_is_searched_for_the_sibling(monkeypatch):
+    monkeypatch.setenv("WEB_SEARCH", "1")
+    aranan = []
+    monkeypatch.setattr(main, "ean_ara_internet", lambda marka, urun_adi: aranan.append(urun_adi) or "8690000000028")
+    monkeypatch.setattr(main, "urun_boyutu_ara_internet", lambda marka, urun_adi: {})
+    group = VariantGroup(key=("arzum", "AR1234", "kettle"), representative=(0, REP, []), siblings=[(1, SIB, ["EAN"])])
+    farkli = {1: differing_columns(REP, SIB)}
+    results, fallback = tasks._variant_results(group, REP_RESULT, farkli, {1: {"temiz_baslik": "Beyaz"}}, [(1, SIB, [])])
+    assert not fallback and results[0][1]["EAN"] == "8690000000028"
+    assert aranan == [SIB["Başlık"]]
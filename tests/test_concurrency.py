@@ -0,0 +1,83 @@
+import asyncio
+
+from concurrency import AIMDController, AsyncGate
+from job_metrics import JobMetrics
+
+
+def _calls(metrics, n, latency=0.1, quota_errors=0):
+    metrics.incr("api_calls", n)
+    metrics.incr("api_latency_s", n * latency)
+    if quota_errors:
+        metrics.incr("api_errors", quota_errors)
+        metrics.incr("rate_limit_429", quota_errors)
+
+
+def test_limit_halves_on_429_and_recovers_to_maximum():
+    metrics = JobMetrics()
+    controller = AIMDController(initial=8, maximum=10, metrics=metrics)
+
+    # Pencere dolmadan (limit kadar çağrı) değişmez
+    _calls(metrics, 2)
+    assert controller.observe() == 8
+
+    # 429 pencereyi beklemeden düşürür
+    _calls(metrics, 1, quota_errors=1)
+    assert controller.observe() == 4
+    _calls(metrics, 1, quota_errors=1)
+    assert controller.observe() == 2
+
+    # Sorunsuz pencerelerde (en az 3, yaklaşık limit kadar çağrı) +1, üst sınırda durur
+    limits = []
+    for _ in range(12):
+        _calls(metrics, max(3, controller.limit))
+        limits.append(controller.observe())
+    assert limits[:3] == [3, 4, 5]
+    assert limits[-1] == 10 and max(limits) == 10
+    assert [h["reason"] for h in controller.history[:3]] == ["start", "429", "429"]
+    assert metrics.snapshot()["concurrency_limit"] == 10
+
+
+def test_limit_never_drops_below_minimum_and_fixed_when_not_adaptive():
+    metrics = JobMetrics()
+    controller = AIMDController(initial=2, minimum=2, maximum=4, metrics=metrics)
+    _calls(metrics, 1, quota_errors=1)
+    assert controller.observe() == 2
+
+    fixed = AIMDController(initial=5, maximum=10, adaptive=False, metrics=metrics)
+    _calls(metrics, 1, quota_errors=1)
+    assert fixed.observe() == 5
+
+
+def test_async_gate_follows_the_current_limit():
+    metrics = JobMetrics()
+    controller = AIMDController(initial=4, maximum=4, metrics=metrics)
+    gate = AsyncGate(controller)
+    inflight = peak = 0
+
+    async def call(quota_error=False, record=True):
+        nonlocal inflight, peak
+        async with gate:
+            inflight += 1
+            peak = max(peak, inflight)
+            await asyncio.sleep(0.01)
+            if record:
+                _calls(metrics, 1, quota_errors=int(quota_error))
+            inflight -= 1
+
+    async def wave(*calls):
+        nonlocal peak
+        peak = 0
+        await asyncio.gather(*calls)
+        return peak
+
+    async def main():
+        assert await wave(*(call() for _ in range(6))) == 4
+        # 429 → limit 2; sayaç yazmayan çağrılar pencereyi doldurmaz, limit 2'de kalır
+        await wave(call(quota_error=True))
+        assert controller.limit == 2
+        assert await wave(*(call(record=False) for _ in range(6))) == 2
+        # Sorunsuz çağrılarla üst sınıra toparlanır
+        await wave(*(call() for _ in range(30)))
+        assert controller.limit == 4
+
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+import benchmark
+import main
+import tasks
+from llm_backend import BackendResponse
+
+ROWS = [row for _, row in benchmark.synthetic_catalog(6).iterrows()]
+
+
+def _both(sync_fn, async_fn, *args, **kwargs):
+    return sync_fn(*args, **kwargs), asyncio.run(async_fn(*args, **kwargs))
+
+
+def test_single_batch_and_variant_calls_match():
+    row = ROWS[0].to_dict()
+    sync, async_ = _both(main.urun_isle, main.urun_isle_async, row, ["Renk (temel)"])
+    assert sync == async_ and sync["temiz_baslik"]
+
+    urunler = [(i, r.to_dict(), []) for i, r in enumerate(ROWS[:4])]
+    sync, async_ = _both(main.urun_isle_toplu, main.urun_isle_toplu_async, urunler)
+    assert sync == async_ and list(sync) == [0, 1, 2, 3]
+
+    temsilci = {"Başlık": sync[0]["temiz_baslik"]}
+    kardesler = [(1, ROWS[1].to_dict(), ["Renk (temel)"])]
+    sync, async_ = _both(main.varyant_farklarini_sor, main.varyant_farklarini_sor_async, row, temsilci, kardesler)
+    assert sync == async_
+
+    sync, async_ = _both(main.gemini_eksik_sutunlar_toplu_sor, main.gemini_eksik_sutunlar_toplu_sor_async, "Kettle", ["Güç"])
+    assert sync == async_
+
+
+class _FlakyModel:
+    """İlk çağrıda 429, ardından geçerli yanıt."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        if self.calls == 1:
+            raise Exception("429 Resource has been exhausted. Please retry in 1s.")
+        return BackendResponse('{"temiz_baslik": "Kablo", "duzenlenmis_ozellikler": {"Renk": "Siyah"}}')
+
+    def generate_content(self, contents, **kwargs):
+        return self._next()
+
+    async def generate_content_async(self, contents, **kwargs):
+        return self._next()
+
+
+@pytest.mark.parametrize("engine", ["thread", "async"])
+def test_retry_after_quota_error_on_both_engines(monkeypatch, engine):
+    flaky = _FlakyModel()
+    sleeps = []
+    monkeypatch.setattr(main, "model", flaky)
+    monkeypatch.setattr(main, "get_limiter", lambda: None)
+    monkeypatch.setattr(main.time, "sleep", sleeps.append)
+
+    async def _async_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(main.asyncio, "sleep", _async_sleep)
+    if engine == "thread":
+        data = main.urun_isle({"Başlık": "kablo"})
+    else:
+        data = asyncio.run(main.urun_isle_async({"Başlık": "kablo"}))
+    assert data["temiz_baslik"] == "Kablo"
+    assert flaky.calls == 2 and sleeps == [3.0]
+
+
+def test_job_results_match_between_engines(monkeypatch):
+    results = {}
+    for engine in ("thread", "async"):
+        monkeypatch.setenv("GEMINI_ENGINE", engine)
+        job_id = tasks.create_job_from_dataframe(benchmark.synthetic_catalog(9), batch_size=3)
+        assert tasks.process_catalog_job(job_id)["phase"] == tasks.PHASE_COMPLETE
+        store = tasks._checkpoint(job_id)
+        results[engine] = dict(store.items())
+        store.close()
+    assert results["thread"] == results["async"]
+    assert len(results["async"]) == 9
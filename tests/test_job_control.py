@@ -0,0 +1,184 @@
+import pytest
+
+import benchmark
+import job_state
+import tasks
+from job_state import CANCEL, DONE, FAILED, PAUSE
+
+ROWS = 6
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    """process_catalog_job.apply_async yerine: kuyruğa alınan run_id'ler (broker yok)."""
+    calls = []
+    monkeypatch.setattr(tasks.process_catalog_job, "apply_async", lambda args, **kw: calls.append(args[1]))
+    return calls
+
+
+def _job(shard_size=None):
+    job_id = tasks.create_job_from_dataframe(benchmark.synthetic_catalog(ROWS), batch_size=1)
+    if shard_size:
+        tasks._update_job_config(job_id, shard_size=shard_size)
+    return job_id
+
+
+def _phase(job_id):
+    return tasks._read_job_config(job_id)["phase"]
+
+
+def _finished(job_id):
+    progress = job_state.get_store().progress(job_id)
+    return progress[DONE] + progress[FAILED]
+
+
+def _pause_after_first_batch(monkeypatch, job_id):
+    """Tek worker'lı thread motorunda ilk batch'ten sonra duraklatma isteği."""
+    original = tasks._process_product_batch
+
+    def batch(items, *args):
+        result = original(items, *args)
+        job_state.get_store().set_control(job_id, PAUSE)
+        return result
+
+    monkeypatch.setattr(tasks, "_process_product_batch", batch)
+    monkeypatch.setenv("GEMINI_ENGINE", "thread")
+    monkeypatch.setenv("GEMINI_PARALLEL_WORKERS", "1")
+    monkeypatch.setenv("GEMINI_MAX_CONCURRENCY", "1")
+    monkeypatch.setenv("GEMINI_COALESCE", "0")
+    return original
+
+
+def _shard_run(job_id, enqueued):
+    """dispatch_job'un chord'u yerine: shard aralıkları ve run_id (shard'lar testte elle çalıştırılır)."""
+    import celery
+
+    captured = {}
+    original = celery.chord
+    celery.chord = lambda header: (lambda callback: captured.update(header=header, callback=callback))
+    try:
+        tasks.dispatch_job(job_id)
+    finally:
+        celery.chord = original
+    assert captured and not enqueued
+    config = tasks._read_job_config(job_id)
+    return config["shards"], config["run_id"]
+
+
+def test_pause_queued_job_and_resume(enqueued):
+    job_id = _job()
+    assert tasks.pause_job(job_id)["phase"] == tasks.PHASE_PAUSED
+    tasks.resume_job(job_id)
+    assert _phase(job_id) == tasks.PHASE_QUEUED and len(enqueued) == 1
+    assert tasks.process_catalog_job(job_id, enqueued[-1])["phase"] == tasks.PHASE_COMPLETE
+    assert _finished(job_id) == ROWS
+
+
+def test_pause_while_processing_then_resume(monkeypatch, enqueued):
+    job_id = _job()
+    original = _pause_after_first_batch(monkeypatch, job_id)
+    status = tasks.process_catalog_job(job_id)
+    assert status["phase"] == tasks.PHASE_PAUSED
+    assert 0 < _finished(job_id) < ROWS
+    monkeypatch.setattr(tasks, "_process_product_batch", original)
+    tasks.resume_job(job_id)
+    assert tasks.process_catalog_job(job_id, enqueued[-1])["phase"] == tasks.PHASE_COMPLETE
+    assert _finished(job_id) == ROWS
+
+
+def test_stale_queued_message_is_skipped(enqueued):
+    job_id = _job()
+    tasks.pause_job(job_id)
+    tasks.resume_job(job_id)
+    tasks.pause_job(job_id)
+    tasks.resume_job(job_id)
+    first, second = enqueued
+    assert tasks.process_catalog_job(job_id, first)["phase"] == tasks.PHASE_QUEUED
+    assert _finished(job_id) == 0
+    assert tasks.process_catalog_job(job_id, second)["phase"] == tasks.PHASE_COMPLETE
+
+
+def test_cancel_is_final(enqueued):
+    job_id = _job()
+    assert tasks.cancel_job(job_id)["phase"] == tasks.PHASE_CANCELLED
+    with pytest.raises(ValueError):
+        tasks.resume_job(job_id)
+    with pytest.raises(ValueError):
+        tasks.pause_job(job_id)
+    assert not enqueued
+
+
+def test_sharded_pause_resumed_while_draining_is_not_completed(enqueued):
+    job_id = _job(shard_size=3)
+    shards, run_id = _shard_run(job_id, enqueued)
+    assert shards == [[0, 3], [3, 6]]
+    results = [tasks.process_catalog_shard(job_id, *shards[0], run_id)]
+    tasks.pause_job(job_id)
+    results.append(tasks.process_catalog_shard(job_id, *shards[1], run_id))
+    assert results[1]["processed"] == 0
+    # Shard'lar boşalırken devam: bayrak kalkar, aşama hâlâ processing
+    tasks.resume_job(job_id)
+    assert job_state.get_store().control(job_id) is None
+
+    status = tasks.finalize_job(results, job_id, run_id)
+    assert status["phase"] == tasks.PHASE_QUEUED
+    assert _finished(job_id) == 3 and len(enqueued) == 1
+    assert not tasks._output_path(job_id).exists()
+
+    assert tasks.process_catalog_job(job_id, enqueued[-1])["phase"] == tasks.PHASE_COMPLETE
+    assert _finished(job_id) == ROWS
+    assert tasks._checkpoint(job_id).count() == ROWS
+
+
+def test_sharded_pause_and_cancel(enqueued):
+    for control, phase in ((PAUSE, tasks.PHASE_PAUSED), (CANCEL, tasks.PHASE_CANCELLED)):
+        job_id = _job(shard_size=3)
+        shards, run_id = _shard_run(job_id, enqueued)
+        results = [tasks.process_catalog_shard(job_id, *shards[0], run_id)]
+        (tasks.pause_job if control == PAUSE else tasks.cancel_job)(job_id)
+        results.append(tasks.process_catalog_shard(job_id, *shards[1], run_id))
+        assert tasks.finalize_job(results, job_id, run_id)["phase"] == phase
+        assert _finished(job_id) == 3 and not enqueued
+
+
+def test_sharded_job_completes(enqueued):
+    job_id = _job(shard_size=3)
+    shards, run_id = _shard_run(job_id, enqueued)
+    results = [tasks.process_catalog_shard(job_id, *shard, run_id) for shard in shards]
+    assert tasks.finalize_job(results, job_id, run_id)["phase"] == tasks.PHASE_COMPLETE
+    assert _finished(job_id) == ROWS and tasks._output_path(job_id).exists()
+
+
+def test_failed_rows_are_retried_on_resume(monkeypatch, enqueued):
+    job_id = _job()
+    original = _pause_after_first_batch(monkeypatch, job_id)
+    calls = []
+    fail = {2}
+
+    def batch(items, *args):
+        calls.extend(idx for idx, _, _ in items)
+        if items[0][0] in fail:
+            fail.discard(items[0][0])
+            return [(2, tasks._error_row(items[0][1], TimeoutError("429 quota")))]
+        return original(items, *args)
+
+    monkeypatch.setattr(tasks, "_process_product_batch", batch)
+    assert tasks.process_catalog_job(job_id)["phase"] == tasks.PHASE_COMPLETE
+    progress = job_state.get_store().progress(job_id)
+    assert (progress[DONE], progress[FAILED]) == (ROWS - 1, 1)
+    store = tasks._checkpoint(job_id)
+    assert store.failed_indices() == {2}
+
+    # Bayrağı olmayan eski kayıt: sonucuna bakılarak sınıflandırılır
+    store._conn().execute("UPDATE rows SET failed = NULL")
+    assert store.failed_indices() == set()
+    assert store.failed_indices(tasks._is_error_row) == {2}
+
+    # Durum kaydı yok (ör. job_state silindi): hatalı satır done sayılmaz, yeniden işlenir
+    job_state.get_store().set_state(job_id, range(ROWS), job_state.PENDING)
+    calls.clear()
+    tasks.process_catalog_job(job_id)
+    assert calls == [2]
+    assert store.failed_indices() == set()
+    assert job_state.get_store().progress(job_id)[DONE] == ROWS
+    store.close()
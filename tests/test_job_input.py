@@ -0,0 +1,46 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+import job_input
+
+
+def test_arrow_round_trip_keeps_mixed_types_and_numeric_headers(tmp_path):
+    df = pd.DataFrame({
+        "SHOP_SKU": ["A1", "A2", "A3"],
+        "Karışık": [42, "42", None],  # aynı sütunda sayı + metin
+        "Tarih": [datetime.date(2024, 1, 2), "yok", None],
+        "Fiyat": [1.5, None, 3.0],
+        2024: ["a", None, "c"],  # Excel'de sayısal başlık
+    })
+    job_input.write_input(tmp_path, df)
+    assert job_input.input_exists(tmp_path)
+    assert not (tmp_path / "input.tmp").exists()
+
+    out = job_input.read_input(tmp_path)
+    assert list(out.columns) == ["SHOP_SKU", "Karışık", "Tarih", "Fiyat", 2024]
+    assert out["Karışık"].tolist() == [42, "42", None]
+    assert type(out["Karışık"][0]) is int
+    assert out["Tarih"].tolist() == ["2024-01-02", "yok", None]
+    assert out["Fiyat"].tolist()[::2] == [1.5, 3.0] and pd.isna(out["Fiyat"][1])
+    assert out[2024].tolist()[::2] == ["a", "c"] and pd.isna(out[2024][1])
+
+
+def test_legacy_xlsx_fallback(tmp_path):
+    assert not job_input.input_exists(tmp_path)
+    pd.DataFrame({"SHOP_SKU": ["A1", "A2"], "Başlık": ["x", "y"]}).to_excel(tmp_path / "input.xlsx", index=False)
+    assert job_input.input_exists(tmp_path)
+    assert job_input.read_input(tmp_path)["SHOP_SKU"].tolist() == ["A1", "A2"]
+
+
+def test_missing_input_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        job_input.read_input(tmp_path)
+
+
+def test_upload_paths(tmp_path):
+    assert job_input.find_upload(tmp_path) is None
+    path = job_input.save_upload(tmp_path, b"data", "Katalog.XLSX")
+    assert path.name == "upload.xlsx" and job_input.find_upload(tmp_path) == path
+    assert job_input.upload_path(tmp_path).name == "upload.xlsx"
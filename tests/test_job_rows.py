@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+import tasks
+from checkpoint import changed_columns
+
+INPUT = [{"SHOP_SKU": f"SKU{i}", "Başlık": f"ürün {i}", "Renk": None} for i in range(6)]
+
+
+def _results():
+    # Çift index'li satırları Gemini değiştirmiş gibi
+    return [
+        (i, {**row, "Başlık": row["Başlık"].upper() if i % 2 == 0 else row["Başlık"], "Ek": "x" if i == 4 else None})
+        for i, row in enumerate(INPUT)
+    ]
+
+
+def _job(columns=True):
+    job_id = tasks.create_job_from_dataframe(pd.DataFrame(INPUT))
+    store = tasks._checkpoint(job_id)
+    results = _results()
+    store.put_many(results, changes={i: changed_columns(INPUT[i], r) for i, r in results})
+    if columns:
+        store.set_columns(["SHOP_SKU", "Başlık", "Renk"])
+    store.close()
+    return job_id
+
+
+def test_pages_in_index_order():
+    job_id = _job()
+    page = tasks.read_job_rows(job_id, offset=2, limit=3)
+    assert page["total"] == 6
+    assert page["columns"] == ["SHOP_SKU", "Başlık", "Renk"]
+    assert [row["index"] for row in page["rows"]] == [2, 3, 4]
+    assert page["rows"][0]["values"]["Başlık"] == "ÜRÜN 2"
+
+
+def test_only_changed_with_requested_columns():
+    job_id = _job()
+    page = tasks.read_job_rows(job_id, limit=2, columns=["Başlık", "Yok", "SHOP_SKU"], only_changed=True)
+    assert page["total"] == 3
+    assert page["columns"] == ["Başlık", "SHOP_SKU"]
+    assert [row["index"] for row in page["rows"]] == [0, 2]
+    assert page["rows"][0] == {"index": 0, "changed": ["Başlık"], "values": {"Başlık": "ÜRÜN 0", "SHOP_SKU": "SKU0"}}
+    rest = tasks.read_job_rows(job_id, offset=2, limit=2, only_changed=True)
+    assert [row["index"] for row in rest["rows"]] == [4]
+    assert rest["rows"][0]["changed"] == ["Başlık"]
+
+
+def test_columns_fall_back_to_result_keys():
+    job_id = _job(columns=False)
+    page = tasks.read_job_rows(job_id, limit=1)
+    assert page["columns"] == ["SHOP_SKU", "Başlık", "Renk", "Ek"]
+    assert page["rows"][0]["values"]["Ek"] is None
+
+
+def test_unknown_job():
+    with pytest.raises(FileNotFoundError):
+        tasks.read_job_rows("yok")
@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+from job_state import CANCEL, DONE, FAILED, IN_FLIGHT, PAUSE, PENDING, JobStateStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStateStore(tmp_path / "jobs.sqlite")
+
+
+def _counts(store, job_id):
+    progress = store.progress(job_id)
+    # Sayaçlar satır durumlarıyla tutarlı olmalı
+    for state in (PENDING, IN_FLIGHT, DONE, FAILED):
+        assert progress[state] == len(store.indices(job_id, [state]))
+    return progress
+
+
+def test_state_transitions_keep_counters_consistent(store):
+    store.create_job("j", [f"SKU{i}" for i in range(6)])
+    assert _counts(store, "j") == {"total": 6, PENDING: 6, IN_FLIGHT: 0, DONE: 0, FAILED: 0}
+
+    store.set_state("j", [0, 1, 2], IN_FLIGHT)
+    store.set_state("j", [0, 1], DONE)
+    store.set_state("j", [2], FAILED)
+    store.set_state("j", [1, 1, 3], DONE)  # tekrar eden / zaten done index'ler iki kez sayılmaz
+    assert _counts(store, "j") == {"total": 6, PENDING: 2, IN_FLIGHT: 0, DONE: 3, FAILED: 1}
+    assert store.count("j", [DONE, FAILED], start=2, end=4) == 2
+
+    # Devam: uçuşta kalmış ve hatalı satırlar yeniden pending
+    store.set_state("j", [2], PENDING)
+    assert _counts(store, "j")[FAILED] == 0
+    store.set_state("j", [], DONE)
+    with pytest.raises(ValueError):
+        store.set_state("j", [0], "bitti")
+
+
+def test_controls_and_first_row_drop(store):
+    store.create_job("j", ["TITLE", "SKU1", "SKU2"], [DONE, DONE, PENDING])
+    assert store.control("j") is None
+    store.set_control("j", PAUSE)
+    store.drop_first_row("j")
+    assert store.control("j") == PAUSE
+    assert _counts(store, "j") == {"total": 2, PENDING: 1, IN_FLIGHT: 0, DONE: 1, FAILED: 0}
+    assert store.indices("j", [PENDING]) == {1}
+
+    store.set_control("j", CANCEL)
+    store.set_control("j", None)
+    assert store.control("j") is None
+    with pytest.raises(ValueError):
+        store.set_control("j", "durdur")
+    with pytest.raises(KeyError):
+        store.set_control("yok", PAUSE)
+    store.delete_job("j")
+    assert not store.exists("j")
+    with pytest.raises(KeyError):
+        store.progress("j")
+
+
+def test_migrate_status_csv(store, tmp_path):
+    status_file = tmp_path / "status.csv"
+    pd.DataFrame({
+        "index": [0, 1, 2, 3],
+        "processed": [True, "False", "true", False],
+        "sku": ["A", "B", "C", "D"],
+    }).to_csv(status_file, index=False)
+
+    assert store.migrate_status_csv("eski", status_file)
+    assert _counts(store, "eski") == {"total": 4, PENDING: 2, IN_FLIGHT: 0, DONE: 2, FAILED: 0}
+    assert store.indices("eski", [DONE]) == {0, 2}
+    assert not status_file.exists()
+    assert (tmp_path / "status.csv.migrated").exists()
+
+
+def test_migrate_status_csv_without_sku_column(store, tmp_path):
+    status_file = tmp_path / "status.csv"
+    pd.DataFrame({"index": [0, 1], "processed": [False, True]}).to_csv(status_file, index=False)
+    store.migrate_status_csv("eski", status_file)
+    assert store.indices("eski", [DONE]) == {1}
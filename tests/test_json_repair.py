@@ -0,0 +1,61 @@
+import job_metrics
+import main
+from gemini_schema import cache_dogrulayici, json_yukle, toplu_yaniti_ayristir, urun_yanitini_ayristir
+
+KESIK = '[{"_id": "0", "temiz_baslik": "Kablo"}, {"_id": "1", "temiz_baslik": "Adap'
+CITLI = '```json\n{"temiz_baslik": "Kablo", "duzenlenmis_ozellikler": {"Renk": "Siyah"},}\n```'
+
+
+class _Cache:
+    def __init__(self):
+        self.items = {}
+
+    def set(self, key, text, kind=""):
+        self.items[key] = text
+
+
+def _sayaclar(metrics):
+    return {k: metrics.get(k) for k in ("json_repaired", "json_unrepairable")}
+
+
+def test_repair_counted_once_per_response():
+    metrics = job_metrics.JobMetrics()
+    cache = _Cache()
+    with job_metrics.bind(metrics):
+        main._cache_yaz(cache, "k", CITLI, "urun_isle", cache_dogrulayici(urun_yanitini_ayristir, main._yanit_dolu_mu))
+        data = urun_yanitini_ayristir(CITLI)
+    assert data["temiz_baslik"] == "Kablo"
+    assert cache.items == {"k": CITLI}
+    assert _sayaclar(metrics) == {"json_repaired": 1, "json_unrepairable": 0}
+
+
+def test_unrepairable_counted_once():
+    metrics = job_metrics.JobMetrics()
+    cache = _Cache()
+    with job_metrics.bind(metrics):
+        main._cache_yaz(cache, "k", "model yanıt vermedi", "toplu", cache_dogrulayici(toplu_yaniti_ayristir))
+        try:
+            toplu_yaniti_ayristir("model yanıt vermedi")
+        except ValueError:
+            pass
+    assert cache.items == {}
+    assert _sayaclar(metrics) == {"json_repaired": 0, "json_unrepairable": 1}
+
+
+def test_truncated_response_is_repaired_but_not_cached():
+    metrics = job_metrics.JobMetrics()
+    cache = _Cache()
+    with job_metrics.bind(metrics):
+        main._cache_yaz(cache, "k", KESIK, "toplu", cache_dogrulayici(toplu_yaniti_ayristir))
+        sonuc = toplu_yaniti_ayristir(KESIK)
+    assert cache.items == {}
+    assert list(sonuc) == ["0"] and sonuc["0"]["temiz_baslik"] == "Kablo"
+    assert _sayaclar(metrics)["json_repaired"] == 1
+
+
+def test_valid_json_is_not_counted():
+    metrics = job_metrics.JobMetrics()
+    with job_metrics.bind(metrics):
+        assert json_yukle('{"a": 1}') == {"a": 1}
+        assert cache_dogrulayici(json_yukle)('{"a": 1}')
+    assert _sayaclar(metrics) == {"json_repaired": 0, "json_unrepairable": 0}
@@ -0,0 +1,116 @@
+import gzip
+import json
+import zlib
+
+import pytest
+
+from llm_backend import MockBackend
+from llm_replay import Archive, Recorder, RecordingBackend, ReplayBackend, request_key
+
+PROMPTS = ['JSON: {"Başlık": "Kablo %d"}' % i for i in range(5)]
+
+
+def _entry(key):
+    return (json.dumps({"kind": "llm", "key": key, "response": {"text": key}}) + "\n").encode("utf-8")
+
+
+def _record(path, backend=None):
+    recorder = Recorder(str(path))
+    model = RecordingBackend(backend or MockBackend(latency="fixed:0"), recorder).model("model")
+    texts = [model.generate_content(p).text for p in PROMPTS]
+    recorder.close()
+    return texts
+
+
+@pytest.mark.parametrize("name", ["rec.jsonl.gz", "rec.jsonl"])
+def test_record_replay_round_trip(tmp_path, name):
+    texts = _record(tmp_path / name)
+    replay = ReplayBackend(Archive(str(tmp_path / name), latency_scale=0)).model("model")
+    assert [replay.generate_content(p).text for p in PROMPTS] == texts
+    # Klasör olarak da okunur
+    assert len(Archive(str(tmp_path), latency_scale=0)) == len(PROMPTS)
+
+
+def test_recorded_errors_are_replayed(tmp_path):
+    path = tmp_path / "rec.jsonl.gz"
+    recorder = Recorder(str(path))
+    model = RecordingBackend(MockBackend(latency="fixed:0", rate_429=1.0), recorder).model("model")
+    with pytest.raises(Exception, match="429"):
+        model.generate_content(PROMPTS[0])
+    recorder.close()
+    with pytest.raises(Exception, match="429"):
+        ReplayBackend(Archive(str(path), latency_scale=0)).model("model").generate_content(PROMPTS[0])
+
+
+def test_archive_survives_killed_recorder(tmp_path):
+    path = tmp_path / "rec.jsonl.gz"
+    _record(path)
+    with open(path, "ab") as fh:
+        fh.write(gzip.compress(_entry("yarim"))[:-12])  # kayıt ortasında ölen process
+    _record(path)  # sonraki çalışma aynı arşive ekler
+    archive = Archive(str(path), latency_scale=0)
+    assert len(archive) == 2 * len(PROMPTS)
+
+
+def test_archive_reads_unterminated_legacy_stream(tmp_path):
+    # Eski kayıt biçimi: tek açık gzip üyesi, her satırdan sonra flush, trailer yok
+    path = tmp_path / "rec.jsonl.gz"
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    data = b"".join(compressor.compress(_entry(k)) + compressor.flush(zlib.Z_SYNC_FLUSH) for k in ("a", "b", "c"))
+    path.write_bytes(data)
+    assert len(Archive(str(path), latency_scale=0)) == 3
+    _record(path)
+    archive = Archive(str(path), latency_scale=0)
+    assert len(archive) == 3 + len(PROMPTS)
+    assert archive.take("c")["response"] == {"text": "c"}
+    assert archive.take(request_key("llm", {"model": "model", "contents": PROMPTS[0], "generation_config": None}))
+
+
+def test_instruction_stored_once_in_one_member_per_run(tmp_path, monkeypatch):
+    import llm_replay
+
+    path = tmp_path / "rec.jsonl.gz"
+    monkeypatch.setenv("LLM_RECORD", str(path))
+    monkeypatch.setattr(llm_replay, "_recorder", None)
+    monkeypatch.setattr(llm_replay, "_instructions", {})
+    talimat = "SİSTEM TALİMATI " * 200
+    llm_replay.register_instruction(talimat)
+    recorder = llm_replay.recorder()
+    model = RecordingBackend(MockBackend(latency="fixed:0"), recorder).model("model")
+    texts = [model.generate_content(talimat + p).text for p in PROMPTS]
+    recorder.close()
+
+    entries = [json.loads(line) for line in gzip.decompress(path.read_bytes()).splitlines()]
+    assert [e["kind"] for e in entries] == ["instruction"] + ["llm"] * len(PROMPTS)
+    assert path.read_bytes().count(b"\x1f\x8b\x08") == 1
+    assert all(e["request"]["contents"] in PROMPTS for e in entries[1:])
+    assert {e["request"]["instruction"] for e in entries[1:]} == {entries[0]["key"]}
+
+    archive = Archive(str(path), latency_scale=0)
+    assert archive.instructions == {entries[0]["key"]: talimat}
+    replay = ReplayBackend(archive).model("model")
+    assert [replay.generate_content(talimat + p).text for p in PROMPTS] == texts
+
+
+def test_killed_streaming_run_is_followed_by_next_run(tmp_path):
+    path = tmp_path / "rec.jsonl.gz"
+    recorder = Recorder(str(path))
+    model = RecordingBackend(MockBackend(latency="fixed:0"), recorder).model("model")
+    for p in PROMPTS:
+        model.generate_content(p)
+    recorder._fh.fileobj.close()  # process öldü: üye trailer'sız kaldı
+    _record(path)
+    assert len(Archive(str(path), latency_scale=0)) == 2 * len(PROMPTS)
+
+
+def test_recorded_helper_replay_miss(tmp_path, monkeypatch):
+    import llm_replay
+
+    path = tmp_path / "rec.jsonl"
+    path.write_text("")
+    monkeypatch.setenv("LLM_REPLAY", str(path))
+    monkeypatch.setattr(llm_replay, "_archive", None)
+    bulunamadi = llm_replay.recorded("boyut", bos=dict)(lambda marka: {"en_cm": 1})
+    assert bulunamadi("X") == {}
+    with pytest.raises(llm_replay.ReplayMiss, match="ean"):
+        llm_replay.recorded("ean")(lambda marka: "123")("X")
@@ -0,0 +1,86 @@
+import pytest
+
+import main
+
+MOCK_429 = "429 Resource has been exhausted (e.g. check quota). Please retry in 3s."
+
+
+class _Limiter:
+    def __init__(self):
+        self.blocked = []
+
+    def block_for(self, seconds):
+        self.blocked.append(seconds)
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+@pytest.mark.parametrize("hata", [
+    MOCK_429,
+    "HTTP 429 Too Many Requests",
+    "RESOURCE_EXHAUSTED: quota exceeded",
+    ResourceExhausted("quota"),
+])
+def test_quota_errors(hata):
+    assert main._kota_hatasi_mi(hata)
+
+
+@pytest.mark.parametrize("hata", [
+    "generate_content failed: deadline exceeded",
+    "could not separate variants",
+    "invalid rate field",
+    "quota project not set",
+    "request id 14290 failed",
+])
+def test_unrelated_errors_are_not_quota_errors(hata):
+    assert not main._kota_hatasi_mi(hata)
+    assert main._rate_limit_bekleme(hata, 0) is None
+
+
+def test_retry_hint_is_used():
+    assert main._rate_limit_bekleme(MOCK_429, 0) == 5.0
+    assert main._rate_limit_bekleme("429 Too Many Requests", 1) == 50
+
+
+def test_only_quota_errors_block_the_bucket():
+    limiter = _Limiter()
+    main._kota_hatasi_bildir(limiter, Exception("generate_content failed"))
+    assert limiter.blocked == []
+    main._kota_hatasi_bildir(limiter, Exception(MOCK_429))
+    assert limiter.blocked == [5.0]
+
+
+def test_retry_does_not_sleep_twice_with_limiter(monkeypatch):
+    monkeypatch.setattr(main, "get_limiter", lambda: _Limiter())
+    assert main._kota_beklemesi(42.0) == 0.0
+    monkeypatch.setattr(main, "get_limiter", lambda: None)
+    assert main._kota_beklemesi(42.0) == 42.0
+
+
+@pytest.mark.parametrize("hata", [ResourceExhausted("quota"), ResourceExhausted()])
+def test_typed_quota_error_blocks_the_bucket(hata):
+    limiter = _Limiter()
+    main._kota_hatasi_bildir(limiter, hata)
+    assert limiter.blocked == [40]
+    assert main._rate_limit_bekleme(hata, 1) == 50
+
+
+def test_typed_quota_error_is_retried_with_backoff(monkeypatch):
+    from llm_backend import BackendResponse
+
+    class _Model:
+        calls = 0
+
+        def generate_content(self, contents, **kwargs):
+            _Model.calls += 1
+            if _Model.calls == 1:
+                raise ResourceExhausted("quota")
+            return BackendResponse('{"temiz_baslik": "Kablo", "duzenlenmis_ozellikler": {}}')
+
+    monkeypatch.setattr(main, "model", _Model())
+    monkeypatch.setattr(main, "get_limiter", lambda: None)
+    monkeypatch.setattr(main, "_kota_beklemesi", lambda wait_time: 0)
+    assert main.urun_isle({"Başlık": "kablo"})["temiz_baslik"] == "Kablo"
+    assert _Model.calls == 2
@@ -0,0 +1,86 @@
+import pytest
+
+from scheduler import RUNNING, WAITING, FairScheduler, celery_priority, clamp_priority
+
+BATCH = 10
+
+
+@pytest.fixture
+def sched(tmp_path, monkeypatch):
+    monkeypatch.setenv("SCHED_MIN_SLICE_S", "0")
+    store = FairScheduler(tmp_path / "jobs.sqlite")
+    yield store
+    store.close()
+
+
+def _next(sched):
+    """Worker'ın kuyruktan alacağı job: bekleyenler arasında vtime'ı en küçük olan."""
+    row = sched._conn().execute(
+        "SELECT job_id FROM sched WHERE state = ? ORDER BY vtime, enqueued LIMIT 1", (WAITING,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _run(sched, slices):
+    """Tek worker: job'u al, yer vermesi gerekene kadar (en fazla 5 batch) işle, kuyruğa geri koy."""
+    served = {}
+    for _ in range(slices):
+        job_id = _next(sched)
+        sched.start(job_id)
+        for _ in range(5):
+            sched.charge(job_id, BATCH)
+            served[job_id] = served.get(job_id, 0) + BATCH
+            if sched.should_yield(job_id):
+                break
+        sched.enqueue(job_id)
+    return served
+
+
+def _vtime(sched, job_id):
+    return sched._conn().execute("SELECT vtime FROM sched WHERE job_id = ?", (job_id,)).fetchone()[0]
+
+
+def test_rows_are_shared_in_proportion_to_priority(sched):
+    sched.enqueue("yuksek", priority=10)
+    sched.enqueue("normal", priority=5)
+    sched.enqueue("dusuk", priority=1)
+    served = _run(sched, 160)
+    assert served["yuksek"] / served["normal"] == pytest.approx(2, rel=0.1)
+    assert served["normal"] / served["dusuk"] == pytest.approx(5, rel=0.2)
+    assert sched.info("yuksek")["slices"] > 1
+
+
+def test_newcomer_starts_at_current_minimum_vtime(sched):
+    sched.enqueue("eski", priority=5)
+    _run(sched, 3)
+    assert _vtime(sched, "eski") > 0
+    # Geç gelen job birikmiş kredi almaz: en küçük aktif vtime'dan başlar
+    sched.enqueue("yeni", priority=5)
+    assert _vtime(sched, "yeni") == _vtime(sched, "eski")
+    served = _run(sched, 20)
+    assert served["eski"] == pytest.approx(served["yeni"], abs=2 * BATCH)
+
+
+def test_running_job_yields_only_to_less_served_waiting_job(sched, monkeypatch):
+    sched.enqueue("a")
+    sched.start("a")
+    assert sched.info("a")["state"] == RUNNING
+    assert not sched.should_yield("a")  # bekleyen yok
+    sched.charge("a", 50)
+    sched.enqueue("b")  # vtime = a'nınki: daha az hizmet almış değil
+    assert not sched.should_yield("a")
+    sched.charge("a", BATCH)
+    assert sched.should_yield("a")
+    # En kısa dilim dolmadan yer verilmez (öncelikle orantılı)
+    monkeypatch.setenv("SCHED_MIN_SLICE_S", "3600")
+    assert not sched.should_yield("a")
+    # Güncellenmeyen (çökmüş worker) kayıtlar hesaba katılmaz
+    monkeypatch.setenv("SCHED_MIN_SLICE_S", "0")
+    monkeypatch.setenv("SCHED_STALE_S", "-1")
+    assert not sched.should_yield("a")
+    assert sched.finish("b")["state"] == WAITING and sched.info("b") is None
+
+
+def test_priority_mapping():
+    assert [clamp_priority(p) for p in (None, 0, 7, 99)] == [5, 1, 7, 10]
+    assert celery_priority(10) == 0 and celery_priority(1) == 9